@@ -1,51 +1,35 @@
 #!/usr/bin/env python3
 """
-Script to add all courses from courses_backup.csv to the main application.
+Script to import all courses from courses_backup.csv (or another CSV) into the main application.
+
+Usage:
+    python add_backup_courses.py [path/to/courses.csv]
 """
 
 import sys
 import csv
 sys.path.append('.')
 
-from app import course_manager
-
-def add_backup_courses():
-    """Add all courses from backup file to the main system"""
+from app import course_service
 
-    added_count = 0
+def add_backup_courses(path='courses_backup.csv'):
+    """Import all courses from a backup file into the main system"""
 
     try:
-        with open('courses_backup.csv', 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Skip if course with this title already exists
-                existing_courses = course_manager.get_all_courses()
-                if any(course['title'] == row['title'] for course in existing_courses):
-                    print(f"Skipping duplicate course: {row['title']}")
-                    continue
-
-                # Add the course
-                course = course_manager.add_course(
-                    title=row['title'],
-                    description=row['description'] or '',
-                    instructor=row['instructor'] or 'Unknown',
-                    credits=int(row['credits']) if row['credits'] else 3
-                )
-
-                if course:
-                    print(f"Added course: {course['title']} (ID: {course['id']})")
-                    added_count += 1
-                else:
-                    print(f"Failed to add course: {row['title']}")
-
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            # Rows are streamed; duplicates are skipped through the title index
+            summary = course_service.import_courses(csv.DictReader(f))
     except FileNotFoundError:
-        print("courses_backup.csv not found")
+        print(f"{path} not found")
         return
     except Exception as e:
         print(f"Error: {e}")
         return
 
-    print(f"\nتم إضافة {added_count} دورة تدريبية إلى النظام")
+    for error in summary['errors']:
+        print(f"Skipping row {error['row']}: {error['error']}")
+    print(f"Skipped {summary['skipped']} duplicate courses")
+    print(f"\nتم إضافة {summary['imported']} دورة تدريبية إلى النظام")
 
 if __name__ == "__main__":
-    add_backup_courses()
\ No newline at end of file
+    add_backup_courses(*sys.argv[1:2])
\ No newline at end of file
@@ -7,11 +7,11 @@ import sys
 import os
 sys.path.append('.')
 
-from app import course_manager
+from app import course_service, student_service
 
 def add_50_students():
     """Add 50 sample students to the first course"""
-    courses = course_manager.get_all_courses()
+    courses = course_service.get_all_courses()
     if not courses:
         print("No courses found. Please create a course first.")
         return
@@ -20,16 +20,18 @@ def add_50_students():
 
     print(f"Adding 50 students to course ID {course_id}...")
 
-    for i in range(1, 51):
-        student_id = f"STU{i:03d}"
-        name = f"Student {i}"
-        email = f"student{i}@example.com"
+    rows = [
+        {'student_id': f"STU{i:03d}", 'name': f"Student {i}", 'email': f"student{i}@example.com"}
+        for i in range(1, 51)
+    ]
 
-        student = course_manager.enroll_student(course_id, name, email, student_id)
-        if student:
-            print(f"Added: {student['name']} ({student['id']})")
+    # One bulk call persists once; upsert keeps reruns from creating duplicates
+    results = student_service.enroll_students(course_id, rows, upsert=True)
+    for result in results:
+        if result['status'] in ('enrolled', 'updated'):
+            print(f"Added: {result['student_id']} ({result['status']})")
         else:
-            print(f"Failed to add student {i}")
+            print(f"Failed to add row {result['row']}: {result.get('error')}")
 
     print("Finished adding 50 students.")
 
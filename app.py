@@ -3,14 +3,295 @@ Course Management Web Application
 Demonstrates Software Engineering Principles and Design Patterns
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from datetime import datetime
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
+from markupsafe import Markup
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta, timezone
+import io
 import json
+import queue
 import os
+import random
+import secrets
+import shutil
+import sys
 import csv
+import atexit
+import base64
+import bisect
+import contextlib
+import functools
+import gc
+import gzip
+import itertools
+import marshal
+import math
+import mmap
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows has msvcrt.locking instead
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
 
 app = Flask(__name__)
 
+class DuplicateEnrollmentError(ValueError):
+    """Raised when a student is already enrolled in a course"""
+    pass
+
+class StudentRoster:
+    """Students of one course, keyed by student id in enrollment order.
+    
+    Iterates and serializes like the plain list it replaces, while lookups,
+    grade updates, removals and duplicate checks by student id are O(1).
+    """
+    
+    def __init__(self, students=()):
+        self._students = {}
+        for student in students:
+            self.add(student)
+    
+    def __iter__(self):
+        return iter(self._students.values())
+    
+    def __len__(self):
+        return len(self._students)
+    
+    def __contains__(self, student_id):
+        return student_id in self._students
+    
+    def __getitem__(self, index):
+        """Positional access, kept for code written against the old list"""
+        return list(self._students.values())[index]
+    
+    def __eq__(self, other):
+        if isinstance(other, StudentRoster):
+            return self.to_list() == other.to_list()
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"StudentRoster({self.to_list()!r})"
+    
+    def get(self, student_id, default=None):
+        """Get an enrolled student by id"""
+        return self._students.get(student_id, default)
+    
+    def add(self, student):
+        """Add a student, replacing any enrollment with the same id"""
+        self._students[student['id']] = student
+    
+    append = add
+    
+    def pop(self, student_id, default=None):
+        """Remove and return the student with the given id"""
+        return self._students.pop(student_id, default)
+    
+    def to_list(self):
+        return list(self._students.values())
+
+class LazyStudentRoster(StudentRoster):
+    """Roster that reads its students from disk the first time it is used"""
+    
+    def __init__(self, loader):
+        self._loader = loader
+        self._loaded = None
+        # Per roster, so loading one course never waits on another
+        self._load_lock = threading.Lock()
+    
+    @property
+    def loaded(self):
+        return self._loaded is not None
+    
+    @property
+    def _students(self):
+        if self._loaded is None:
+            with self._load_lock:
+                if self._loaded is None:
+                    students = {}
+                    for student in self._loader():
+                        students[student['id']] = student
+                    self._loaded = students
+                    self._loader = None
+        return self._loaded
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+# The exact spellings datetime.isoformat() produces for naive timestamps
+_ISO_TIMESTAMP = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.(?!0{6})\d{6})?\Z')
+
+def _pack_datetime(moment):
+    """Integer microseconds since the epoch of a naive datetime"""
+    seconds = (moment.toordinal() - _EPOCH_ORDINAL) * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second
+    return seconds * 1000000 + moment.microsecond
+
+def _now_timestamp():
+    """The current local time, packed"""
+    return _pack_datetime(datetime.now())
+
+def _pack_timestamp(value):
+    """Store a naive ISO timestamp as integer microseconds since the epoch.
+    
+    Strings that would not come back byte for byte (dates, offsets, other
+    spellings) are kept as they are.
+    """
+    if type(value) is not str or _ISO_TIMESTAMP.match(value) is None:
+        return value
+    try:
+        return _pack_datetime(datetime.fromisoformat(value))
+    except ValueError:
+        return value
+
+def _intern(value):
+    """Intern strings so equal field values share one object"""
+    return sys.intern(value) if type(value) is str else value
+
+def _unpack_timestamp(value):
+    """Turn a packed timestamp back into its ISO string"""
+    if type(value) is int:
+        return (_EPOCH + timedelta(microseconds=value)).isoformat()
+    return value
+
+class Record(MutableMapping):
+    """Dict-like record whose fields live in __slots__.
+    
+    Reads, writes, iteration, equality and serialization behave like the
+    plain dict it replaces, without a per-instance dict. Timestamp fields
+    are held as integer microseconds in underscore slots and rendered as
+    ISO strings on access; interned fields share one string per distinct
+    value.
+    """
+    __slots__ = ()
+    FIELDS = ()
+    TIMESTAMPS = frozenset()
+    INTERNED = frozenset()
+    
+    @staticmethod
+    def slots(fields, timestamps):
+        return tuple('_' + field if field in timestamps else field for field in fields)
+    
+    def __init__(self, data=(), **kwargs):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+        if data:
+            kwargs = dict(data, **kwargs)
+        for key, value in kwargs.items():
+            self[key] = value
+    
+    def __getitem__(self, key):
+        if key in self.TIMESTAMPS:
+            return _unpack_timestamp(getattr(self, '_' + key))
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        if key in self.TIMESTAMPS:
+            setattr(self, '_' + key, _pack_timestamp(value))
+            return
+        if key in self.INTERNED and type(value) is str:
+            value = sys.intern(value)
+        setattr(self, key, value)
+    
+    def __delitem__(self, key):
+        raise TypeError(f"{type(self).__name__} fields cannot be removed")
+    
+    def __iter__(self):
+        return iter(self.FIELDS)
+    
+    def __len__(self):
+        return len(self.FIELDS)
+    
+    def __contains__(self, key):
+        return key in self.FIELDS
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def to_dict(self):
+        return {field: self[field] for field in self.FIELDS}
+    
+    def copy(self):
+        """Shallow copy of the same record type"""
+        return self.from_slot_values(self.slot_values())
+    
+    def slot_values(self):
+        """Field values as stored, timestamps still packed"""
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+    
+    @classmethod
+    def from_slot_values(cls, values):
+        """Rebuild a record from slot_values() without re-validating"""
+        record = cls.__new__(cls)
+        for slot, value in zip(cls.__slots__, values):
+            setattr(record, slot, value)
+        return record
+
+class CourseRecord(Record):
+    """A course, stored compactly"""
+    FIELDS = ('id', 'title', 'description', 'instructor', 'credits', 'students',
+              'created_at', 'updated_at')
+    TIMESTAMPS = frozenset(('created_at', 'updated_at'))
+    INTERNED = frozenset(('instructor',))
+    __slots__ = Record.slots(FIELDS, TIMESTAMPS)
+    
+    @classmethod
+    def from_slot_values(cls, values):
+        # Unpacking into attributes is several times faster than a setattr loop
+        record = cls.__new__(cls)
+        (record.id, record.title, record.description, record.instructor, record.credits,
+         record.students, record._created_at, record._updated_at) = values
+        return record
+
+class StudentRecord(Record):
+    """One enrollment, stored compactly"""
+    FIELDS = ('id', 'name', 'email', 'enrolled_at', 'grade')
+    TIMESTAMPS = frozenset(('enrolled_at',))
+    INTERNED = frozenset(('grade',))
+    __slots__ = Record.slots(FIELDS, TIMESTAMPS)
+    
+    @classmethod
+    def from_slot_values(cls, values):
+        record = cls.__new__(cls)
+        record.id, record.name, record.email, record._enrolled_at, record.grade = values
+        return record
+
+def _copy_course(course):
+    """Copy a course and its roster so later mutations do not reach the copy"""
+    copy = course.copy()
+    copy['students'] = [student.copy() for student in list(course['students'])]
+    return copy
+
+class CourseJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes rosters as plain lists and records as dicts"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, StudentRoster):
+            return o.to_list()
+        if isinstance(o, Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+app.json = CourseJSONProvider(app)
+
 # Design Pattern: Singleton for Configuration
 class Config:
     _instance = None
@@ -26,6 +307,32 @@ class Config:
             self.courses_file = 'courses.csv'
             self.students_file = 'students.csv'
             self.max_courses = 1000
+            self.async_observers = False  # Deliver notifications off the request path
+            self.observer_workers = 2
+            self.observer_queue_size = 10000
+            self.observer_backpressure = 'block'  # 'block', 'drop_new', 'drop_oldest' or 'caller_runs'
+            self.response_cache_bytes = 16 * 1024 * 1024
+            self.response_cache_gzip = True
+            self.default_page_size = 100
+            self.home_page_size = 50  # Course cards per home page
+            self.fragment_cache_bytes = 8 * 1024 * 1024  # Rendered HTML kept across requests
+            self.max_page_size = 1000
+            self.storage_mode = 'csv'  # 'csv', 'journal', 'sqlite' or 'sharded'
+            self.database_file = 'courses.db'
+            self.shard_dir = 'shards'  # One JSON file per course, in hashed bucket directories
+            self.shard_buckets = 256
+            self.lazy_rosters = False  # Read each roster from students.csv on first use
+            self.use_snapshot = False  # Start from a binary snapshot while the CSVs are unchanged
+            self.snapshot_file = 'courses.snapshot'
+            self.journal_file = 'courses.journal'
+            self.journal_compact_threshold = 1000
+            self.journal_fsync = False
+            self.write_behind = False  # Persist from a background flusher
+            self.write_behind_window = 0.05  # Seconds to coalesce writes
+            self.write_behind_durable = False  # Wait for each write to hit disk
+            self.metrics_sample_rate = 0.0  # Fraction of requests timed for /metrics; 0 disables instrumentation
+            self.multiprocess = False  # Coordinate writes and reloads with other worker processes
+            self.lock_file = 'courses.lock'
             self.testing = False  # For tests, avoid file I/O
             Config._initialized = True
     
@@ -35,58 +342,562 @@ class Config:
     def get_students_file(self):
         return self.students_file
     
+    def get_journal_file(self):
+        return self.journal_file
+    
+    def get_database_file(self):
+        return self.database_file
+    
+    def get_shard_dir(self):
+        return self.shard_dir
+    
+    def get_snapshot_file(self):
+        return self.snapshot_file
+    
+    def get_lock_file(self):
+        return self.lock_file
+    
     def set_testing_mode(self, testing):
         self.testing = testing
 
 # Design Pattern: Factory for Course Creation
 class CourseFactory:
     @staticmethod
-    def create_course(title, description, instructor='Unknown', credits=3):
-        return {
-            'id': CourseService.get_next_id(),
-            'title': title,
-            'description': description,
-            'instructor': instructor,
-            'credits': credits,
-            'students': [],  # List of enrolled students
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
+    def create_course(title, description, instructor='Unknown', credits=3, course_id=None):
+        return CourseRecord(
+            id=course_id if course_id is not None else CourseService.get_next_id(),
+            title=title,
+            description=description,
+            instructor=instructor,
+            credits=credits,
+            students=StudentRoster(),  # Enrolled students keyed by id
+            created_at=_now_timestamp(),
+            updated_at=_now_timestamp()
+        )
     
     @staticmethod
     def create_student(name, email, student_id):
-        return {
-            'id': student_id,
-            'name': name,
-            'email': email,
-            'enrolled_at': datetime.now().isoformat(),
-            'grade': None
-        }
+        return StudentRecord(
+            id=student_id,
+            name=name,
+            email=email,
+            enrolled_at=_now_timestamp(),
+            grade=None
+        )
 
 # Design Pattern: Observer Pattern for Course Notifications
 class CourseObserver:
+    # Synchronous observers always run inside the request, even when an
+    # asynchronous dispatcher is configured
+    synchronous = False
+    
     def update(self, course, event_type):
         pass
+    
+    def update_batch(self, course, event_type, count):
+        """Handle count consecutive events of one type for one course"""
+        for _ in range(count):
+            self.update(course, event_type)
 
 class EmailNotifier(CourseObserver):
     def update(self, course, event_type):
         print(f"[Email] Course '{course['title']}' - Event: {event_type}")
+    
+    def update_batch(self, course, event_type, count):
+        print(f"[Email] Course '{course['title']}' - Event: {event_type} x{count}")
 
 class LogNotifier(CourseObserver):
     def update(self, course, event_type):
         print(f"[Log] Course '{course['title']}' - Event: {event_type}")
+    
+    def update_batch(self, course, event_type, count):
+        print(f"[Log] Course '{course['title']}' - Event: {event_type} x{count}")
+
+class CacheInvalidationObserver(CourseObserver):
+    """Drops cached responses that a course event made stale"""
+    synchronous = True
+    EVENTS = ('created', 'updated', 'deleted', 'student_enrolled', 'students_enrolled',
+              'student_removed', 'grade_updated')
+    
+    def __init__(self, cache):
+        self.cache = cache
+    
+    def update(self, course, event_type):
+        if event_type in self.EVENTS:
+            self.cache.invalidate(('course', course['id']))
+            self.cache.invalidate('list')
+            # An update may have moved the course to another instructor
+            self.cache.invalidate('instructor')
+            self.cache.invalidate('grades')
+
+# Design Pattern: Registry for runtime metrics
+class Histogram:
+    """Fixed-bucket latency histogram in seconds"""
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = self.BUCKETS[index - 1] if index else 0.0
+                high = self.BUCKETS[index] if index < len(self.BUCKETS) else self.BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.BUCKETS[-1]
+
+class _Timer:
+    """Context manager that observes its own duration"""
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+    
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+class Metrics:
+    """Counters and latency histograms rendered in the Prometheus text format.
+    
+    Instrumentation only exists when metrics are enabled; timings on hot
+    paths (requests, lock waits, observer calls) are additionally sampled
+    at ``sample_rate``.
+    """
+    HELP = {
+        'course_http_requests_total': ('counter', 'HTTP requests by route, method and status'),
+        'course_http_request_duration_seconds': ('histogram', 'Sampled HTTP request latency'),
+        'course_storage_duration_seconds': ('histogram', 'Repository load and save duration'),
+        'course_storage_bytes_written_total': ('counter', 'Bytes written by repository saves'),
+        'course_lock_wait_seconds': ('histogram', 'Sampled time spent waiting for service locks'),
+        'course_observer_delivery_seconds': ('histogram', 'Sampled observer notification time'),
+    }
+    QUANTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(self, sample_rate=1.0):
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+    
+    def sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+    
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+    
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+    
+    def histogram(self, name, **labels):
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+    
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ''
+        escaped = []
+        for key, value in pairs:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+    
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(h.counts), h.sum, h.count, [h.quantile(q) for q in self.QUANTILES])
+                                for key, h in self._histograms.items())
+        lines = []
+        described = set()
+        
+        def describe(name, kind=None):
+            if name not in described:
+                described.add(name)
+                help_kind, help_text = self.HELP.get(name, ('untyped', name))
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind or help_kind}')
+        
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f'{name}{self._labels(labels)} {value}')
+        for (name, labels), counts, total, count, quantiles in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket in zip(Histogram.BUCKETS + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{self._labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{self._labels(labels)} {total}')
+            lines.append(f'{name}_count{self._labels(labels)} {count}')
+        for (name, labels), _, _, _, quantiles in histograms:
+            describe(f'{name}_quantile', 'gauge')
+            for q, value in zip(self.QUANTILES, quantiles):
+                lines.append(f'{name}_quantile{self._labels(labels + (("quantile", q),))} {value}')
+        return '\n'.join(lines) + '\n'
+
+class TimedLock:
+    """Wraps a lock and records how long sampled acquisitions waited"""
+    
+    def __init__(self, lock, metrics, name):
+        self._lock = lock
+        self._metrics = metrics
+        self._name = name
+    
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._metrics.sampled():
+            return self._lock.acquire(blocking, timeout)
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._metrics.observe('course_lock_wait_seconds', time.perf_counter() - started, lock=self._name)
+        return acquired
+    
+    def release(self):
+        self._lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+# Design Pattern: Asynchronous observer dispatch
+class AsyncObserverDispatcher:
+    """Delivers observer notifications from a pool of worker threads.
+    
+    Events go to bounded per-worker queues; a course always maps to the same
+    worker, so its events keep their order. A worker folds consecutive
+    events of the same type for the same course into one update_batch()
+    call. When a queue is full the backpressure policy decides whether the
+    caller blocks, the new or oldest event is dropped, or the caller
+    delivers the event itself.
+    """
+    POLICIES = ('block', 'drop_new', 'drop_oldest', 'caller_runs')
+    _STOP = object()
+    
+    def __init__(self, workers=2, queue_size=10000, backpressure='block', metrics=None):
+        if backpressure not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.backpressure = backpressure
+        self.metrics = metrics
+        self._queues = [queue.Queue(max(1, queue_size // workers)) for _ in range(workers)]
+        self._stats_lock = threading.Lock()
+        self.delivered = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self._threads = [threading.Thread(target=self._run, args=(q,), name=f'observer-{i}', daemon=True)
+                         for i, q in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+    
+    def submit(self, course, event_type, observers):
+        """Queue one event for the given observers"""
+        if not observers:
+            return
+        item = (course, event_type, tuple(observers), time.monotonic())
+        q = self._queues[hash(course['id']) % len(self._queues)]
+        if self.backpressure == 'block':
+            q.put(item)
+            return
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            if self.backpressure == 'caller_runs':
+                self._deliver(item, 1)
+            elif self.backpressure == 'drop_oldest':
+                # Other producers may refill the slot, so drop until the event fits
+                while True:
+                    try:
+                        q.get_nowait()
+                        self._count_drop()
+                    except queue.Empty:
+                        pass
+                    try:
+                        q.put_nowait(item)
+                        return
+                    except queue.Full:
+                        continue
+            else:
+                self._count_drop()
+    
+    def _count_drop(self):
+        with self._stats_lock:
+            self.dropped += 1
+    
+    def _run(self, q):
+        item = q.get()
+        while item is not self._STOP:
+            count = 1
+            following = None
+            # Fold the run of identical events already waiting in the queue
+            while True:
+                try:
+                    following = q.get_nowait()
+                except queue.Empty:
+                    following = None
+                    break
+                if (following is self._STOP or following[0]['id'] != item[0]['id']
+                        or following[1:3] != item[1:3]):
+                    break
+                count += 1
+            self._deliver(item, count)
+            item = following if following is not None else q.get()
+    
+    def _deliver(self, item, count):
+        course, event_type, observers, enqueued_at = item
+        for observer in observers:
+            try:
+                if self.metrics is not None and self.metrics.sampled():
+                    with self.metrics.timer('course_observer_delivery_seconds', observer=type(observer).__name__):
+                        observer.update_batch(course, event_type, count)
+                else:
+                    observer.update_batch(course, event_type, count)
+            except Exception as e:
+                print(f"[Dispatcher] Observer {type(observer).__name__} failed: {e}")
+                with self._stats_lock:
+                    self.failed += 1
+        lag = time.monotonic() - enqueued_at
+        with self._stats_lock:
+            self.delivered += count
+            self.batches += 1
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+    
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+    
+    def stats(self):
+        """Return queue depth, delivery counters and delivery lag in seconds"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self.queue_depth(),
+                'delivered': self.delivered,
+                'batches': self.batches,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'lag_avg': self.lag_total / self.batches if self.batches else 0.0,
+                'lag_max': self.lag_max
+            }
+    
+    def close(self):
+        """Deliver everything still queued and stop the workers"""
+        for q in self._queues:
+            q.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+
+# Design Pattern: Cache of encoded API responses
+class ResponseCache:
+    """Byte-bounded LRU cache of pre-encoded response bodies.
+    
+    Entries belong to a group so that an observer can drop everything
+    derived from one course, or every list view, in a single call.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return the cached body for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, body, group):
+        """Cache body under key, evicting least recently used entries to fit"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (body, group)
+            self._groups.setdefault(group, set()).add(key)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+    
+    def invalidate(self, group):
+        """Drop every entry of a group"""
+        with self._lock:
+            for key in list(self._groups.get(group, ())):
+                self._discard(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+    
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            body, group = entry
+            self._bytes -= len(body)
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+    
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
 
 # Design Pattern: Repository for Data Access
 class CourseRepository:
+    # Whether save_change writes only the change (True) or the whole catalog
+    incremental = False
+    # Whether a change grows the storage files (True) or rewrites the files it touches
+    appends = False
+    # Number of times this repository rewrote the storage files
+    rewrites = 0
+    COURSE_FIELDS = ['id', 'title', 'description', 'instructor', 'credits', 'created_at', 'updated_at']
+    STUDENT_FIELDS = ['course_id', 'student_id', 'name', 'email', 'grade', 'enrolled_at']
+
     def __init__(self, config):
         self.config = config
+        self._write_lock = threading.RLock()
+        self._roster_index = {}
+        self._roster_fields = self.STUDENT_FIELDS
+        self._roster_file = None
+        self._roster_map = None
+    
+    @staticmethod
+    def _credits_from_text(value):
+        """Stored credits as an int; values that do not parse are kept as given"""
+        # The API accepts any credits value, so one odd course must not stop startup
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    
+    @staticmethod
+    def _course_from_row(row):
+        """Build a course record from a courses.csv row"""
+        # Slot values are filled in directly; going through __setitem__ for
+        # every field more than doubles the load time of large catalogs
+        created_at = row['created_at']
+        updated_at = row['updated_at']
+        packed_created = _pack_timestamp(created_at)
+        packed_updated = packed_created if updated_at == created_at else _pack_timestamp(updated_at)
+        return CourseRecord.from_slot_values((
+            int(row['id']),
+            row['title'],
+            row['description'],
+            _intern(row['instructor']),
+            CourseRepository._credits_from_text(row['credits']),
+            StudentRoster(),
+            packed_created,
+            packed_updated
+        ))
+    
+    @staticmethod
+    def _student_from_row(row):
+        """Build a student record from a students.csv row"""
+        grade = row.get('grade')
+        return StudentRecord.from_slot_values((
+            row['student_id'],
+            row['name'],
+            row['email'],
+            _pack_timestamp(row['enrolled_at']),
+            _intern(grade) if grade else None
+        ))
+    
+    @staticmethod
+    def _course_to_row(course):
+        """Build a courses.csv row from a course dict"""
+        return {
+            'id': course['id'],
+            'title': course['title'],
+            'description': course['description'],
+            'instructor': course['instructor'],
+            'credits': course['credits'],
+            'created_at': course['created_at'],
+            'updated_at': course['updated_at']
+        }
+    
+    @staticmethod
+    def _student_to_row(course_id, student):
+        """Build a students.csv row from a student dict"""
+        return {
+            'course_id': course_id,
+            'student_id': student['id'],
+            'name': student['name'],
+            'email': student['email'],
+            'grade': student.get('grade'),
+            'enrolled_at': student['enrolled_at']
+        }
     
     def load_courses(self):
-        """Load courses from CSV files"""
+        """Load courses from the binary snapshot, or from CSV files when it is stale"""
         if self.config.testing:
             return []  # Return empty list in tests
+        if self.config.use_snapshot:
+            courses = self._load_snapshot()
+            if courses is not None:
+                return courses
+        courses, complete = self._load_csv()
+        if self.config.use_snapshot and complete:
+            with self._write_lock:
+                self._write_snapshot(courses)
+        return courses
+    
+    def _load_csv(self):
+        """Parse the CSV files, returning (courses, whether every row was read)"""
         courses = []
         course_dict = {}
+        complete = True
         
         # Load courses
         if os.path.exists(self.config.get_courses_file()):
@@ -94,148 +905,2079 @@ class CourseRepository:
                 with open(self.config.get_courses_file(), 'r', newline='', encoding='utf-8') as f:
                     reader = csv.DictReader(f)
                     for row in reader:
-                        course = {
-                            'id': int(row['id']),
-                            'title': row['title'],
-                            'description': row['description'],
-                            'instructor': row['instructor'],
-                            'credits': int(row['credits']),
-                            'students': [],
-                            'created_at': row['created_at'],
-                            'updated_at': row['updated_at']
-                        }
+                        course = self._course_from_row(row)
                         courses.append(course)
                         course_dict[course['id']] = course
             except:
-                pass
+                complete = False
         
         # Load students
-        if os.path.exists(self.config.get_students_file()):
+        if self.config.lazy_rosters:
+            self._attach_lazy_rosters(course_dict)
+        elif os.path.exists(self.config.get_students_file()):
             try:
                 with open(self.config.get_students_file(), 'r', newline='', encoding='utf-8') as f:
                     reader = csv.DictReader(f)
                     for row in reader:
-                        student = {
-                            'id': row['student_id'],
-                            'name': row['name'],
-                            'email': row['email'],
-                            'enrolled_at': row['enrolled_at'],
-                            'grade': row.get('grade') if row.get('grade') else None
-                        }
+                        student = self._student_from_row(row)
                         course_id = int(row['course_id'])
                         if course_id in course_dict:
-                            course_dict[course_id]['students'].append(student)
+                            course_dict[course_id]['students'].add(student)
             except:
-                pass
+                complete = False
         
+        return courses, complete
+    
+    SNAPSHOT_FORMAT = 1
+    # Slots whose values come back from CSV as int; every other slot comes
+    # back as str, except an empty grade, which becomes None
+    _CSV_INT_SLOTS = frozenset(('id', 'credits', '_created_at', '_updated_at', '_enrolled_at'))
+    
+    def _snapshot_sources(self):
+        """(size, mtime_ns) of each CSV file, None where a file is missing"""
+        sources = []
+        for path in (self.config.get_courses_file(), self.config.get_students_file()):
+            try:
+                stat = os.stat(path)
+                sources.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                sources.append(None)
+        return tuple(sources)
+    
+    def _read_snapshot(self):
+        """Read the snapshot file, or None if it is missing or stale"""
+        try:
+            with open(self.config.get_snapshot_file(), 'rb') as f:
+                # One read; marshal.load() on a file object reads in tiny chunks
+                snapshot = marshal.loads(f.read())
+            if (snapshot['format'] != self.SNAPSHOT_FORMAT or snapshot['lazy'] != self.config.lazy_rosters
+                    or tuple(snapshot['sources']) != self._snapshot_sources()):
+                return None
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            return None
+        return snapshot
+    
+    def _load_snapshot(self):
+        """Rebuild the courses from the snapshot, or None if it is missing or stale"""
+        # Millions of new objects would otherwise set off repeated full collections
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            snapshot = self._read_snapshot()
+            if snapshot is None:
+                return None
+            courses = []
+            restore = StudentRecord.from_slot_values
+            for course_values, student_values in snapshot['courses']:
+                course = CourseRecord.from_slot_values(course_values)
+                roster = course.students = StudentRoster()
+                roster._students = {student.id: student for student in map(restore, student_values)}
+                courses.append(course)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if self.config.lazy_rosters:
+            self._attach_lazy_rosters({course['id']: course for course in courses})
         return courses
     
+    @classmethod
+    def _csv_stable(cls, record):
+        """Whether a record reads back from CSV with exactly the values it holds"""
+        for slot in record.__slots__:
+            value = getattr(record, slot)
+            if slot == 'students':
+                continue
+            if slot in cls._CSV_INT_SLOTS:
+                if type(value) is int:
+                    continue
+                return False
+            if type(value) is str and (value or slot != 'grade'):
+                continue
+            if value is None and slot == 'grade':
+                continue
+            return False
+        return True
+    
+    def _snapshot_values(self, record, to_row, from_row):
+        """Slot values a record would have after a round trip through CSV"""
+        if not (isinstance(record, Record) and self._csv_stable(record)):
+            row = {key: '' if value is None else str(value) for key, value in to_row(record).items()}
+            record = from_row(row)
+        return record.slot_values()
+    
+    def _write_snapshot(self, courses):
+        """Write the binary snapshot of courses matching the current CSV files"""
+        path = self.config.get_snapshot_file()
+        courses = list(courses)
+        if not courses:
+            # courses.csv is left untouched when there is nothing to save
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        students_slot = CourseRecord.__slots__.index('students')
+        course_to_row = self._course_to_row
+        try:
+            entries = []
+            for course in courses:
+                values = list(self._snapshot_values(course, course_to_row, self._course_from_row))
+                values[students_slot] = None
+                students = []
+                if not self.config.lazy_rosters:
+                    student_to_row = functools.partial(self._student_to_row, course['id'])
+                    students = [self._snapshot_values(student, student_to_row, self._student_from_row)
+                                for student in list(course['students'])]
+                entries.append((tuple(values), students))
+        except (KeyError, TypeError, ValueError):
+            # A value the CSV reader would reject; startup will parse the CSVs
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        snapshot = {'format': self.SNAPSHOT_FORMAT, 'lazy': self.config.lazy_rosters,
+                    'sources': self._snapshot_sources(), 'courses': entries}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            marshal.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    
+    def _index_file(self):
+        return self.config.get_students_file() + '.idx'
+    
+    def _attach_lazy_rosters(self, course_dict):
+        """Give every course a roster that loads from students.csv on demand"""
+        with self._write_lock:
+            self._open_roster_index()
+        for course_id, course in course_dict.items():
+            if course_id in self._roster_index:
+                course['students'] = LazyStudentRoster(functools.partial(self._read_roster, course_id))
+    
+    def _open_roster_index(self):
+        """Load (or build and persist) the byte-offset index of students.csv"""
+        path = self.config.get_students_file()
+        self._close_roster_map()
+        self._roster_index = {}
+        if not os.path.exists(path):
+            return
+        stat = os.stat(path)
+        index = None
+        if os.path.exists(self._index_file()):
+            try:
+                with open(self._index_file(), 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if (index['size'], index['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+                    index = None
+            except (ValueError, KeyError):
+                index = None
+        if index is None:
+            index = self._build_roster_index(path)
+            self._write_roster_index(index['fieldnames'], index['ranges'])
+        self._roster_fields = index['fieldnames']
+        self._roster_index = {int(course_id): ranges for course_id, ranges in index['ranges'].items()}
+        self._map_roster_file()
+    
+    def _build_roster_index(self, path):
+        """Scan students.csv once, recording the byte ranges of each course's rows.
+        
+        Adjacent rows of the same course are merged into one range, so a file
+        written by save_courses needs a single range per course.
+        """
+        ranges = {}
+        with open(path, 'rb') as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+            column = fieldnames.index('course_id')
+            offset = len(header)
+            record = []
+            quotes = 0
+            for line in f:
+                if not record:
+                    start = offset
+                record.append(line)
+                offset += len(line)
+                quotes += line.count(b'"')
+                if quotes % 2:
+                    continue  # Quoted field spans lines
+                data = b''.join(record)
+                record = []
+                quotes = 0
+                if not data.strip():
+                    continue
+                if column == 0 and not data.startswith(b'"'):
+                    course_id = data.split(b',', 1)[0].decode('ascii')
+                else:
+                    course_id = next(csv.reader([data.decode('utf-8')]))[column]
+                course_ranges = ranges.setdefault(course_id, [])
+                if course_ranges and course_ranges[-1][1] == start:
+                    course_ranges[-1][1] = offset
+                else:
+                    course_ranges.append([start, offset])
+        return {'fieldnames': fieldnames, 'ranges': ranges}
+    
+    def _write_roster_index(self, fieldnames, ranges):
+        """Persist the offset index next to students.csv"""
+        stat = os.stat(self.config.get_students_file())
+        index = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'fieldnames': fieldnames,
+            'ranges': {str(course_id): r for course_id, r in ranges.items()}
+        }
+        tmp_path = self._index_file() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_file())
+    
+    def _map_roster_file(self):
+        path = self.config.get_students_file()
+        if os.path.getsize(path) == 0:
+            return
+        self._roster_file = open(path, 'rb')
+        self._roster_map = mmap.mmap(self._roster_file.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _close_roster_map(self):
+        if self._roster_map is not None:
+            self._roster_map.close()
+            self._roster_map = None
+        if self._roster_file is not None:
+            self._roster_file.close()
+            self._roster_file = None
+    
+    def _roster_bytes(self, course_id):
+        return b''.join(self._roster_map[start:end] for start, end in self._roster_index.get(course_id, ()))
+    
+    def _read_roster(self, course_id):
+        """Materialize one course's students from the memory-mapped file"""
+        with self._write_lock:
+            data = self._roster_bytes(course_id)
+        reader = csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=self._roster_fields)
+        return [self._student_from_row(row) for row in reader]
+    
     def save_courses(self, courses):
         """Save courses to CSV files"""
         if self.config.testing:
             return  # Skip file I/O in tests
+        with self._write_lock:
+            self._write_csv_files(courses)
+    
+    def save_change(self, courses, event_type, course, students=()):
+        """Persist a single mutation.
+        
+        The plain CSV layout has no unit smaller than a whole file, so this
+        rewrites everything; subclasses override it to write only the change.
+        """
+        self.save_courses(courses)
+    
+    def save_changes(self, courses, changes):
+        """Persist a batch of (event_type, course, students) mutations.
+        
+        As with save_change, the plain CSV layout rewrites everything, but
+        only once for the whole batch.
+        """
+        if changes:
+            self.save_courses(courses)
+    
+    def storage_files(self, course_ids=None):
+        """Paths of the files holding the catalog.
+        
+        Given course ids, only the files a change to those courses writes.
+        """
+        return [self.config.get_courses_file(), self.config.get_students_file(),
+                self.config.get_snapshot_file()]
+    
+    def close(self):
+        """Release any resources held by the repository"""
+        with self._write_lock:
+            self._close_roster_map()
+    
+    def _write_csv_files(self, courses):
+        """Write courses.csv and students.csv from the given courses"""
+        # list() copies are taken in one step, so a background writer never
+        # iterates a dict that a request thread is resizing
+        courses = list(courses)
+        self.rewrites += 1
         # Save courses
         if courses:
-            with open(self.config.get_courses_file(), 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['id', 'title', 'description', 'instructor', 'credits', 'created_at', 'updated_at']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                for course in courses:
-                    writer.writerow({
-                        'id': course['id'],
-                        'title': course['title'],
-                        'description': course['description'],
-                        'instructor': course['instructor'],
-                        'credits': course['credits'],
-                        'created_at': course['created_at'],
-                        'updated_at': course['updated_at']
-                    })
+            rows = (self._course_to_row(course) for course in courses)
+            self._write_csv(self.config.get_courses_file(), self.COURSE_FIELDS, rows)
         
         # Save students
-        with open(self.config.get_students_file(), 'w', newline='', encoding='utf-8') as f:
-            fieldnames = ['course_id', 'student_id', 'name', 'email', 'grade', 'enrolled_at']
+        if self.config.lazy_rosters:
+            self._write_students_lazily(courses)
+        else:
+            rows = (self._student_to_row(course['id'], student)
+                    for course in courses for student in list(course['students']))
+            self._write_csv(self.config.get_students_file(), self.STUDENT_FIELDS, rows)
+        if self.config.use_snapshot:
+            self._write_snapshot(courses)
+    
+    def _write_students_lazily(self, courses):
+        """Write students.csv without loading rosters that were never touched.
+        
+        Untouched rosters are copied as raw bytes from the old file, and the
+        offset index is rebuilt from the positions written.
+        """
+        path = self.config.get_students_file()
+        tmp_path = path + '.tmp'
+        copy_raw = self._roster_fields == self.STUDENT_FIELDS
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        ranges = {}
+        with open(tmp_path, 'wb') as f:
+            writer.writerow(self.STUDENT_FIELDS)
+            f.write(buffer.getvalue().encode('utf-8'))
+            buffer.seek(0)
+            buffer.truncate()
+            for course in courses:
+                start = f.tell()
+                roster = course['students']
+                if copy_raw and isinstance(roster, LazyStudentRoster) and not roster.loaded:
+                    f.write(self._roster_bytes(course['id']))
+                else:
+                    for student in list(roster):
+                        row = self._student_to_row(course['id'], student)
+                        writer.writerow([row[field] for field in self.STUDENT_FIELDS])
+                f.write(buffer.getvalue().encode('utf-8'))
+                buffer.seek(0)
+                buffer.truncate()
+                if f.tell() > start:
+                    ranges[course['id']] = [[start, f.tell()]]
+        # The old file must be unmapped before it can be replaced on Windows
+        self._close_roster_map()
+        os.replace(tmp_path, path)
+        self._roster_index = ranges
+        self._roster_fields = self.STUDENT_FIELDS
+        self._write_roster_index(self.STUDENT_FIELDS, ranges)
+        self._map_roster_file()
+    
+    @staticmethod
+    def _write_csv(path, fieldnames, rows):
+        """Write rows to a temporary file and move it over path"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+
+# Design Pattern: Repository with an append-only journal
+class JournaledCourseRepository(CourseRepository):
+    """CSV repository that appends each mutation to a journal file.
+    
+    The CSV files act as a snapshot. Every mutation is appended to the
+    journal as one JSON line, so write cost depends on the size of the
+    change rather than the size of the catalog. Startup replays the journal
+    on top of the snapshot, and once the journal grows past
+    ``journal_compact_threshold`` records it is folded back into the CSVs by a
+    background thread.
+    """
+    incremental = True
+    appends = True
+    
+    def __init__(self, config):
+        super().__init__(config)
+        self._lock = threading.Lock()
+        self._journal = None
+        self._records = 0
+        self._compaction = None
+        # (inode, offset) of the journal up to which records have been applied
+        self._position = (None, 0)
+    
+    def _compacting_file(self):
+        return self.config.get_journal_file() + '.compacting'
+    
+    def load_courses(self):
+        """Load the CSV snapshot and replay the journal on top of it"""
+        courses = super().load_courses()
+        if self.config.testing:
+            return courses
+        with self._lock:
+            # Another process may have rotated the file this handle points at
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+        course_dict = {course['id']: course for course in courses}
+        leftover = os.path.exists(self._compacting_file())
+        if leftover:
+            self._replay(self._compacting_file(), courses, course_dict)
+        path = self.config.get_journal_file()
+        self._records, offset = self._replay(path, courses, course_dict)
+        if os.path.exists(path) and os.path.getsize(path) > offset:
+            # Drop the torn tail so the next append starts on a fresh line
+            os.truncate(path, offset)
+        self._position = (os.stat(path).st_ino if os.path.exists(path) else None, offset)
+        courses = list(course_dict.values())
+        if leftover:
+            # A previous compaction did not finish; fold everything now
+            self.compact(courses)
+        return courses
+    
+    def _replay(self, path, courses, course_dict):
+        """Apply every record of a journal file, returning (record count, bytes read)"""
+        if not os.path.exists(path):
+            return 0, 0
+        count = 0
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Torn write at the tail of the journal
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply_record(course_dict, record)
+                count += 1
+                offset += len(line)
+        return count, offset
+    
+    def read_new_records(self):
+        """Return the records other processes appended since the last read.
+        
+        Returns None when the journal was rotated or truncated in the
+        meantime, in which case the caller has to reload everything.
+        """
+        path = self.config.get_journal_file()
+        with self._lock:
+            inode, offset = self._position
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return [] if offset == 0 else None
+            if (inode is not None and stat.st_ino != inode) or stat.st_size < offset:
+                return None
+            records = []
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Only complete lines; the writer is still going
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    offset += len(line)
+            self._position = (stat.st_ino, offset)
+            self._records += len(records)
+            return records
+    
+    @staticmethod
+    def _apply_record(course_dict, record):
+        """Apply one journal record to the loaded courses"""
+        op = record['op']
+        if op in ('created', 'updated'):
+            data = record['course']
+            course = course_dict.get(data['id'])
+            if course is None:
+                course = CourseRecord(data, students=StudentRoster())
+                course_dict[course['id']] = course
+            else:
+                course.update(data)
+            return
+        if op == 'deleted':
+            course_dict.pop(record['course_id'], None)
+            return
+        course = course_dict.get(record['course_id'])
+        if course is None:
+            return
+        course['updated_at'] = record['updated_at']
+        if op == 'student_removed':
+            for student_id in record['student_ids']:
+                course['students'].pop(student_id)
+            return
+        for student in record['students']:
+            course['students'].add(StudentRecord(student))
+    
+    @staticmethod
+    def _make_record(event_type, course, students):
+        """Build the journal record describing one mutation"""
+        if event_type in ('created', 'updated'):
+            data = {key: value for key, value in course.items() if key != 'students'}
+            return {'op': event_type, 'course': data}
+        if event_type == 'deleted':
+            return {'op': event_type, 'course_id': course['id']}
+        record = {'op': event_type, 'course_id': course['id'], 'updated_at': course['updated_at']}
+        if event_type == 'student_removed':
+            record['student_ids'] = [student['id'] for student in students]
+        else:
+            record['students'] = [dict(student) for student in students]
+        return record
+    
+    def storage_files(self, course_ids=None):
+        return super().storage_files(course_ids) + [self.config.get_journal_file()]
+    
+    def save_change(self, courses, event_type, course, students=()):
+        """Append one record to the journal"""
+        self.save_changes(courses, [(event_type, course, students)])
+    
+    def save_changes(self, courses, changes):
+        """Append a batch of records with a single flush"""
+        if self.config.testing:
+            return
+        lines = ''.join(json.dumps(self._make_record(*change), ensure_ascii=False) + '\n'
+                        for change in changes)
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.config.get_journal_file(), 'a', encoding='utf-8')
+            self._journal.write(lines)
+            self._journal.flush()
+            if self.config.journal_fsync:
+                os.fsync(self._journal.fileno())
+            stat = os.fstat(self._journal.fileno())
+            self._position = (stat.st_ino, stat.st_size)
+            self._records += len(changes)
+            if self._records >= self.config.journal_compact_threshold:
+                if self.config.multiprocess:
+                    # Other workers tail the journal, so it is only rotated
+                    # while the cross-process write lock is held
+                    self._compact_locked(courses)
+                else:
+                    self._start_compaction(courses)
+    
+    def _start_compaction(self, courses):
+        """Rotate the journal and fold it into the CSVs in the background"""
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        os.replace(self.config.get_journal_file(), self._compacting_file())
+        self._records = 0
+        # Copy the rows now so the background writer sees a consistent state
+        snapshot = [_copy_course(course) for course in list(courses)]
+        self._compaction = threading.Thread(target=self._finish_compaction, args=(snapshot,), daemon=True)
+        self._compaction.start()
+    
+    def _finish_compaction(self, snapshot):
+        # Lazy roster reads use the mapped students.csv this replaces
+        with self._write_lock:
+            self._write_csv_files(snapshot)
+        os.remove(self._compacting_file())
+    
+    def save_courses(self, courses):
+        """Write a full snapshot and truncate the journal"""
+        if self.config.testing:
+            return
+        self.compact(courses)
+    
+    def compact(self, courses):
+        """Fold the journal into the CSV files synchronously"""
+        with self._lock:
+            self._compact_locked(courses)
+    
+    def _compact_locked(self, courses):
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        with self._write_lock:
+            self._write_csv_files(courses)
+        for path in (self.config.get_journal_file(), self._compacting_file()):
+            if os.path.exists(path):
+                os.remove(path)
+        self._records = 0
+        self._position = (None, 0)
+    
+    def close(self):
+        """Wait for a running compaction and close the journal"""
+        with self._lock:
+            if self._compaction is not None:
+                self._compaction.join()
+                self._compaction = None
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+        super().close()
+
+# Design Pattern: Decorator adding write-behind persistence to a repository
+class WriteBehindRepository:
+    """Moves the writes of another repository onto a background flusher.
+    
+    Mutations only mark the state dirty and return a ticket. The flusher
+    waits ``write_behind_window`` seconds to gather the writes of a burst,
+    then persists them together: one full save for whole-file repositories,
+    or one batched append for incremental ones. Callers that need durability
+    wait on their ticket (group commit), either explicitly through wait() or
+    for every write when ``write_behind_durable`` is set.
+    """
+    
+    def __init__(self, inner):
+        self.inner = inner
+        self.config = inner.config
+        self._cond = threading.Condition()
+        self._changes = []
+        self._full_save = False
+        self._courses = None
+        self._submitted = 0
+        self._flushed = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+    
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+    
+    def load_courses(self):
+        return self.inner.load_courses()
+    
+    def save_courses(self, courses):
+        """Schedule a full save and return its ticket"""
+        return self._submit(courses, None)
+    
+    def save_change(self, courses, event_type, course, students=()):
+        """Schedule a single mutation and return its ticket"""
+        changes = [(event_type, course, list(students))] if self.inner.incremental else None
+        return self._submit(courses, changes)
+    
+    def save_changes(self, courses, changes):
+        """Schedule a batch of mutations and return its ticket"""
+        if self.inner.incremental:
+            changes = [(event_type, course, list(students)) for event_type, course, students in changes]
+        else:
+            changes = None
+        return self._submit(courses, changes)
+    
+    def _submit(self, courses, changes):
+        if self.config.testing:
+            return 0
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Repository is closed')
+            self._courses = courses
+            if changes is not None:
+                self._changes.extend(changes)
+            else:
+                self._full_save = True
+            self._submitted += 1
+            ticket = self._submitted
+            self._cond.notify_all()
+        if self.config.write_behind_durable:
+            self.wait(ticket)
+        return ticket
+    
+    def wait(self, ticket=None, timeout=None):
+        """Block until the given ticket (default: every write so far) is on disk"""
+        with self._cond:
+            if ticket is None:
+                ticket = self._submitted
+            return self._cond.wait_for(lambda: self._flushed >= ticket, timeout)
+    
+    def flush(self, timeout=None):
+        """Wait until every write submitted so far is on disk"""
+        return self.wait(None, timeout)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._submitted > self._flushed or self._closed)
+                if self._closed and self._submitted == self._flushed:
+                    return
+                # Gather the rest of the burst into the same write; close()
+                # cuts the wait short
+                self._cond.wait_for(lambda: self._closed, self.config.write_behind_window)
+                courses, changes, full_save = self._courses, self._changes, self._full_save
+                self._changes = []
+                self._full_save = False
+                ticket = self._submitted
+            try:
+                # A full save writes the live state, which covers any changes
+                if full_save:
+                    self.inner.save_courses(courses)
+                else:
+                    self.inner.save_changes(courses, changes)
+            except Exception as e:
+                print(f"[WriteBehind] Flush failed: {e}")
+                with self._cond:
+                    if self._closed:
+                        return
+                    self._changes = changes + self._changes
+                    self._full_save = self._full_save or full_save
+                    self._cond.wait_for(lambda: self._closed, self.config.write_behind_window)
+                continue
+            with self._cond:
+                self._flushed = ticket
+                self._cond.notify_all()
+    
+    def close(self):
+        """Flush outstanding writes, stop the flusher and close the inner repository"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.inner.close()
+
+# Design Pattern: Decorator that measures repository I/O
+class InstrumentedRepository:
+    """Records the duration and bytes written of another repository's I/O.
+    
+    Bytes are the size of the files a save rewrites (every storage file for
+    a full save, the changed course files for shards), or the growth of the
+    storage files for repositories that append.
+    """
+    
+    def __init__(self, inner, metrics):
+        self.inner = inner
+        self.config = inner.config
+        self.metrics = metrics
+    
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+    
+    def _storage_bytes(self, course_ids=None):
+        total = 0
+        for path in self.inner.storage_files(course_ids):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+    
+    def _timed(self, operation, call, full_rewrite, course_ids=None):
+        if self.config.testing:
+            return call()
+        before = 0 if full_rewrite else self._storage_bytes(course_ids)
+        with self.metrics.timer('course_storage_duration_seconds', operation=operation):
+            result = call()
+        written = self._storage_bytes(course_ids) - before
+        if written > 0:
+            self.metrics.inc('course_storage_bytes_written_total', written, operation=operation)
+        return result
+    
+    def load_courses(self):
+        if self.config.testing:
+            return self.inner.load_courses()
+        with self.metrics.timer('course_storage_duration_seconds', operation='load_courses'):
+            return self.inner.load_courses()
+    
+    def save_courses(self, courses):
+        return self._timed('save_courses', lambda: self.inner.save_courses(courses), True)
+    
+    def save_change(self, courses, event_type, course, students=()):
+        return self._timed('save_change', lambda: self.inner.save_change(courses, event_type, course, students),
+                           not self.inner.appends, self._changed_ids([(event_type, course, students)]))
+    
+    def save_changes(self, courses, changes):
+        return self._timed('save_changes', lambda: self.inner.save_changes(courses, changes),
+                           not self.inner.appends, self._changed_ids(changes))
+    
+    def _changed_ids(self, changes):
+        """Ids of the courses whose files an incremental save rewrites"""
+        if not self.inner.incremental:
+            return None  # The whole catalog is rewritten
+        return {course['id'] for _, course, _ in changes}
+
+# Design Pattern: Repository backed by SQLite
+class SQLiteCourseRepository(CourseRepository):
+    """Repository storing courses and enrollments in a SQLite database.
+    
+    The database runs in WAL mode and every mutation becomes row-level
+    INSERT/UPDATE/DELETE statements, so writes never touch unrelated rows.
+    Enrollments keep their insertion order through the table's rowid.
+    """
+    incremental = True
+    appends = True
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS courses (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            instructor TEXT NOT NULL,
+            credits INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_courses_instructor ON courses (instructor);
+        CREATE TABLE IF NOT EXISTS enrollments (
+            course_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            grade TEXT,
+            enrolled_at TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_enrollments_course_student
+            ON enrollments (course_id, student_id);
+    """
+    UPSERT_COURSE = """
+        INSERT INTO courses (id, title, description, instructor, credits, created_at, updated_at)
+        VALUES (:id, :title, :description, :instructor, :credits, :created_at, :updated_at)
+        ON CONFLICT (id) DO UPDATE SET
+            title = excluded.title, description = excluded.description,
+            instructor = excluded.instructor, credits = excluded.credits,
+            created_at = excluded.created_at, updated_at = excluded.updated_at
+    """
+    UPSERT_ENROLLMENT = """
+        INSERT INTO enrollments (course_id, student_id, name, email, grade, enrolled_at)
+        VALUES (:course_id, :student_id, :name, :email, :grade, :enrolled_at)
+        ON CONFLICT (course_id, student_id) DO UPDATE SET
+            name = excluded.name, email = excluded.email,
+            grade = excluded.grade, enrolled_at = excluded.enrolled_at
+    """
+    
+    def __init__(self, config):
+        super().__init__(config)
+        self._conn = None
+    
+    def _connection(self):
+        """Open the database on first use"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.config.get_database_file(), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+    
+    def load_courses(self):
+        """Load courses and enrollments from the database"""
+        if self.config.testing:
+            return []
+        with self._write_lock:
+            conn = self._connection()
+            course_dict = {}
+            for row in conn.execute('SELECT * FROM courses ORDER BY id'):
+                course = self._course_from_row(row)
+                course_dict[course['id']] = course
+            for row in conn.execute('SELECT * FROM enrollments ORDER BY rowid'):
+                course = course_dict.get(row['course_id'])
+                if course is not None:
+                    course['students'].add(self._student_from_row(dict(row)))
+        return list(course_dict.values())
+    
+    def save_courses(self, courses):
+        """Replace the whole database contents in one transaction"""
+        if self.config.testing:
+            return
+        courses = list(courses)
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM enrollments')
+                conn.execute('DELETE FROM courses')
+                conn.executemany(self.UPSERT_COURSE, (self._course_to_row(c) for c in courses))
+                conn.executemany(self.UPSERT_ENROLLMENT,
+                                 (self._student_to_row(c['id'], s) for c in courses for s in list(c['students'])))
+    
+    def storage_files(self, course_ids=None):
+        return [self.config.get_database_file(), self.config.get_database_file() + '-wal']
+    
+    def save_change(self, courses, event_type, course, students=()):
+        """Apply one mutation as row-level statements"""
+        self.save_changes(courses, [(event_type, course, students)])
+    
+    def save_changes(self, courses, changes):
+        """Apply a batch of mutations in one transaction"""
+        if self.config.testing:
+            return
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                for event_type, course, students in changes:
+                    self._apply_change(conn, event_type, course, students)
+    
+    def _apply_change(self, conn, event_type, course, students):
+        if event_type in ('created', 'updated'):
+            conn.execute(self.UPSERT_COURSE, self._course_to_row(course))
+            return
+        if event_type == 'deleted':
+            conn.execute('DELETE FROM enrollments WHERE course_id = ?', (course['id'],))
+            conn.execute('DELETE FROM courses WHERE id = ?', (course['id'],))
+            return
+        conn.execute('UPDATE courses SET updated_at = ? WHERE id = ?', (course['updated_at'], course['id']))
+        if event_type == 'student_removed':
+            conn.executemany('DELETE FROM enrollments WHERE course_id = ? AND student_id = ?',
+                             ((course['id'], student['id']) for student in students))
+        else:
+            conn.executemany(self.UPSERT_ENROLLMENT,
+                             (self._student_to_row(course['id'], student) for student in students))
+    
+    def migrate_from_csv(self, csv_repository=None):
+        """One-shot copy of the CSV files into an empty database.
+        
+        Returns the number of courses migrated, or None if the database
+        already holds data.
+        """
+        with self._write_lock:
+            if self._connection().execute('SELECT 1 FROM courses LIMIT 1').fetchone():
+                return None
+        courses = (csv_repository or CourseRepository(self.config)).load_courses()
+        self.save_courses(courses)
+        return len(courses)
+    
+    def close(self):
+        """Close the database connection"""
+        with self._write_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Design Pattern: Repository with one file per course
+class ShardedCourseRepository(CourseRepository):
+    """Repository storing each course and its roster in a file of its own.
+    
+    Course files are spread over ``shard_buckets`` directories by id, and a
+    small manifest records the layout. A mutation rewrites only the file of
+    the course it touched, and deleting a course unlinks its file. On the
+    first start without a manifest the single-file CSVs are read and
+    sharded, so existing data carries over. The migration is staged in a
+    separate directory that only takes the shard directory's place once
+    every file and the manifest are written, so an interrupted migration
+    starts over from the CSVs on the next start.
+    """
+    incremental = True
+    SHARD_FORMAT = 1
+    
+    def __init__(self, config):
+        super().__init__(config)
+        self._buckets = config.shard_buckets
+    
+    def _manifest_file(self, root=None):
+        return os.path.join(root or self.config.get_shard_dir(), 'manifest.json')
+    
+    def _shard_file(self, course_id, root=None):
+        bucket = format(course_id % self._buckets, '02x')
+        return os.path.join(root or self.config.get_shard_dir(), bucket, f'{course_id}.json')
+    
+    def load_courses(self):
+        """Load every course file, migrating the CSV files on first use"""
+        if self.config.testing:
+            return []
+        if not os.path.exists(self._manifest_file()):
+            courses = super().load_courses()
+            self._migrate(courses)
+            return courses
+        with open(self._manifest_file(), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['format'] != self.SHARD_FORMAT:
+            raise ValueError(f"Unsupported shard format {manifest['format']}")
+        self._buckets = manifest['buckets']
+        courses = [self._read_shard(path) for path in self._shard_paths()]
+        courses.sort(key=lambda course: course['id'])
+        return courses
+    
+    def _shard_paths(self):
+        """Paths of all course files currently on disk"""
+        root = self.config.get_shard_dir()
+        for bucket in sorted(os.listdir(root)):
+            directory = os.path.join(root, bucket)
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    if name.endswith('.json'):
+                        yield os.path.join(directory, name)
+    
+    def _read_shard(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        course = self._course_from_row(shard['course'])
+        for row in shard['students']:
+            course['students'].add(self._student_from_row(row))
+        return course
+    
+    def _migrate(self, courses):
+        """Shard the given courses into a staging directory, then move it into place"""
+        root = os.path.normpath(self.config.get_shard_dir())
+        staging = root + '.migrating'
+        with self._write_lock:
+            self.rewrites += 1
+            shutil.rmtree(staging, ignore_errors=True)  # Left behind by an interrupted migration
+            for course in courses:
+                self._write_shard(course, staging)
+            self._write_manifest(staging)
+            # Without a manifest the directory holds no committed data
+            shutil.rmtree(root, ignore_errors=True)
+            os.replace(staging, root)
+    
+    def _write_shard(self, course, root=None):
+        """Write one course file through a temporary file"""
+        students = []
+        for student in list(course['students']):
+            row = self._student_to_row(course['id'], student)
+            del row['course_id']
+            students.append(row)
+        shard = {'course': self._course_to_row(course), 'students': students}
+        path = self._shard_file(course['id'], root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(shard, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    
+    def _write_manifest(self, root=None):
+        root = root or self.config.get_shard_dir()
+        os.makedirs(root, exist_ok=True)
+        tmp_path = self._manifest_file(root) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': self.SHARD_FORMAT, 'buckets': self._buckets}, f)
+        os.replace(tmp_path, self._manifest_file(root))
+    
+    def save_courses(self, courses):
+        """Write every course file and remove those of deleted courses"""
+        if self.config.testing:
+            return
+        courses = list(courses)
+        with self._write_lock:
+            if not os.path.exists(self._manifest_file()):
+                self._migrate(courses)
+                return
+            self.rewrites += 1
             for course in courses:
-                for student in course['students']:
-                    writer.writerow({
-                        'course_id': course['id'],
-                        'student_id': student['id'],
-                        'name': student['name'],
-                        'email': student['email'],
-                        'grade': student.get('grade'),
-                        'enrolled_at': student['enrolled_at']
-                    })
+                self._write_shard(course)
+            kept = {self._shard_file(course['id']) for course in courses}
+            for path in list(self._shard_paths()):
+                if path not in kept:
+                    os.remove(path)
+    
+    def storage_files(self, course_ids=None):
+        if course_ids is not None:
+            return [self._shard_file(course_id) for course_id in course_ids]
+        if not os.path.isdir(self.config.get_shard_dir()):
+            return []
+        return [self._manifest_file()] + list(self._shard_paths())
+    
+    def save_change(self, courses, event_type, course, students=()):
+        """Rewrite or unlink the file of the one course that changed"""
+        self.save_changes(courses, [(event_type, course, students)])
+    
+    def save_changes(self, courses, changes):
+        """Write each changed course once, however many changes it had"""
+        if self.config.testing:
+            return
+        latest = {}
+        for event_type, course, _ in changes:
+            latest[course['id']] = (event_type, course)
+        with self._write_lock:
+            for course_id, (event_type, course) in latest.items():
+                if event_type == 'deleted':
+                    if os.path.exists(self._shard_file(course_id)):
+                        os.remove(self._shard_file(course_id))
+                else:
+                    self._write_shard(course)
+
+# Design Pattern: Factory for Repository Creation
+class RepositoryFactory:
+    @staticmethod
+    def create_repository(config, metrics=None):
+        """Create the repository selected by config.storage_mode"""
+        if config.storage_mode == 'journal':
+            repository = JournaledCourseRepository(config)
+        elif config.storage_mode == 'sqlite':
+            repository = SQLiteCourseRepository(config)
+        elif config.storage_mode == 'sharded':
+            repository = ShardedCourseRepository(config)
+        else:
+            repository = CourseRepository(config)
+        if metrics is not None:
+            repository = InstrumentedRepository(repository, metrics)
+        if config.write_behind:
+            repository = WriteBehindRepository(repository)
+        return repository
+
+# Design Pattern: Coordinator for multi-process deployments
+class ProcessCoordinator:
+    """Serializes writes across worker processes and announces them.
+    
+    Writers hold an advisory lock on the lock file. The first bytes of the
+    file are memory-mapped and hold two counters: the generation, bumped by
+    every write, and the epoch, bumped only by writes that rewrote the
+    storage files instead of appending to the journal. Comparing them tells
+    a worker whether to do nothing, tail the journal or reload everything.
+    """
+    STATE = struct.Struct('<QQ')
+    
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < self.STATE.size:
+            os.ftruncate(self._fd, self.STATE.size)
+        self._map = mmap.mmap(self._fd, self.STATE.size)
+        # Threads of one process share the file lock through this one
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+    
+    @contextlib.contextmanager
+    def lock(self):
+        """Hold the cross-process write lock; reentrant within a thread"""
+        with self._thread_lock:
+            if self._depth == 0:
+                self._lock_file(True)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._lock_file(False)
+    
+    def _lock_file(self, locked):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if locked else fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK if locked else msvcrt.LK_UNLCK, 1)
+    
+    def state(self):
+        """Return the (generation, epoch) last published by any process"""
+        return self.STATE.unpack_from(self._map)
+    
+    def publish(self, full):
+        """Announce a write made under the lock and return the new state"""
+        generation, epoch = self.state()
+        state = (generation + 1, epoch + 1 if full else epoch)
+        self.STATE.pack_into(self._map, 0, *state)
+        return state
+    
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+# Design Pattern: Inverted index for course search
+class SearchIndex:
+    """In-memory inverted index over course titles and descriptions.
+    
+    Text is normalized so Arabic spelling variants meet (diacritics and
+    tatweel removed, alef/yaa/taa-marbuta forms unified, a leading "ال"
+    also indexed without it). Postings map each term to per-course
+    weights, and a sorted vocabulary makes prefix lookups a bisection.
+    Courses are added and removed one at a time as the catalog changes.
+    """
+    TITLE_WEIGHT = 3
+    DESCRIPTION_WEIGHT = 1
+    PREFIX_FACTOR = 0.5  # Prefix matches rank below whole-word matches
+    _DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+    _LETTER_FORMS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ة': 'ه'})
+    _TOKEN = re.compile(r'\w+')
+    
+    def __init__(self):
+        self._postings = {}  # term -> {course id: weight}
+        self._course_terms = {}  # course id -> terms it was indexed under
+        self._vocabulary = []
+        self._added_terms = set()
+        self._removed_terms = set()
+    
+    @classmethod
+    def normalize(cls, text):
+        """Fold case and Arabic spelling variants"""
+        return cls._DIACRITICS.sub('', text.casefold()).translate(cls._LETTER_FORMS)
+    
+    @classmethod
+    def tokenize(cls, text):
+        """Split text into normalized terms"""
+        return cls._TOKEN.findall(cls.normalize(text or ''))
+    
+    @classmethod
+    def _course_weights(cls, course):
+        weights = {}
+        for field, weight in (('title', cls.TITLE_WEIGHT), ('description', cls.DESCRIPTION_WEIGHT)):
+            for token in cls.tokenize(str(course[field] or '')):
+                weights[token] = weights.get(token, 0) + weight
+                if token.startswith('ال') and len(token) > 4:
+                    weights[token[2:]] = weights.get(token[2:], 0) + weight
+        return weights
+    
+    def add(self, course):
+        """Index a course, replacing any earlier entry for its id"""
+        self.remove(course['id'])
+        weights = self._course_weights(course)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if term in self._removed_terms:
+                    self._removed_terms.discard(term)
+                else:
+                    self._added_terms.add(term)
+            postings[course['id']] = weight
+        self._course_terms[course['id']] = tuple(weights)
+    
+    def remove(self, course_id):
+        """Drop a course from the index"""
+        for term in self._course_terms.pop(course_id, ()):
+            postings = self._postings[term]
+            postings.pop(course_id, None)
+            if not postings:
+                del self._postings[term]
+                if term in self._added_terms:
+                    self._added_terms.discard(term)
+                else:
+                    self._removed_terms.add(term)
+    
+    def _sorted_vocabulary(self):
+        """Bring the sorted vocabulary up to date with pending term changes"""
+        if len(self._added_terms) + len(self._removed_terms) > 64:
+            self._vocabulary = sorted(self._postings)
+        else:
+            for term in self._removed_terms:
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+            for term in self._added_terms:
+                bisect.insort(self._vocabulary, term)
+        self._added_terms.clear()
+        self._removed_terms.clear()
+        return self._vocabulary
+    
+    def _expand(self, prefix):
+        """Yield the indexed terms that start with prefix"""
+        vocabulary = self._sorted_vocabulary()
+        position = bisect.bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            yield vocabulary[position]
+            position += 1
+    
+    def search(self, query, limit=None):
+        """Return (course id, score) pairs matching every query term, best first"""
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+        total = len(self._course_terms)
+        scores = None
+        for query_term in dict.fromkeys(terms):
+            term_scores = {}
+            for term in self._expand(query_term):
+                postings = self._postings[term]
+                factor = (1.0 if term == query_term else self.PREFIX_FACTOR) * math.log(1 + total / len(postings))
+                for course_id, weight in postings.items():
+                    score = weight * factor
+                    if score > term_scores.get(course_id, 0):
+                        term_scores[course_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {course_id: score + term_scores[course_id]
+                          for course_id, score in scores.items() if course_id in term_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+# Design Pattern: Copy-on-write snapshot for exports
+class CatalogExport:
+    """Point-in-time view of the catalog for a long-running export.
+    
+    Courses are read live, in id order, one at a time under their course
+    lock. Before a writer changes or deletes a course the export has not
+    reached yet, the service hands the export a copy of it, so every course
+    comes out as it was when the export started. Courses created afterwards
+    get ids at or above id_limit and are skipped.
+    """
+    
+    def __init__(self, service):
+        self.service = service
+        self.preserved = {}
+        self.position = 0  # Courses up to this id have been exported
+        with service._catalog_lock:
+            with CourseService._id_lock:
+                self.id_limit = getattr(CourseService, '_next_id', 1)
+            # A full reload swaps in new indexes; the export keeps the old ones
+            self._courses_by_id = service._courses_by_id
+            self._sorted_ids = service._sorted_ids
+            service._exports.append(self)
+    
+    def wants(self, course_id):
+        """Whether a change to the course has to be preserved for this export"""
+        return self.position < course_id < self.id_limit and course_id not in self.preserved
+    
+    def courses(self, page_size=500):
+        """Yield copies of the courses in id order, then close the export"""
+        try:
+            while True:
+                with self.service._catalog_lock:
+                    start = bisect.bisect_right(self._sorted_ids, self.position)
+                    page = self._sorted_ids[start:start + page_size]
+                    ids = [course_id for course_id in page if course_id < self.id_limit]
+                    bound = ids[-1] if len(ids) == page_size else self.id_limit
+                    # Courses deleted since the start only survive as copies
+                    ids = sorted(set(ids).union(course_id for course_id in list(self.preserved)
+                                                if self.position < course_id <= bound))
+                if not ids:
+                    return
+                for course_id in ids:
+                    course = self._read(course_id)
+                    if course is not None:
+                        yield course
+        finally:
+            self.close()
+    
+    def _read(self, course_id):
+        with self.service.course_lock(course_id):
+            course = self.preserved.pop(course_id, None)
+            if course is None:
+                live = self._courses_by_id.get(course_id)
+                course = _copy_course(live) if live is not None else None
+            self.position = course_id
+        return course
+    
+    def close(self):
+        with self.service._catalog_lock:
+            if self in self.service._exports:
+                self.service._exports.remove(self)
+        self.preserved.clear()
+
+# Design Pattern: Sorted indexes for range queries
+class SortedIndex:
+    """Courses ordered by one field, kept as a sorted list of (key, course id)"""
+    
+    def __init__(self, key_func, courses):
+        self.key_func = key_func
+        self.keys = {course['id']: key_func(course) for course in courses}
+        self.entries = sorted((key, course_id) for course_id, key in self.keys.items())
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def key(self, course_id):
+        return self.keys[course_id]
+    
+    def entry(self, position):
+        return self.entries[position]
+    
+    def add(self, course):
+        """Insert a course, or move it if its key changed"""
+        key = self.key_func(course)
+        old = self.keys.get(course['id'])
+        if old is not None:
+            if old == key:
+                return
+            self.remove(course['id'])
+        self.keys[course['id']] = key
+        bisect.insort(self.entries, (key, course['id']))
+    
+    def remove(self, course_id):
+        key = self.keys.pop(course_id, None)
+        if key is not None:
+            del self.entries[bisect.bisect_left(self.entries, (key, course_id))]
+    
+    def span(self, low=None, high=None, low_strict=False, high_strict=False):
+        """Return the (start, end) positions of the keys between low and high"""
+        # (key,) sorts before every (key, id) and (key, inf) after them
+        start = 0 if low is None else bisect.bisect_left(self.entries, (low, math.inf) if low_strict else (low,))
+        end = len(self.entries) if high is None else \
+            bisect.bisect_left(self.entries, (high,) if high_strict else (high, math.inf))
+        return start, max(start, end)
+    
+    def position(self, entry, after):
+        """Position just after (or before) a (key, course id) cursor"""
+        entry = tuple(entry)
+        return bisect.bisect_right(self.entries, entry) if after else bisect.bisect_left(self.entries, entry)
+
+class _IdOrder(SortedIndex):
+    """The catalog's own sorted id list seen as a SortedIndex keyed by id"""
+    
+    def __init__(self, ids):
+        self.entries = ids
+    
+    def key(self, course_id):
+        return course_id
+    
+    def entry(self, position):
+        course_id = self.entries[position]
+        return course_id, course_id
+    
+    def span(self, low=None, high=None, low_strict=False, high_strict=False):
+        start = 0 if low is None else (bisect.bisect_right if low_strict else bisect.bisect_left)(self.entries, low)
+        end = len(self.entries) if high is None else \
+            (bisect.bisect_left if high_strict else bisect.bisect_right)(self.entries, high)
+        return start, max(start, end)
+    
+    def position(self, entry, after):
+        return (bisect.bisect_right if after else bisect.bisect_left)(self.entries, entry[1])
+
+# Design Pattern: Query engine with a cost-based planner
+class CourseQueryEngine:
+    """Range, equality and sort queries over maintained course indexes.
+    
+    Every queryable field has a SortedIndex, built by the first query that
+    filters or sorts on it (so counting enrollments never loads a lazy
+    roster for a query that does not ask for them) and then kept current
+    by CourseService._touch; instructor equality uses the
+    service's hash index. The planner counts the matches of each predicate
+    with two bisections, then either walks the sort order filtering as it
+    goes (cheap when many courses match) or collects the most selective
+    predicate's matches and sorts them (cheap when few do).
+    """
+    OPERATORS = {'eq', 'gt', 'gte', 'lt', 'lte'}
+    
+    @staticmethod
+    def _number(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return -math.inf  # Unparseable values sort first
+    
+    FIELDS = {
+        'credits': lambda course: CourseQueryEngine._number(course['credits']),
+        'created_at': lambda course: str(course['created_at']),
+        'updated_at': lambda course: str(course['updated_at']),
+        'enrollments': lambda course: len(course['students']),
+    }
+    NUMERIC = {'credits', 'enrollments'}
+    RESULT_CACHE_SIZE = 32
+    
+    def __init__(self, service):
+        self.service = service
+        self._indexes = {}  # field -> SortedIndex, for the fields queried so far
+        # Sorted matches of recent queries by catalog version, so later pages
+        # of a sorted query are a bisection away
+        self._results = OrderedDict()
+    
+    def reset(self):
+        """Drop the indexes; later queries rebuild the ones they use"""
+        self._indexes = {}
+        self._results.clear()
+    
+    def refresh(self, course, deleted=False):
+        """Move a changed course in every index built so far"""
+        if not self._indexes:
+            return  # A later build reads the course as it is now
+        with self.service._catalog_lock:
+            for index in self._indexes.values():
+                if deleted:
+                    index.remove(course['id'])
+                else:
+                    index.add(course)
+    
+    def _index(self, field):
+        """The SortedIndex of one field, built on first use; call with the catalog lock held"""
+        index = self._indexes.get(field)
+        if index is None:
+            index = self._indexes[field] = SortedIndex(self.FIELDS[field],
+                                                       list(self.service._courses_by_id.values()))
+        return index
+    
+    @classmethod
+    def _predicate(cls, name):
+        """Split a query argument like credits_gte into (field, operator), or None"""
+        if name in cls.FIELDS:
+            return name, 'eq'
+        field, _, operator = name.rpartition('_')
+        if field in cls.FIELDS and operator in cls.OPERATORS:
+            return field, operator
+        return None
+    
+    @classmethod
+    def is_query(cls, args):
+        """Whether the arguments ask for a predicate or a sort order"""
+        return 'sort' in args or 'cursor' in args or any(cls._predicate(name) for name in args)
+    
+    @classmethod
+    def parse(cls, args):
+        """Read predicates like credits_gte=3 from query arguments.
+        
+        Returns {field: (low, high, low_strict, high_strict)}; raises
+        ValueError for a malformed value.
+        """
+        bounds = {}
+        for name, value in args.items():
+            predicate = cls._predicate(name)
+            if predicate is None:
+                continue
+            field, operator = predicate
+            if field in cls.NUMERIC:
+                try:
+                    value = float(value) if '.' in value else int(value)
+                except ValueError:
+                    raise ValueError(f'Invalid value for {name}: {value}')
+            low, high, low_strict, high_strict = bounds.get(field, (None, None, False, False))
+            # Keep the tighter bound when a field is given more than once
+            if operator in ('eq', 'gt', 'gte') and (low is None or value > low or (value == low and operator == 'gt')):
+                low, low_strict = value, operator == 'gt'
+            if operator in ('eq', 'lt', 'lte') and (high is None or value < high or (value == high and operator == 'lt')):
+                high, high_strict = value, operator == 'lt'
+            bounds[field] = (low, high, low_strict, high_strict)
+        return bounds
+    
+    @staticmethod
+    def encode_cursor(entry):
+        return base64.urlsafe_b64encode(json.dumps(list(entry)).encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            key, course_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+        return key, course_id
+    
+    def query(self, bounds, instructor=None, sort='id', limit=100, cursor=None):
+        """Return (courses, next cursor or None, plan) for one page of matches"""
+        descending = sort.startswith('-')
+        sort_field = sort.lstrip('-')
+        if sort_field != 'id' and sort_field not in self.FIELDS:
+            raise ValueError(f'Cannot sort by {sort_field}')
+        after = self.decode_cursor(cursor) if cursor else None
+        textual = sort_field in ('created_at', 'updated_at')
+        if after is not None and (isinstance(after[0], str) != textual or not isinstance(after[1], int)):
+            raise ValueError('Invalid cursor')
+        service = self.service
+        with service._catalog_lock:
+            order = _IdOrder(service._sorted_ids) if sort_field == 'id' else self._index(sort_field)
+            spans = {field: self._index(field).span(*bounds[field]) for field in bounds}
+            counts = {field: end - start for field, (start, end) in spans.items()}
+            bucket = None
+            if instructor is not None:
+                bucket = service._courses_by_instructor.get(instructor, {})
+                counts['instructor'] = len(bucket)
+            start, end = spans.get(sort_field, (0, len(order)))
+            driver = min(counts, key=counts.get) if counts else sort_field
+            # Positions walked to fill a page if the predicates are independent
+            total = max(len(order), 1)
+            selectivity = 1.0
+            for field, count in counts.items():
+                if field != sort_field:
+                    selectivity *= count / total
+            walk_cost = min((limit + 1) / max(selectivity, 1 / total), end - start)
+            if driver == sort_field or walk_cost <= counts[driver]:
+                page, examined = self._walk(order, start, end, descending, after, bounds, bucket, sort_field, limit)
+                plan = {'strategy': 'scan', 'index': sort_field, 'examined': examined}
+            else:
+                cache_key = (tuple(sorted(bounds.items())), instructor, sort_field, service._catalog_version[0])
+                page, examined = self._collect(order, driver, spans, bounds, bucket, descending, after, limit,
+                                               cache_key)
+                plan = {'strategy': 'sort', 'index': driver, 'examined': examined}
+            courses = [service._courses_by_id[course_id] for _, course_id in page[:limit]]
+        next_cursor = self.encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return courses, next_cursor, plan
+    
+    def _filter(self, bounds, bucket, skip):
+        """Build a test of every predicate except the one on skip"""
+        checks = [(self._indexes[field].keys, low, high, low_strict, high_strict)
+                  for field, (low, high, low_strict, high_strict) in bounds.items() if field != skip]
+        if skip == 'instructor':
+            bucket = None
+        
+        def matches(course_id):
+            if bucket is not None and course_id not in bucket:
+                return False
+            for keys, low, high, low_strict, high_strict in checks:
+                key = keys[course_id]
+                if low is not None and (key <= low if low_strict else key < low):
+                    return False
+                if high is not None and (key >= high if high_strict else key > high):
+                    return False
+            return True
+        return matches
+    
+    def _walk(self, order, start, end, descending, after, bounds, bucket, sort_field, limit):
+        """Follow the sort index, keeping matches until the page is full"""
+        if after is not None:
+            if descending:
+                end = min(end, order.position(after, after=False))
+            else:
+                start = max(start, order.position(after, after=True))
+        positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+        matches = self._filter(bounds, bucket, sort_field)
+        page = []
+        examined = 0
+        for position in positions:
+            entry = order.entry(position)
+            examined += 1
+            if matches(entry[1]):
+                page.append(entry)
+                if len(page) > limit:
+                    break
+        return page, examined
+    
+    def _collect(self, order, driver, spans, bounds, bucket, descending, after, limit, cache_key):
+        """Take the most selective predicate's matches, filter and sort them"""
+        ordered = self._results.get(cache_key)
+        examined = 0
+        if ordered is None:
+            if driver == 'instructor':
+                candidates = list(bucket)
+            else:
+                start, end = spans[driver]
+                candidates = [course_id for _, course_id in self._indexes[driver].entries[start:end]]
+            matches = self._filter(bounds, bucket, driver)
+            ordered = sorted((order.key(course_id), course_id) for course_id in candidates if matches(course_id))
+            examined = len(candidates)
+            self._results[cache_key] = ordered
+            if len(self._results) > self.RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        else:
+            self._results.move_to_end(cache_key)
+        if descending:
+            end = bisect.bisect_left(ordered, tuple(after)) if after is not None else len(ordered)
+            return ordered[max(0, end - limit - 1):end][::-1], examined
+        start = bisect.bisect_right(ordered, tuple(after)) if after is not None else 0
+        return ordered[start:start + limit + 1], examined
 
 # Design Pattern: Service for Business Logic
 class CourseService:
-    def __init__(self, repository, observers=None):
+    """Course catalog with thread-safe mutations.
+    
+    Each course is guarded by one of LOCK_STRIPES striped locks, so writes to
+    different courses run in parallel. The catalog lock only covers the
+    short index updates made when courses are added, renamed or removed.
+    Locks are always taken in the order course lock, then catalog lock;
+    with a ProcessCoordinator, its write lock comes before both.
+    """
+    LOCK_STRIPES = 64
+    _id_lock = threading.Lock()
+    
+    def __init__(self, repository, observers=None, dispatcher=None, metrics=None, coordinator=None):
         self.repository = repository
         self.observers = observers or []
-        self.courses = self.repository.load_courses()
+        self.dispatcher = dispatcher
+        self.metrics = metrics
+        self.coordinator = coordinator
+        self._synced_state = None
+        self._write_depth = 0
+        self._wrote = False
+        self._exports = []
+        self._query_engine = CourseQueryEngine(self)
+        self._catalog_lock = threading.RLock()
+        self._course_locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+        if metrics is not None:
+            self._catalog_lock = TimedLock(self._catalog_lock, metrics, 'catalog')
+            self._course_locks = [TimedLock(lock, metrics, 'course') for lock in self._course_locks]
+        self._version_counter = itertools.count(1)
+        # Versions restart at 1 in every process, so tags also carry a nonce
+        # drawn at startup
+        self.instance_id = secrets.token_hex(8)
+        if coordinator is None:
+            self.courses = self.repository.load_courses()
+            self._update_next_id()
+        else:
+            self.sync()  # Loads under the write lock, so no writer is midway
+    
+    @property
+    def courses(self):
+        """All courses in insertion order"""
+        return list(self._courses_by_id.values())
+    
+    @courses.setter
+    def courses(self, courses):
+        """Replace the catalog and rebuild the lookup indexes"""
+        with self._catalog_lock:
+            # Grade counts that were built stay built across reloads
+            rebuild_grades = getattr(self, '_grade_counts', None) is not None
+            self._courses_by_id = {}
+            self._courses_by_instructor = {}
+            self._courses_by_title = {}
+            self._sorted_ids = []
+            self._sorted_ids_by_instructor = {}
+            self._search_index = SearchIndex()
+            self._course_versions = {}
+            self._courses_by_student = None  # Built on first use
+            self._grade_counts = None
+            self._query_engine.reset()
+            for course in courses:
+                self._index_course(course)
+            if rebuild_grades:
+                self._build_grade_counts()
+            # Courses loaded together share the catalog's starting version
+            self._base_version = (next(self._version_counter), time.time())
+            self._catalog_version = self._base_version
+    
+    def course_lock(self, course_id):
+        """Return the striped lock guarding the given course"""
+        return self._course_locks[hash(course_id) % self.LOCK_STRIPES]
+    
+    def _index_course(self, course):
+        """Add a course to the id, instructor, title and search indexes"""
+        if course['id'] not in self._courses_by_id:
+            if not self._sorted_ids or course['id'] > self._sorted_ids[-1]:
+                self._sorted_ids.append(course['id'])
+            else:
+                bisect.insort(self._sorted_ids, course['id'])
+        self._courses_by_id[course['id']] = course
+        self._courses_by_instructor.setdefault(course['instructor'], {})[course['id']] = course
+        ids = self._sorted_ids_by_instructor.setdefault(course['instructor'], [])
+        position = bisect.bisect_left(ids, course['id'])
+        if position == len(ids) or ids[position] != course['id']:
+            ids.insert(position, course['id'])
+        self._courses_by_title.setdefault(course['title'], {})[course['id']] = course
+        self._search_index.add(course)
+    
+    def _unindex_course(self, course):
+        """Remove a course from the id, instructor, title and search indexes"""
+        if self._courses_by_id.pop(course['id'], None) is not None:
+            position = bisect.bisect_left(self._sorted_ids, course['id'])
+            del self._sorted_ids[position]
+        self._search_index.remove(course['id'])
+        ids = self._sorted_ids_by_instructor.get(course['instructor'])
+        if ids is not None:
+            position = bisect.bisect_left(ids, course['id'])
+            if position < len(ids) and ids[position] == course['id']:
+                del ids[position]
+            if not ids:
+                del self._sorted_ids_by_instructor[course['instructor']]
+        for index, key in ((self._courses_by_instructor, course['instructor']),
+                           (self._courses_by_title, course['title'])):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(course['id'], None)
+                if not bucket:
+                    del index[key]
+    
+    def _build_student_index(self):
+        """Build the student id -> course ids index; call with the catalog lock held"""
+        index = {}
+        for course_id, course in self._courses_by_id.items():
+            for student in list(course['students']):
+                index.setdefault(student['id'], set()).add(course_id)
+        self._courses_by_student = index
+    
+    def _index_enrollments(self, course_id, student_ids, enrolled=True):
+        """Add (or, with enrolled=False, drop) enrollments in the student index"""
+        with self._catalog_lock:
+            index = self._courses_by_student
+            if index is None:
+                return  # Not built yet; it will read the rosters then
+            for student_id in student_ids:
+                if enrolled:
+                    index.setdefault(student_id, set()).add(course_id)
+                    continue
+                course_ids = index.get(student_id)
+                if course_ids is not None:
+                    course_ids.discard(course_id)
+                    if not course_ids:
+                        del index[student_id]
+    
+    @staticmethod
+    def _count_grades(course):
+        """Students per grade-point value in a course's roster"""
+        counts = {}
+        grade_points = GradeAnalytics.grade_points
+        for student in list(course['students']):
+            points = grade_points(student['grade'])
+            counts[points] = counts.get(points, 0) + 1
+        return counts
+    
+    def _build_grade_counts(self):
+        """Build the course id -> grade counts index; call with the catalog lock held"""
+        self._grade_counts = {course_id: self._count_grades(course)
+                              for course_id, course in self._courses_by_id.items()}
+    
+    def _index_grades(self, course_id, removed=(), added=()):
+        """Move a course's grade counts from the removed grades to the added ones.
+        
+        Call before the version bump, like the other indexes.
+        """
+        with self._catalog_lock:
+            index = self._grade_counts
+            if index is None:
+                return  # Not built yet; it will read the rosters then
+            counts = index.setdefault(course_id, {})
+            for grade in removed:
+                points = GradeAnalytics.grade_points(grade)
+                remaining = counts.get(points, 0) - 1
+                if remaining > 0:
+                    counts[points] = remaining
+                else:
+                    counts.pop(points, None)
+            for grade in added:
+                points = GradeAnalytics.grade_points(grade)
+                counts[points] = counts.get(points, 0) + 1
+    
+    def index_grades(self):
+        """Count the grades of every roster now rather than on first use"""
+        with self._catalog_lock:
+            if self._grade_counts is None:
+                self._build_grade_counts()
+    
+    def grade_counts(self, course_id):
+        """Students per grade-point value in a course; None counts the ungraded"""
+        with self._catalog_lock:
+            self.index_grades()
+            return dict(self._grade_counts.get(course_id, ()))
+    
+    def _touch(self, course, deleted=False):
+        """Bump the catalog version and the version of the given course.
+        
+        Versions are drawn and published under the catalog lock, so
+        concurrent writers publish them in order.
+        """
+        with self._catalog_lock:
+            version = (next(self._version_counter), time.time())
+            if deleted:
+                self._course_versions.pop(course['id'], None)
+            else:
+                self._course_versions[course['id']] = version
+            # Indexes move before the version does, so results cached under a
+            # version never miss a change made in it
+            self._query_engine.refresh(course, deleted)
+            self._catalog_version = version
+    
+    @property
+    def version(self):
+        """Monotonic version of the whole catalog"""
+        return self._catalog_version[0]
+    
+    def catalog_version(self):
+        """Return (version, modified timestamp) of the whole catalog"""
+        return self._catalog_version
+    
+    def course_version(self, course_id):
+        """Return (version, modified timestamp) of a single course"""
+        return self._course_versions.get(course_id, self._base_version)
+    
+    def etag(self, *parts):
+        """Entity tag built from the given parts, unique to this service instance"""
+        return '-'.join(map(str, (*parts, self.instance_id)))
+    
+    def open_export(self):
+        """Start a point-in-time export of the catalog"""
+        return CatalogExport(self)
+    
+    def _preserve(self, course):
+        """Hand running exports a copy of a course about to change.
+        
+        Called with the course lock held, before the course is modified.
+        """
+        if not self._exports:
+            return
+        copy = None
+        for export in list(self._exports):
+            if export.wants(course['id']):
+                if copy is None:
+                    copy = _copy_course(course)
+                export.preserved[course['id']] = copy
+    
+    def _persist(self, event_type, course, students=()):
+        """Record a single mutation and hand it to the repository"""
+        self._touch(course, deleted=event_type == 'deleted')
+        self._save(event_type, course, students)
+    
+    def _save(self, event_type, course, students=()):
+        """Hand a mutation whose version is already bumped to the repository"""
+        self.repository.save_change(self._courses_by_id.values(), event_type, course, students)
+        self._wrote = True
+    
+    @contextlib.contextmanager
+    def write_section(self):
+        """Run a mutation under the cross-process write lock.
+        
+        The catalog is synced with other processes first, and a write made
+        inside the section is published when the outermost section exits.
+        Without a coordinator this does nothing.
+        """
+        if self.coordinator is None:
+            yield
+            return
+        with self.coordinator.lock():
+            outermost = self._write_depth == 0
+            if outermost:
+                self._sync_locked()
+                self._wrote = False
+                rewrites = self.repository.rewrites
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if outermost and self._wrote:
+                    # Appends can be tailed; anything else means a full reload
+                    full = not self.repository.incremental or self.repository.rewrites != rewrites
+                    self._synced_state = self.coordinator.publish(full)
+    
+    def sync(self):
+        """Catch up with writes published by other processes"""
+        if self.coordinator is None or self.coordinator.state() == self._synced_state:
+            return
+        with self.coordinator.lock():
+            self._sync_locked()
+    
+    def _sync_locked(self):
+        state = self.coordinator.state()
+        if state == self._synced_state:
+            return
+        records = None
+        if self._synced_state is not None and state[1] == self._synced_state[1]:
+            read_new_records = getattr(self.repository, 'read_new_records', None)
+            if read_new_records is not None:
+                records = read_new_records()
+        if records is None:
+            self.courses = self.repository.load_courses()
+        else:
+            self._apply_records(records)
         self._update_next_id()
+        self._synced_state = state
+    
+    def _apply_records(self, records):
+        """Apply journal records written by another process"""
+        with self._catalog_lock:
+            for record in records:
+                course_id = record['course']['id'] if 'course' in record else record['course_id']
+                course = self._courses_by_id.get(course_id)
+                scratch = {}
+                if course is not None:
+                    self._preserve(course)
+                    self._unindex_course(course)
+                    scratch[course_id] = course
+                self.repository._apply_record(scratch, record)
+                applied = scratch.get(course_id)
+                if self._grade_counts is not None:
+                    if applied is not None:
+                        self._grade_counts[course_id] = self._count_grades(applied)
+                    else:
+                        self._grade_counts.pop(course_id, None)
+                if applied is not None:
+                    self._index_course(applied)
+                    self._touch(applied)
+                elif course is not None:
+                    self._touch(course, deleted=True)
+            if records:
+                self._courses_by_student = None  # Rebuilt from the rosters on next use
     
     @staticmethod
     def get_next_id():
         """Get next available ID"""
-        if not hasattr(CourseService, '_next_id'):
-            CourseService._next_id = 1
-        current_id = CourseService._next_id
-        CourseService._next_id += 1
-        return current_id
+        return CourseService.reserve_ids(1)
+    
+    @staticmethod
+    def reserve_ids(count):
+        """Reserve a block of count consecutive IDs and return the first one"""
+        with CourseService._id_lock:
+            if not hasattr(CourseService, '_next_id'):
+                CourseService._next_id = 1
+            first_id = CourseService._next_id
+            CourseService._next_id += count
+            return first_id
     
     def _update_next_id(self):
         """Update next available ID"""
-        if self.courses:
-            max_id = max(course.get('id', 0) for course in self.courses)
-            CourseService._next_id = max_id + 1
+        if self._courses_by_id:
+            max_id = max(self._courses_by_id)
+            with CourseService._id_lock:
+                CourseService._next_id = max_id + 1
     
     def add_observer(self, observer):
         """Add observer for notifications"""
         self.observers.append(observer)
     
     def _notify_observers(self, course, event_type):
-        """Notify all observers"""
+        """Notify all observers, handing asynchronous ones to the dispatcher"""
+        if self.dispatcher is None:
+            for observer in self.observers:
+                self._update_observer(observer, course, event_type)
+            return
+        deferred = []
         for observer in self.observers:
+            if observer.synchronous:
+                self._update_observer(observer, course, event_type)
+            else:
+                deferred.append(observer)
+        self.dispatcher.submit(course, event_type, deferred)
+    
+    def _update_observer(self, observer, course, event_type):
+        if self.metrics is None or not self.metrics.sampled():
+            observer.update(course, event_type)
+            return
+        with self.metrics.timer('course_observer_delivery_seconds', observer=type(observer).__name__):
             observer.update(course, event_type)
     
     def add_course(self, title, description, instructor='Unknown', credits=3):
         """Add a new course"""
-        course = CourseFactory.create_course(title, description, instructor, credits)
-        self.courses.append(course)
-        self.repository.save_courses(self.courses)
+        with self.write_section():
+            # The id is reserved after syncing, so it is unique across processes
+            course = CourseFactory.create_course(title, description, instructor, credits)
+            with self.course_lock(course['id']):
+                with self._catalog_lock:
+                    self._index_course(course)
+                    self._touch(course)
+                self._save('created', course)
         self._notify_observers(course, 'created')
         return course
     
     def get_course(self, course_id):
         """Get course by ID"""
-        for course in self.courses:
-            if course['id'] == course_id:
-                return course
-        return None
+        return self._courses_by_id.get(course_id)
     
     def update_course(self, course_id, **kwargs):
         """Update course"""
-        course = self.get_course(course_id)
-        if course:
-            for key, value in kwargs.items():
-                if key in course:
-                    course[key] = value
-            course['updated_at'] = datetime.now().isoformat()
-            self.repository.save_courses(self.courses)
-            self._notify_observers(course, 'updated')
-            return course
-        return None
+        with self.write_section(), self.course_lock(course_id):
+            course = self.get_course(course_id)
+            if not course:
+                return None
+            self._preserve(course)
+            with self._catalog_lock:
+                self._unindex_course(course)
+                for key, value in kwargs.items():
+                    if key in course and key not in ('id', 'students'):
+                        course[key] = value
+                course['updated_at'] = datetime.now().isoformat()
+                self._index_course(course)
+                self._touch(course)
+            self._save('updated', course)
+        self._notify_observers(course, 'updated')
+        return course
     
     def delete_course(self, course_id):
         """Delete course"""
-        course = self.get_course(course_id)
-        if course:
-            self.courses = [c for c in self.courses if c['id'] != course_id]
-            self.repository.save_courses(self.courses)
-            self._notify_observers(course, 'deleted')
-            return True
-        return False
+        with self.write_section(), self.course_lock(course_id):
+            course = self.get_course(course_id)
+            if not course:
+                return False
+            self._preserve(course)
+            with self._catalog_lock:
+                self._unindex_course(course)
+                if self._courses_by_student is not None:
+                    self._index_enrollments(course_id, [student['id'] for student in list(course['students'])],
+                                            enrolled=False)
+                if self._grade_counts is not None:
+                    self._grade_counts.pop(course_id, None)
+                self._touch(course, deleted=True)
+            self._save('deleted', course)
+        self._notify_observers(course, 'deleted')
+        return True
+    
+    def import_courses(self, rows):
+        """Import courses from an iterable of CSV-style rows.
+        
+        Rows whose title already exists (in the catalog or earlier in the
+        same import) are skipped. New courses get one contiguous block of
+        IDs and the repository is written once at the end.
+        """
+        with self.write_section():
+            return self._import_courses(rows)
+    
+    def _import_courses(self, rows):
+        pending = []
+        titles = set()
+        skipped = 0
+        errors = []
+        for index, row in enumerate(rows):
+            title = (row.get('title') or '').strip()
+            if not title:
+                errors.append({'row': index, 'error': 'Title is required'})
+                continue
+            if title in titles or title in self._courses_by_title:
+                skipped += 1
+                continue
+            try:
+                credits = int(row['credits']) if row.get('credits') else 3
+            except ValueError:
+                errors.append({'row': index, 'error': f"Invalid credits: {row['credits']}"})
+                continue
+            titles.add(title)
+            pending.append((title, row.get('description') or '', row.get('instructor') or 'Unknown', credits))
+        
+        imported = []
+        if pending:
+            first_id = CourseService.reserve_ids(len(pending))
+            for offset, (title, description, instructor, credits) in enumerate(pending):
+                course = CourseFactory.create_course(title, description, instructor, credits,
+                                                     course_id=first_id + offset)
+                imported.append(course)
+            with self._catalog_lock:
+                for course in imported:
+                    self._index_course(course)
+                    self._touch(course)
+            # Only the new courses are written; existing rows and shards stay as they are
+            self.repository.save_changes(self._courses_by_id.values(),
+                                         [('created', course, ()) for course in imported])
+            self._wrote = True
+            for course in imported:
+                self._notify_observers(course, 'created')
+        return {
+            'imported': len(imported),
+            'skipped': skipped,
+            'invalid': len(errors),
+            'errors': errors,
+            'ids': [imported[0]['id'], imported[-1]['id']] if imported else []
+        }
     
     def get_all_courses(self):
         """Get all courses"""
@@ -243,73 +2985,644 @@ class CourseService:
     
     def filter_courses(self, instructor=None):
         """Filter courses by instructor"""
-        filtered = self.courses
         if instructor:
-            filtered = [c for c in filtered if c['instructor'] == instructor]
-        return filtered
+            return list(self._courses_by_instructor.get(instructor, {}).values())
+        return self.courses
+    
+    def student_courses(self, student_id):
+        """Courses the student is enrolled in, in id order"""
+        with self._catalog_lock:
+            if self._courses_by_student is None:
+                self._build_student_index()
+            course_ids = sorted(self._courses_by_student.get(student_id, ()))
+            return [self._courses_by_id[course_id] for course_id in course_ids]
+    
+    def query_courses(self, bounds, instructor=None, sort='id', limit=100, cursor=None):
+        """Run a multi-predicate query; see CourseQueryEngine.query"""
+        return self._query_engine.query(bounds, instructor, sort, limit, cursor)
+    
+    def search_courses(self, query, limit=None):
+        """Full-text search over titles and descriptions, best match first"""
+        with self._catalog_lock:
+            ranked = self._search_index.search(query, limit)
+            return [self._courses_by_id[course_id] for course_id, _ in ranked]
+    
+    def page_courses(self, after=None, limit=None, instructor=None):
+        """Get one page of courses in id order, starting after the given id.
+        
+        Returns (courses, next_after); next_after is None on the last page.
+        """
+        if instructor:
+            ids = self._sorted_ids_by_instructor.get(instructor, [])
+        else:
+            ids = self._sorted_ids
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        end = len(ids) if limit is None else start + limit
+        page_ids = ids[start:end]
+        courses = [course for course in map(self._courses_by_id.get, page_ids) if course is not None]
+        next_after = page_ids[-1] if page_ids and end < len(ids) else None
+        return courses, next_after
+    
+    def iter_courses(self, instructor=None, page_size=500):
+        """Yield courses in id order one page at a time"""
+        after = None
+        while True:
+            courses, after = self.page_courses(after, page_size, instructor)
+            yield from courses
+            if after is None:
+                return
 
 # Design Pattern: Service for Student Management
 class StudentService:
     def __init__(self, course_service):
         self.course_service = course_service
     
-    def enroll_student(self, course_id, name, email, student_id):
-        """Enroll a student in a course"""
-        course = self.course_service.get_course(course_id)
-        if course:
-            student = CourseFactory.create_student(name, email, student_id)
-            course['students'].append(student)
+    def enroll_student(self, course_id, name, email, student_id, upsert=False):
+        """Enroll a student in a course.
+        
+        Raises DuplicateEnrollmentError if the student is already enrolled,
+        unless upsert is set, in which case name and email are updated.
+        """
+        with self.course_service.write_section(), self.course_service.course_lock(course_id):
+            course = self.course_service.get_course(course_id)
+            if not course:
+                return None
+            student = course['students'].get(student_id)
+            if student is not None and not upsert:
+                raise DuplicateEnrollmentError(f"Student {student_id} is already enrolled")
+            self.course_service._preserve(course)
+            if student is not None:
+                student['name'] = name
+                student['email'] = email
+            else:
+                student = CourseFactory.create_student(name, email, student_id)
+                course['students'].add(student)
+                self.course_service._index_enrollments(course_id, [student_id])
+                self.course_service._index_grades(course_id, added=[student['grade']])
             course['updated_at'] = datetime.now().isoformat()
-            self.course_service.repository.save_courses(self.course_service.courses)
-            self.course_service._notify_observers(course, 'student_enrolled')
-            return student
-        return None
+            self.course_service._persist('student_enrolled', course, [student])
+        self.course_service._notify_observers(course, 'student_enrolled')
+        return student
     
     def update_student_grade(self, course_id, student_id, grade):
         """Update student grade"""
-        course = self.course_service.get_course(course_id)
-        if course:
-            for student in course['students']:
-                if student['id'] == student_id:
-                    student['grade'] = grade
-                    course['updated_at'] = datetime.now().isoformat()
-                    self.course_service.repository.save_courses(self.course_service.courses)
-                    return student
-        return None
+        with self.course_service.write_section(), self.course_service.course_lock(course_id):
+            course = self.course_service.get_course(course_id)
+            student = course['students'].get(student_id) if course else None
+            if student is None:
+                return None
+            self.course_service._preserve(course)
+            previous = student['grade']
+            student['grade'] = grade
+            self.course_service._index_grades(course_id, removed=[previous], added=[grade])
+            course['updated_at'] = datetime.now().isoformat()
+            self.course_service._persist('grade_updated', course, [student])
+        self.course_service._notify_observers(course, 'grade_updated')
+        return student
     
     def remove_student(self, course_id, student_id):
         """Remove student from course"""
-        course = self.course_service.get_course(course_id)
-        if course:
-            course['students'] = [s for s in course['students'] if s['id'] != student_id]
-            course['updated_at'] = datetime.now().isoformat()
-            self.course_service.repository.save_courses(self.course_service.courses)
+        with self.course_service.write_section(), self.course_service.course_lock(course_id):
+            course = self.course_service.get_course(course_id)
+            if not course:
+                return None
+            self.course_service._preserve(course)
+            removed = course['students'].pop(student_id)
+            if removed is not None:
+                self.course_service._index_enrollments(course_id, [student_id], enrolled=False)
+                self.course_service._index_grades(course_id, removed=[removed['grade']])
+                course['updated_at'] = datetime.now().isoformat()
+                self.course_service._persist('student_removed', course, [removed])
+        if removed is not None:
             self.course_service._notify_observers(course, 'student_removed')
-            return True
+        return True
+    
+    def enroll_students(self, course_id, rows, upsert=False):
+        """Enroll many students in a course with a single persistence pass.
+        
+        Every row is validated first, then all valid rows are applied, the
+        change is persisted once and observers get one 'students_enrolled'
+        event. Returns one result dict per row, or None if the course does
+        not exist.
+        """
+        if not self.course_service.get_course(course_id):
+            return None
+        results = []
+        valid = []
+        for index, row in enumerate(rows):
+            result = {'row': index}
+            results.append(result)
+            if not isinstance(row, dict) or not all(row.get(k) for k in ('name', 'email', 'student_id')):
+                result.update(status='invalid', error='Name, email, and student_id are required')
+                continue
+            result['student_id'] = row['student_id']
+            valid.append((result, row))
+        
+        changed = []
+        enrolled = []
+        grades = []
+        seen = set()
+        # The whole batch is applied under one lock hold
+        with self.course_service.write_section(), self.course_service.course_lock(course_id):
+            course = self.course_service.get_course(course_id)
+            if not course:
+                return None
+            self.course_service._preserve(course)
+            for result, row in valid:
+                student_id = row['student_id']
+                student = course['students'].get(student_id)
+                if not upsert and (student_id in seen or student is not None):
+                    result.update(status='duplicate', error=f"Student {student_id} is already enrolled")
+                    continue
+                seen.add(student_id)
+                if student is not None:
+                    student['name'] = row['name']
+                    student['email'] = row['email']
+                    result['status'] = 'updated'
+                else:
+                    student = CourseFactory.create_student(row['name'], row['email'], student_id)
+                    course['students'].add(student)
+                    enrolled.append(student_id)
+                    grades.append(student['grade'])
+                    result['status'] = 'enrolled'
+                changed.append(student)
+            self.course_service._index_enrollments(course_id, enrolled)
+            self.course_service._index_grades(course_id, added=grades)
+            if changed:
+                course['updated_at'] = datetime.now().isoformat()
+                self.course_service._persist('student_enrolled', course, changed)
+        if changed:
+            self.course_service._notify_observers(course, 'students_enrolled')
+        return results
+    
+    @staticmethod
+    def _credits(value):
+        """Credits as a number; values that do not parse count as zero"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            number = value
+        else:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return 0
+        return number if math.isfinite(number) else 0
+    
+    def transcript(self, student_id):
+        """Courses, credits, grades and GPA of one student, or None if not enrolled"""
+        entries = []
+        name = None
+        for course in self.course_service.student_courses(student_id):
+            student = course['students'].get(student_id)
+            if student is None:
+                continue
+            name = student['name']
+            entries.append({
+                'course_id': course['id'],
+                'title': course['title'],
+                'instructor': course['instructor'],
+                'credits': course['credits'],
+                'grade': student['grade'],
+                'grade_points': GradeAnalytics.grade_points(student['grade']),
+                'enrolled_at': student['enrolled_at']
+            })
+        if not entries:
+            return None
+        credits = [self._credits(entry['credits']) for entry in entries]
+        graded = [(entry, value) for entry, value in zip(entries, credits) if entry['grade_points'] is not None]
+        graded_credits = sum(value for _, value in graded)
+        points = sum(entry['grade_points'] * value for entry, value in graded)
+        return {
+            'student_id': student_id,
+            'name': name,
+            'courses': entries,
+            'total_credits': sum(credits),
+            'graded_credits': graded_credits,
+            'gpa': round(points / graded_credits, 2) if graded_credits else None
+        }
+# Design Pattern: Service for Grade Analytics
+class GradeAnalytics:
+    """Grade statistics per course and per instructor.
+    
+    Every grade lands on one of the twelve POINTS values, so a course's
+    grades reduce to a histogram of students per point value. CourseService
+    keeps those counts current as students enroll, are graded and leave, so
+    a request never reads a roster: means, percentiles and the letter
+    distribution come straight off the histograms, and only courses that
+    changed since the last request are summarized again.
+    """
+    # Letter grades on the 4.0 scale; numeric grades are percentages
+    LETTERS = ('A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'F')
+    POINTS = {'A': 4.0, 'A-': 3.7, 'B+': 3.3, 'B': 3.0, 'B-': 2.7, 'C+': 2.3,
+              'C': 2.0, 'C-': 1.7, 'D+': 1.3, 'D': 1.0, 'D-': 0.7, 'F': 0.0}
+    PERCENT_BANDS = ((93, 'A'), (90, 'A-'), (87, 'B+'), (83, 'B'), (80, 'B-'), (77, 'C+'),
+                     (73, 'C'), (70, 'C-'), (67, 'D+'), (63, 'D'), (60, 'D-'))
+    PERCENTILES = (10, 25, 75, 90)
+    
+    def __init__(self, course_service):
+        self.course_service = course_service
+        self._lock = threading.Lock()
+        self._columns = {}  # course id -> (version, counts, stats)
+        self._instructors = {}  # instructor -> (course versions, stats)
+        self._summary = None  # (catalog version, summary)
+    
+    @classmethod
+    def grade_points(cls, grade):
+        """Convert a letter or percentage grade to points, None if ungraded"""
+        if grade is None:
+            return None
+        return cls._parse_grade(str(grade).strip().upper())
+    
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _parse_grade(cls, grade):
+        if not grade:
+            return None
+        if grade == 'A+':
+            grade = 'A'
+        if grade in cls.POINTS:
+            return cls.POINTS[grade]
+        try:
+            percent = float(grade)
+        except ValueError:
+            return None
+        for floor, letter in cls.PERCENT_BANDS:
+            if percent >= floor:
+                return cls.POINTS[letter]
+        return cls.POINTS['F']
+    
+    @classmethod
+    def _stats(cls, counts):
+        """Summarize a {grade points: students} histogram; None counts the ungraded"""
+        column = sorted((points, n) for points, n in counts.items() if points is not None and n > 0)
+        count = sum(n for _, n in column)
+        stats = {'graded': count, 'ungraded': counts.get(None, 0), 'mean': None, 'median': None,
+                 'percentiles': {f'p{q}': None for q in cls.PERCENTILES}}
+        if count:
+            stats['mean'] = round(sum(points * n for points, n in column) / count, 3)
+            stats['median'] = cls._percentile(column, count, 50)
+            stats['percentiles'] = {f'p{q}': cls._percentile(column, count, q) for q in cls.PERCENTILES}
+        # Every letter has its own point value, so its band is one bucket
+        stats['distribution'] = {letter: counts.get(cls.POINTS[letter], 0) for letter in cls.LETTERS}
+        return stats
+    
+    @classmethod
+    def _percentile(cls, column, count, q):
+        """Linearly interpolated percentile of a sorted (points, students) column"""
+        position = (count - 1) * q / 100
+        low = int(position)
+        high = min(low + 1, count - 1)
+        low_value, high_value = cls._value_at(column, low), cls._value_at(column, high)
+        return round(float(low_value + (high_value - low_value) * (position - low)), 3)
+    
+    @staticmethod
+    def _value_at(column, index):
+        """The index-th smallest grade in a sorted (points, students) column"""
+        for points, n in column:
+            if index < n:
+                return points
+            index -= n
+        return column[-1][0]
+    
+    def summary(self, instructor=None):
+        """Return grade statistics per course and per instructor"""
+        version = self.course_service.version
+        with self._lock:
+            if self._summary is None or self._summary[0] != version:
+                self._summary = (version, self._build())
+            summary = self._summary[1]
+        if instructor is None:
+            return summary
+        return {
+            'scale': summary['scale'],
+            'courses': [c for c in summary['courses'] if c['instructor'] == instructor],
+            'instructors': [i for i in summary['instructors'] if i['instructor'] == instructor]
+        }
+    
+    def _build(self):
+        columns = {}
+        by_instructor = {}
+        courses = []
+        for course in self.course_service.get_all_courses():
+            course_id = course['id']
+            course_version = self.course_service.course_version(course_id)[0]
+            column = self._columns.get(course_id)
+            if column is None or column[0] != course_version:
+                counts = self.course_service.grade_counts(course_id)
+                column = (course_version, counts, self._stats(counts))
+            columns[course_id] = column
+            by_instructor.setdefault(course['instructor'], []).append((course_id, course_version))
+            courses.append(dict(column[2], course_id=course_id, title=course['title'],
+                                instructor=course['instructor']))
+        self._columns = columns
+        instructors = []
+        cached = self._instructors
+        self._instructors = {}
+        for name, versions in by_instructor.items():
+            key = tuple(versions)
+            entry = cached.get(name)
+            if entry is None or entry[0] != key:
+                counts = {}
+                for course_id, _ in versions:
+                    for points, n in columns[course_id][1].items():
+                        counts[points] = counts.get(points, 0) + n
+                entry = (key, self._stats(counts))
+            self._instructors[name] = entry
+            instructors.append(dict(entry[1], instructor=name, courses=len(versions)))
+        return {'scale': 4.0, 'courses': courses, 'instructors': instructors}
+
 # Initialize services
 config = Config()
-repository = CourseRepository(config)
-course_service = CourseService(repository)
+metrics = Metrics(config.metrics_sample_rate) if config.metrics_sample_rate > 0 else None
+repository = RepositoryFactory.create_repository(config, metrics)
+atexit.register(repository.close)
+dispatcher = None
+if config.async_observers:
+    dispatcher = AsyncObserverDispatcher(config.observer_workers, config.observer_queue_size,
+                                         config.observer_backpressure, metrics)
+    atexit.register(dispatcher.close)
+coordinator = None
+if config.multiprocess:
+    if config.write_behind:
+        raise ValueError('write_behind cannot be combined with multiprocess')
+    coordinator = ProcessCoordinator(config.get_lock_file())
+    atexit.register(coordinator.close)
+course_service = CourseService(repository, dispatcher=dispatcher, metrics=metrics, coordinator=coordinator)
 course_service.add_observer(EmailNotifier())
 course_service.add_observer(LogNotifier())
+response_cache = ResponseCache(config.response_cache_bytes)
+course_service.add_observer(CacheInvalidationObserver(response_cache))
+fragment_cache = ResponseCache(config.fragment_cache_bytes)
+course_service.add_observer(CacheInvalidationObserver(fragment_cache))
 student_service = StudentService(course_service)
+grade_analytics = GradeAnalytics(course_service)
+if not config.lazy_rosters:
+    course_service.index_grades()  # Counted at load time rather than by the first request
 # Flask Routes
+@app.before_request
+def _start_request_timer():
+    if metrics is not None and metrics.sampled():
+        g.request_started = time.perf_counter()
+
+@app.before_request
+def _sync_with_other_workers():
+    if coordinator is not None:
+        course_service.sync()
+
+@app.after_request
+def _record_request(response):
+    if metrics is not None:
+        # The rule template keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.inc('course_http_requests_total', route=route, method=request.method,
+                    status=response.status_code)
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics.observe('course_http_request_duration_seconds', time.perf_counter() - started,
+                            route=route, method=request.method)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics"""
+    body = metrics.render() if metrics is not None else ''
+    gauges = [('course_catalog_courses', 'Courses in the catalog', len(course_service._courses_by_id)),
+              ('course_response_cache_bytes', 'Bytes held by the response cache', response_cache.stats()['bytes']),
+              ('course_fragment_cache_bytes', 'Bytes of rendered HTML held', fragment_cache.stats()['bytes'])]
+    if dispatcher is not None:
+        stats = dispatcher.stats()
+        gauges += [('course_observer_queue_depth', 'Queued observer events', stats['queue_depth']),
+                   ('course_observer_dropped_events', 'Observer events dropped by backpressure', stats['dropped']),
+                   ('course_observer_lag_max_seconds', 'Longest observer delivery lag', stats['lag_max'])]
+    for name, help_text, value in gauges:
+        body += f'# HELP {name} {help_text}\n# TYPE {name} gauge\n{name} {value}\n'
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+def _cached_html(key, group, render):
+    """Return rendered HTML from the fragment cache, running render() on a miss.
+    
+    Keys carry the course or catalog version, so an entry is never served
+    after the data it shows has changed.
+    """
+    html = fragment_cache.get(key)
+    if html is None:
+        html = render().encode('utf-8')
+        fragment_cache.put(key, html, group)
+    return html
+
+def _course_card(course):
+    """Rendered card of one course, reused until the course changes"""
+    version = course_service.course_version(course['id'])[0]
+    return _cached_html(('card', course['id'], version), ('course', course['id']),
+                        lambda: render_template('_course_card.html', course=course))
+
 @app.route('/')
 def index():
-    """Home page"""
-    courses = course_service.get_all_courses()
-    return render_template('index.html', courses=courses)
+    """Home page, one page of course cards at a time"""
+    after = request.args.get('after', type=int)
+    limit = min(max(request.args.get('limit', config.home_page_size, type=int), 1), config.max_page_size)
+    version, modified_at = course_service.catalog_version()
+    
+    def render():
+        courses, next_after = course_service.page_courses(after, limit)
+        # Unchanged cards come from the cache; only the page shell runs Jinja
+        cards = Markup(b''.join(map(_course_card, courses)).decode('utf-8'))
+        return render_template('index.html', cards=cards, total=len(course_service._courses_by_id),
+                               after=after, next_after=next_after, limit=limit)
+    
+    return _conditional_response(
+        course_service.etag('home', version, after, limit), modified_at,
+        lambda: Response(_cached_html(('home', after, limit, version), 'list', render), mimetype='text/html'))
+
+def _conditional_response(etag, modified_at, build):
+    """Answer a GET from its version tag, calling build() only on a cache miss.
+    
+    Matching If-None-Match (or If-Modified-Since when no tag was sent)
+    yields an empty 304 without serializing anything.
+    """
+    last_modified = datetime.fromtimestamp(int(modified_at), timezone.utc)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    return response
+
+def _cached_json_response(key, group, produce):
+    """Serve a JSON body from the response cache, encoding it on a miss.
+    
+    Keys include the catalog or course version, so a stale body can never
+    be served even before the invalidation observer has dropped it.
+    """
+    use_gzip = config.response_cache_gzip and request.accept_encodings['gzip'] > 0
+    key = key + ('gzip' if use_gzip else 'identity',)
+    body = response_cache.get(key)
+    if body is None:
+        body = (app.json.dumps(produce()) + '\n').encode('utf-8')
+        if use_gzip:
+            body = gzip.compress(body, compresslevel=5)
+        response_cache.put(key, body, group)
+    response = Response(body, mimetype='application/json')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/api/courses', methods=['GET'])
 def get_courses():
     """Get all courses API"""
     instructor = request.args.get('instructor')
+    stream = request.args.get('stream')
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after', type=int)
     
-    if instructor:
-        courses = course_service.filter_courses(instructor=instructor)
-    else:
-        courses = course_service.get_all_courses()
-    return jsonify(courses)
+    if stream:
+        return _stream_courses(stream, instructor)
+    if CourseQueryEngine.is_query(request.args):
+        return _query_courses(instructor, limit)
+    if limit is not None or after is not None:
+        limit = config.default_page_size if limit is None else limit
+        if not 0 < limit <= config.max_page_size:
+            return jsonify({'error': f'limit must be between 1 and {config.max_page_size}'}), 400
+        courses, next_after = course_service.page_courses(after, limit, instructor)
+        response = jsonify(courses)
+        if next_after is not None:
+            response.headers['X-Next-Cursor'] = str(next_after)
+            next_url = url_for('get_courses', **dict(request.args.items(), after=next_after))
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        return response
+    
+    version, modified_at = course_service.catalog_version()
+    
+    def build():
+        if instructor:
+            return _cached_json_response(('instructor', instructor, version), 'instructor',
+                                         lambda: course_service.filter_courses(instructor=instructor))
+        return _cached_json_response(('list', version), 'list', course_service.get_all_courses)
+    
+    return _conditional_response(course_service.etag('catalog', version), modified_at, build)
+
+def _stream_courses(fmt, instructor):
+    """Stream courses as a JSON array or NDJSON without building the whole body"""
+    if fmt not in ('json', 'ndjson'):
+        return jsonify({'error': "stream must be 'json' or 'ndjson'"}), 400
+    courses = course_service.iter_courses(instructor=instructor)
+    
+    def generate():
+        if fmt == 'ndjson':
+            for course in courses:
+                yield app.json.dumps(course) + '\n'
+            return
+        yield '['
+        for index, course in enumerate(courses):
+            yield (',' if index else '') + app.json.dumps(course)
+        yield ']'
+    
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def _query_courses(instructor, limit):
+    """Answer a filtered or sorted listing, one page per request"""
+    limit = config.default_page_size if limit is None else limit
+    if not 0 < limit <= config.max_page_size:
+        return jsonify({'error': f'limit must be between 1 and {config.max_page_size}'}), 400
+    try:
+        bounds = CourseQueryEngine.parse(request.args)
+        courses, cursor, plan = course_service.query_courses(
+            bounds, instructor, request.args.get('sort', 'id'), limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(courses)
+    response.headers['X-Query-Plan'] = '{strategy} index={index} examined={examined}'.format(**plan)
+    if cursor is not None:
+        response.headers['X-Next-Cursor'] = cursor
+        next_url = url_for('get_courses', **dict(request.args.items(), cursor=cursor))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_FIELDS = CourseRepository.COURSE_FIELDS + [field for field in CourseRepository.STUDENT_FIELDS
+                                                  if field != 'course_id']
+
+@app.route('/api/export', methods=['GET'])
+def export_catalog():
+    """Stream all courses and enrollments from one point-in-time view.
+    
+    ?format=csv (the default) writes one row per enrollment with the course
+    columns repeated, and one row without student columns for an empty
+    course; ?format=ndjson writes one course per line with its roster.
+    ?gzip=1 compresses the stream.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': "format must be 'csv' or 'ndjson'"}), 400
+    export = course_service.open_export()
+    chunks = _export_csv(export) if fmt == 'csv' else _export_ndjson(export)
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    if compress:
+        chunks = _gzip_chunks(chunks)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=courses.{fmt}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _export_csv(export):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for course in export.courses():
+        row = CourseRepository._course_to_row(course)
+        if not course['students']:
+            writer.writerow(row)
+        for student in course['students']:
+            writer.writerow({**row, **CourseRepository._student_to_row(course['id'], student)})
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _export_ndjson(export):
+    lines = []
+    size = 0
+    for course in export.courses():
+        line = app.json.dumps(course) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    yield ''.join(lines)
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(5, zlib.DEFLATED, 31)  # wbits 31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/api/courses/search', methods=['GET'])
+def search_courses():
+    """Full-text course search API"""
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', config.default_page_size, type=int)
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if not 0 < limit <= config.max_page_size:
+        return jsonify({'error': f'limit must be between 1 and {config.max_page_size}'}), 400
+    version, modified_at = course_service.catalog_version()
+    return _conditional_response(
+        course_service.etag('search', version), modified_at,
+        lambda: _cached_json_response(('search', query, limit, version), 'list',
+                                      lambda: course_service.search_courses(query, limit)))
 
 @app.route('/api/courses', methods=['POST'])
 def create_course():
@@ -326,12 +3639,29 @@ def create_course():
     course = course_service.add_course(title, description, instructor, credits)
     return jsonify(course), 201
 
+@app.route('/api/courses/import', methods=['POST'])
+def import_courses():
+    """Import courses from an uploaded or streamed CSV API"""
+    if 'file' in request.files:
+        stream = request.files['file'].stream
+    else:
+        stream = request.stream
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        summary = course_service.import_courses(reader)
+    except (csv.Error, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Invalid CSV: {e}'}), 400
+    return jsonify(summary), 201 if summary['imported'] else 200
+
 @app.route('/api/courses/<int:course_id>', methods=['GET'])
 def get_course(course_id):
     """Get course by ID API"""
     course = course_service.get_course(course_id)
     if course:
-        return jsonify(course)
+        version, modified_at = course_service.course_version(course_id)
+        return _conditional_response(
+            course_service.etag('course', course_id, version), modified_at,
+            lambda: _cached_json_response(('course', course_id, version), ('course', course_id), lambda: course))
     return jsonify({'error': 'Course not found'}), 404
 
 @app.route('/api/courses/<int:course_id>', methods=['PUT'])
@@ -361,11 +3691,50 @@ def enroll_student(course_id):
     if not all([name, email, student_id]):
         return jsonify({'error': 'Name, email, and student_id are required'}), 400
     
-    student = student_service.enroll_student(course_id, name, email, student_id)
+    try:
+        student = student_service.enroll_student(course_id, name, email, student_id)
+    except DuplicateEnrollmentError as e:
+        return jsonify({'error': str(e)}), 409
     if student:
         return jsonify(student), 201
     return jsonify({'error': 'Course not found'}), 404
 
+def _read_bulk_rows():
+    """Yield student rows from a JSON array or an NDJSON request body"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None  # Reported as an invalid row
+        return
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('students')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of students or an NDJSON body')
+    yield from data
+
+@app.route('/api/courses/<int:course_id>/students/bulk', methods=['POST'])
+def enroll_students_bulk(course_id):
+    """Bulk enroll students in course API"""
+    upsert = request.args.get('upsert', '').lower() in ('1', 'true', 'yes')
+    try:
+        results = student_service.enroll_students(course_id, _read_bulk_rows(), upsert=upsert)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if results is None:
+        return jsonify({'error': 'Course not found'}), 404
+    summary = {'enrolled': 0, 'updated': 0, 'duplicate': 0, 'invalid': 0}
+    for result in results:
+        summary[result['status']] += 1
+    summary['results'] = results
+    status = 201 if summary['enrolled'] or summary['updated'] else 400
+    return jsonify(summary), status
+
 @app.route('/api/courses/<int:course_id>/students/<student_id>', methods=['PUT'])
 def update_student_grade(course_id, student_id):
     """Update student grade API"""
@@ -384,13 +3753,44 @@ def remove_student(course_id, student_id):
         return jsonify({'message': 'Student removed successfully'})
     return jsonify({'error': 'Course or student not found'}), 404
 
+@app.route('/api/students/<student_id>/courses', methods=['GET'])
+def get_student_courses(student_id):
+    """Courses a student is enrolled in API"""
+    courses = course_service.student_courses(student_id)
+    if not courses:
+        return jsonify({'error': 'Student not found'}), 404
+    return jsonify([{key: value for key, value in course.items() if key != 'students'} for course in courses])
+
+@app.route('/api/students/<student_id>/transcript', methods=['GET'])
+def get_student_transcript(student_id):
+    """Student transcript API"""
+    transcript = student_service.transcript(student_id)
+    if transcript is None:
+        return jsonify({'error': 'Student not found'}), 404
+    return jsonify(transcript)
+
+@app.route('/api/analytics/grades', methods=['GET'])
+def grade_analytics_summary():
+    """Grade statistics per course and per instructor API"""
+    instructor = request.args.get('instructor')
+    version, modified_at = course_service.catalog_version()
+    return _conditional_response(
+        course_service.etag('grades', version), modified_at,
+        lambda: _cached_json_response(('grades', instructor, version), 'grades',
+                                      lambda: grade_analytics.summary(instructor)))
+
 @app.route('/course/<int:course_id>')
 def view_course(course_id):
     """View course page"""
     course = course_service.get_course(course_id)
-    if course:
-        return render_template('course.html', course=course)
-    return redirect(url_for('index'))
+    if not course:
+        return redirect(url_for('index'))
+    version, modified_at = course_service.course_version(course_id)
+    return _conditional_response(
+        course_service.etag('course-page', course_id, version), modified_at,
+        lambda: Response(_cached_html(('course-page', course_id, version), ('course', course_id),
+                                      lambda: render_template('course.html', course=course)),
+                         mimetype='text/html'))
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
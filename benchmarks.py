@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the course management services.
+
+Usage:
+    python benchmarks.py
+    python benchmarks.py --suite [--sizes 1000x50000,10000x500000] [--repeat 3]
+                         [--output results.json] [--compare baseline.json]
+
+The suite times load_courses, save_courses, every API route through the
+Flask test client and the StudentService operations on generated catalogs,
+and reports the results as JSON.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+sys.path.append('.')
+
+from app import (Config, CourseFactory, CourseRepository, CourseService, GradeAnalytics,
+                 ShardedCourseRepository, StudentRecord)
+from generate_courses import generate_catalog, write_catalog
+
+INSTRUCTORS = [f"Dr. Instructor {i}" for i in range(100)]
+
+
+def build_service(n_courses):
+    """Create an in-memory CourseService holding n_courses courses"""
+    config = Config()
+    config.set_testing_mode(True)  # Keep the benchmark off the CSV files
+    service = CourseService(CourseRepository(config))
+    CourseService._next_id = 1
+    service.courses = [
+        CourseFactory.create_course(f"Course {i}", '', INSTRUCTORS[i % len(INSTRUCTORS)])
+        for i in range(n_courses)
+    ]
+    return service
+
+
+def time_per_call(func, args_list):
+    """Return the mean wall time of func(*args) in microseconds"""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def bench_course_lookup(sizes=(1_000, 10_000, 100_000, 1_000_000), calls=10_000):
+    """Show that id and instructor lookups stay flat as the catalog grows"""
+    print(f"{'courses':>10} {'get_course':>14} {'filter_courses':>16}")
+    for n in sizes:
+        service = build_service(n)
+        ids = [((i * 7919) % n + 1,) for i in range(calls)]
+        get_us = time_per_call(service.get_course, ids)
+        filter_us = time_per_call(
+            lambda instructor: service.filter_courses(instructor=instructor),
+            [(INSTRUCTORS[0],)] * 100
+        )
+        # filter_courses returns O(result) rows, so report it per result row
+        per_row = filter_us / max(1, len(service.filter_courses(instructor=INSTRUCTORS[0])))
+        print(f"{n:>10} {get_us:>11.3f} us {per_row:>13.4f} us/row")
+
+
+def bench_import(source='courses_backup.csv', copies=100):
+    """Time importing copies x the backup CSV through the import engine"""
+    with open(source, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=rows[0].keys())
+    writer.writeheader()
+    for copy in range(copies):
+        for row in rows:
+            writer.writerow(dict(row, title=f"{row['title']} #{copy}"))
+    buffer.seek(0)
+    service = build_service(0)
+    service.observers = []
+    start = time.perf_counter()
+    summary = service.import_courses(csv.DictReader(buffer))
+    elapsed = time.perf_counter() - start
+    print(f"imported {summary['imported']} courses ({copies}x {source}) in {elapsed:.3f} s")
+
+
+def measure_bytes(build):
+    """Return the bytes still allocated by build() once it returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def bench_enrollment_memory(n=1_000_000):
+    """Compare bytes per enrollment of plain dicts and slotted records"""
+    def as_dicts():
+        return [{
+            'id': f"S{i:07d}",
+            'name': f"Student {i}",
+            'email': f"student{i}@example.com",
+            'enrolled_at': datetime.now().isoformat(),
+            'grade': 'A' if i % 2 else None
+        } for i in range(n)]
+    
+    def as_records():
+        return [StudentRecord(
+            id=f"S{i:07d}",
+            name=f"Student {i}",
+            email=f"student{i}@example.com",
+            enrolled_at=datetime.now().isoformat(),
+            grade='A' if i % 2 else None
+        ) for i in range(n)]
+    
+    dict_bytes = measure_bytes(as_dicts) / n
+    record_bytes = measure_bytes(as_records) / n
+    print(f"{n} enrollments: dict {dict_bytes:.0f} B/enrollment, "
+          f"record {record_bytes:.0f} B/enrollment ({1 - record_bytes / dict_bytes:.0%} smaller)")
+
+
+def bench_grade_analytics(n_courses=2_000, per_course=500):
+    """Time grade statistics over n_courses x per_course enrollments"""
+    service = build_service(n_courses)
+    grades = GradeAnalytics.LETTERS + ('87', '91.5', None)
+    for course in service.courses:
+        roster = course['students']
+        for i in range(per_course):
+            roster.add(StudentRecord(id=f"S{i}", name='', email='', enrolled_at='2024-01-15T10:00:00',
+                                     grade=grades[(i * 7 + course['id']) % len(grades)]))
+    start = time.perf_counter()
+    service.index_grades()
+    counted = time.perf_counter() - start
+    analytics = GradeAnalytics(service)
+    start = time.perf_counter()
+    analytics.summary()
+    cold = time.perf_counter() - start
+    service._persist('grade_updated', service.courses[0])
+    start = time.perf_counter()
+    analytics.summary()
+    changed = time.perf_counter() - start
+    print(f"grade analytics over {n_courses * per_course} enrollments: counted at load in {counted:.2f} s, "
+          f"first request {cold * 1e3:.0f} ms, after one course changed {changed * 1e3:.1f} ms")
+
+
+def bench_cold_start(n_courses=10_000, per_course=100):
+    """Compare loading the catalog from CSV and from the binary snapshot"""
+    service = build_service(n_courses)
+    for course in service.courses:
+        for i in range(per_course):
+            course['students'].add(CourseFactory.create_student(f"Student {i}", f"s{i}@example.com", f"S{i}"))
+    with temporary_storage(use_snapshot=True) as config:
+        repository = CourseRepository(config)
+        repository.save_courses(service.courses)
+        timings = {}
+        for label, use_snapshot in (('csv', False), ('snapshot', True)):
+            config.use_snapshot = use_snapshot
+            start = time.perf_counter()
+            repository.load_courses()
+            timings[label] = time.perf_counter() - start
+    print(f"cold start with {n_courses * per_course} enrollments: csv {timings['csv']:.2f} s, "
+          f"snapshot {timings['snapshot']:.2f} s ({timings['csv'] / timings['snapshot']:.0f}x faster)")
+
+
+def bench_row_construction(n=200_000, repeat=3):
+    """Compare building enrollments from CSV rows by keyword and through slot values"""
+    rows = [{'course_id': '1', 'student_id': f"S{i}", 'name': f"Student {i}", 'email': f"s{i}@example.com",
+             'grade': 'A' if i % 2 else '', 'enrolled_at': '2024-01-15T10:00:00.250000'} for i in range(n)]
+    
+    def by_keyword():
+        return [StudentRecord(id=row['student_id'], name=row['name'], email=row['email'],
+                              enrolled_at=row['enrolled_at'], grade=row['grade'] or None) for row in rows]
+    
+    def from_rows():
+        return [CourseRepository._student_from_row(row) for row in rows]
+    
+    timings = {}
+    for label, build in (('keyword', by_keyword), ('slot values', from_rows)):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            build()
+            samples.append(time.perf_counter() - start)
+        timings[label] = min(samples)
+    print(f"{n} enrollment rows: keyword {timings['keyword']:.2f} s, slot values {timings['slot values']:.2f} s "
+          f"({timings['keyword'] / timings['slot values']:.1f}x faster)")
+
+
+@contextlib.contextmanager
+def temporary_storage(**settings):
+    """Point Config at files in a temporary directory with file I/O enabled"""
+    config = Config()
+    saved = dict(config.__dict__)
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            config.set_testing_mode(False)
+            for name in ('courses_file', 'students_file', 'snapshot_file', 'journal_file', 'database_file',
+                         'shard_dir'):
+                setattr(config, name, os.path.join(directory, os.path.basename(getattr(config, name))))
+            for name, value in settings.items():
+                setattr(config, name, value)
+            yield config
+        finally:
+            config.__dict__.update(saved)
+
+
+def measure(scenario, func, ops, repeat, **size):
+    """Run func(i) for ops calls, repeat times, and summarize the timings"""
+    counter = itertools.count()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(ops):
+            func(next(counter))
+        timings.append(time.perf_counter() - start)
+    return dict(size, scenario=scenario, ops=ops, repeat=repeat,
+                min_s=min(timings), median_s=statistics.median(timings),
+                per_op_us=min(timings) / ops * 1e6)
+
+
+def storage_scenarios(course_rows, student_rows, repeat, **size):
+    """Time loading and saving of a generated catalog, as CSV and as shards"""
+    with temporary_storage() as config:
+        write_catalog(course_rows, student_rows, config.courses_file, config.students_file)
+        repository = CourseRepository(config)
+        courses = repository.load_courses()
+        sharded = ShardedCourseRepository(config)
+        sharded.load_courses()  # Migrates the CSV files into shards
+        
+        def save_one_shard(i):
+            sharded.save_change(courses, 'student_enrolled', courses[(i * 7919) % len(courses)])
+        
+        return courses, [
+            measure('load_courses', lambda i: repository.load_courses(), 1, repeat, **size),
+            measure('save_courses', lambda i: repository.save_courses(courses), 1, repeat, **size),
+            measure('sharded_load_courses', lambda i: sharded.load_courses(), 1, repeat, **size),
+            measure('sharded_save_change', save_one_shard, 20, repeat, **size),
+        ]
+
+
+def service_scenarios(catalog, repeat, ops=200, **size):
+    """Time each API route and StudentService operation against the given catalog"""
+    import app as application
+    service = application.course_service
+    students = application.student_service
+    config = Config()
+    saved = (service.courses, service.observers, config.testing, application.grade_analytics)
+    config.set_testing_mode(True)  # Keep mutations off the CSV files
+    service.courses = catalog
+    service._update_next_id()
+    # Printing notifiers would dominate the write timings
+    service.observers = [observer for observer in service.observers if observer.synchronous]
+    application.response_cache.clear()
+    client = application.app.test_client()
+    ids = [course['id'] for course in catalog]
+    unique = itertools.count()
+    created, enrolled = [], []
+    
+    def pick(i):
+        return ids[(i * 7919) % len(ids)]
+    
+    def uncached(path):
+        application.response_cache.clear()
+        return client.get(path, headers={'Accept-Encoding': 'identity'})
+    
+    def create(i):
+        created.append(client.post('/api/courses', json={'title': f'Benchmark {next(unique)}'}).get_json()['id'])
+    
+    def enroll(i):
+        sid = f'BENCH{next(unique)}'
+        client.post(f'/api/courses/{pick(i)}/students',
+                    json={'name': 'Bench', 'email': f'{sid}@example.com', 'student_id': sid})
+        enrolled.append((pick(i), sid))
+    
+    def fresh_analytics(i):
+        application.grade_analytics = GradeAnalytics(service)
+        uncached('/api/analytics/grades')
+    
+    def bulk_rows():
+        return [{'name': 'Bulk', 'email': f'b{n}@example.com', 'student_id': f'BULK{n}'}
+                for n in itertools.islice(unique, 500)]
+    
+    def service_enroll(i):
+        sid = f'SVC{next(unique)}'
+        students.enroll_student(pick(i), 'Bench', f'{sid}@example.com', sid)
+        enrolled.append((pick(i), sid))
+    
+    scenarios = [
+        ('GET /api/courses', 1, lambda i: uncached('/api/courses')),
+        ('GET /api/courses (cached)', ops, lambda i: client.get('/api/courses')),
+        ('GET /api/courses?limit=100', ops, lambda i: client.get(f'/api/courses?limit=100&after={pick(i)}')),
+        ('GET /api/courses?stream=ndjson', 1, lambda i: client.get('/api/courses?stream=ndjson').get_data()),
+        ('GET /api/courses?credits_gte=3&sort=-updated_at', ops,
+         lambda i: client.get('/api/courses?credits_gte=3&sort=-updated_at&limit=100')),
+        ('GET /api/courses/<id>', ops, lambda i: uncached(f'/api/courses/{pick(i)}')),
+        ('GET / (home page)', ops, lambda i: client.get(f'/?after={pick(i)}')),
+        ('GET /course/<id>', ops, lambda i: client.get(f'/course/{pick(i)}')),
+        ('GET /api/courses/search', ops, lambda i: uncached('/api/courses/search?q=data')),
+        ('GET /api/analytics/grades', 1, fresh_analytics),
+        ('POST /api/courses', ops, create),
+        ('PUT /api/courses/<id>', ops, lambda i: client.put(f'/api/courses/{pick(i)}', json={'credits': 4})),
+        ('POST /api/courses/<id>/students', ops, enroll),
+        ('PUT /api/courses/<id>/students/<sid>', ops,
+         lambda i: client.put('/api/courses/{}/students/{}'.format(*enrolled[i]), json={'grade': 'B'})),
+        ('DELETE /api/courses/<id>/students/<sid>', ops,
+         lambda i: client.delete('/api/courses/{}/students/{}'.format(*enrolled.pop()))),
+        ('POST /api/courses/<id>/students/bulk', 1,
+         lambda i: client.post(f'/api/courses/{pick(i)}/students/bulk', json=bulk_rows())),
+        ('DELETE /api/courses/<id>', ops, lambda i: client.delete(f'/api/courses/{created.pop()}')),
+        ('StudentService.enroll_student', ops, service_enroll),
+        ('StudentService.update_student_grade', ops,
+         lambda i: students.update_student_grade(*enrolled[i], 'A')),
+        ('StudentService.remove_student', ops, lambda i: students.remove_student(*enrolled.pop())),
+        ('StudentService.enroll_students', 1, lambda i: students.enroll_students(pick(i), bulk_rows())),
+    ]
+    try:
+        return [measure(name, func, count, repeat, **size) for name, count, func in scenarios]
+    finally:
+        service.courses, service.observers, testing, application.grade_analytics = saved
+        config.set_testing_mode(testing)
+        application.response_cache.clear()
+
+
+def run_suite(sizes=((1_000, 50_000), (10_000, 500_000)), repeat=3, ops=200):
+    """Run every scenario at each (courses, enrollments) size"""
+    results = []
+    for n_courses, n_enrollments in sizes:
+        size = {'courses': n_courses, 'enrollments': n_enrollments}
+        course_rows, student_rows = generate_catalog(n_courses, n_enrollments)
+        courses, timings = storage_scenarios(course_rows, student_rows, repeat, **size)
+        results.extend(timings)
+        results.extend(service_scenarios(courses, repeat, ops, **size))
+        print(f"finished {n_courses} courses / {n_enrollments} enrollments", file=sys.stderr)
+    return {'meta': suite_metadata(repeat, ops), 'results': results}
+
+
+def suite_metadata(repeat, ops):
+    """Describe the environment a suite ran in"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'repeat': repeat,
+        'ops': ops
+    }
+
+
+def compare(baseline, current, threshold=1.2):
+    """Print per-scenario ratios against a baseline run, flagging slowdowns"""
+    def key(result):
+        return (result['scenario'], result['courses'], result['enrollments'])
+    before = {key(result): result for result in baseline['results']}
+    for result in current['results']:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result['per_op_us'] / old['per_op_us'] if old['per_op_us'] else float('inf')
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{result['scenario']:<42} {result['courses']:>7} {result['enrollments']:>9} "
+              f"{old['per_op_us']:>12.1f} -> {result['per_op_us']:>12.1f} us ({ratio:.2f}x){flag}")
+
+
+def parse_sizes(text):
+    return [tuple(int(part) for part in size.split('x')) for size in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', action='store_true', help='run the scenario suite and emit JSON')
+    parser.add_argument('--sizes', type=parse_sizes, default=[(1_000, 50_000), (10_000, 500_000)],
+                        help='comma-separated COURSESxENROLLMENTS sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--ops', type=int, default=200, help='calls per repetition of per-request scenarios')
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    args = parser.parse_args()
+    if not args.suite:
+        bench_course_lookup()
+        bench_import()
+        bench_enrollment_memory()
+        bench_grade_analytics()
+        bench_cold_start()
+        bench_row_construction()
+    else:
+        report = run_suite(args.sizes, args.repeat, args.ops)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        else:
+            json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+            print()
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                compare(json.load(f), report)
@@ -1,11 +1,33 @@
 #!/usr/bin/env python3
 """
 Script to generate 50 sample courses in CSV format for manual testing.
+
+Also generates synthetic catalogs of any size for benchmarking:
+    python generate_courses.py --courses 10000 --enrollments 1000000 --out-dir data
 """
 
+import argparse
 import csv
 import os
-from datetime import datetime
+import random
+from datetime import datetime, timedelta
+
+ARABIC_TOPICS = ["قواعد البيانات", "شبكات الحاسوب", "أمن المعلومات", "تطوير الويب", "تعلم الآلة",
+                 "تحليل البيانات", "هندسة البرمجيات", "أنظمة التشغيل", "البرمجة الكائنية", "الحوسبة السحابية",
+                 "هياكل البيانات", "الذكاء الاصطناعي", "معالجة الصور", "الأنظمة الموزعة", "الأمان السيبراني"]
+ENGLISH_TOPICS = ["Databases", "Computer Networks", "Information Security", "Web Development",
+                  "Machine Learning", "Data Analysis", "Software Engineering", "Operating Systems",
+                  "Object-Oriented Programming", "Cloud Computing", "Data Structures",
+                  "Artificial Intelligence", "Image Processing", "Distributed Systems", "Cybersecurity"]
+ARABIC_LEVELS = ["مقدمة في {}", "{} المتقدمة", "أساسيات {}", "مشروع {}", "{} التطبيقية"]
+ENGLISH_LEVELS = ["Introduction to {}", "Advanced {}", "Foundations of {}", "{} Project", "Applied {}"]
+ARABIC_NAMES = ["سارة", "علي", "لينا", "كريم", "نورا", "يوسف", "منى", "حسن", "فاطمة", "عمر"]
+ARABIC_SURNAMES = ["حسن", "محمود", "أحمد", "عبدالله", "سالم", "محمد", "علي"]
+ENGLISH_NAMES = ["Sarah", "Ali", "Lina", "Karim", "Nora", "Youssef", "Mona", "Hassan", "Fatima", "Omar"]
+ENGLISH_SURNAMES = ["Smith", "Johnson", "Brown", "Hassan", "Ahmed", "Miller", "Wilson"]
+GRADES = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F", "95", "88", "74"]
+COURSE_FIELDS = ['id', 'title', 'description', 'instructor', 'credits', 'created_at', 'updated_at']
+STUDENT_FIELDS = ['course_id', 'student_id', 'name', 'email', 'grade', 'enrolled_at']
 
 def generate_50_courses():
     """Generate 50 sample courses"""
@@ -82,5 +104,86 @@ def generate_50_courses():
 
     print("تم إضافة 50 دورة تدريبية إلى ملف courses_backup.csv")
 
+def roster_sizes(n_courses, n_enrollments, skew, rng):
+    """Split n_enrollments over n_courses following a Zipf-like curve"""
+    if n_courses == 0:
+        return []
+    weights = [1 / (rank ** skew) for rank in range(1, n_courses + 1)]
+    total = sum(weights)
+    sizes = [int(n_enrollments * w / total) for w in weights]
+    # Hand out the rounding remainder to the largest courses
+    for i in range(n_enrollments - sum(sizes)):
+        sizes[i % n_courses] += 1
+    rng.shuffle(sizes)
+    return sizes
+
+
+def generate_catalog(n_courses, n_enrollments, skew=1.1, arabic_share=0.5, graded_share=0.6, seed=0):
+    """Generate (course_rows, student_rows) shaped like courses.csv and students.csv rows.
+    
+    Roster sizes follow a Zipf-like distribution with exponent skew, so a
+    few courses hold most enrollments. Output is deterministic for a seed.
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2025, 1, 1)
+    sizes = roster_sizes(n_courses, n_enrollments, skew, rng)
+    # Students are drawn from a shared pool, so many take several courses
+    pool = max([n_enrollments // 3] + sizes)
+    course_rows = []
+    student_rows = []
+    for index, size in enumerate(sizes):
+        course_id = index + 1
+        arabic = rng.random() < arabic_share
+        topic = rng.choice(ARABIC_TOPICS if arabic else ENGLISH_TOPICS)
+        title = rng.choice(ARABIC_LEVELS if arabic else ENGLISH_LEVELS).format(topic)
+        if arabic:
+            instructor = f"د. {rng.choice(ARABIC_NAMES)} {rng.choice(ARABIC_SURNAMES)}"
+            description = f"دورة في {topic} رقم {course_id}"
+        else:
+            instructor = f"Dr. {rng.choice(ENGLISH_NAMES)} {rng.choice(ENGLISH_SURNAMES)}"
+            description = f"A course on {topic}, section {course_id}"
+        created_at = (base_time + timedelta(seconds=rng.randrange(86400 * 365))).isoformat()
+        course_rows.append({
+            'id': course_id, 'title': f"{title} {course_id}", 'description': description,
+            'instructor': instructor, 'credits': rng.randint(1, 5),
+            'created_at': created_at, 'updated_at': created_at
+        })
+        for number in rng.sample(range(pool), size):
+            student_rows.append({
+                'course_id': course_id,
+                'student_id': f"STU{number:07d}",
+                'name': f"طالب {number}" if arabic else f"Student {number}",
+                'email': f"student{number}@example.com",
+                'grade': rng.choice(GRADES) if rng.random() < graded_share else '',
+                'enrolled_at': (base_time + timedelta(microseconds=rng.randrange(86400 * 365 * 10**6))).isoformat()
+            })
+    return course_rows, student_rows
+
+
+def write_catalog(course_rows, student_rows, courses_file='courses.csv', students_file='students.csv'):
+    """Write generated rows in the application's CSV layout"""
+    for path, fields, rows in ((courses_file, COURSE_FIELDS, course_rows),
+                               (students_file, STUDENT_FIELDS, student_rows)):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
 if __name__ == "__main__":
-    generate_50_courses()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, help='number of synthetic courses')
+    parser.add_argument('--enrollments', type=int, default=0, help='total enrollments across all courses')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of roster sizes')
+    parser.add_argument('--arabic-share', type=float, default=0.5, help='fraction of Arabic courses')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out-dir', default='.')
+    args = parser.parse_args()
+    if args.courses is None:
+        generate_50_courses()
+    else:
+        courses, students = generate_catalog(args.courses, args.enrollments, args.skew,
+                                             args.arabic_share, seed=args.seed)
+        write_catalog(courses, students, os.path.join(args.out_dir, 'courses.csv'),
+                      os.path.join(args.out_dir, 'students.csv'))
+        print(f"Generated {len(courses)} courses and {len(students)} enrollments in {args.out_dir}")
\ No newline at end of file
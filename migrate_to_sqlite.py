@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Script to migrate courses.csv and students.csv into the SQLite database.
+
+Usage:
+    python migrate_to_sqlite.py
+
+Afterwards set storage_mode = 'sqlite' in Config to serve from the database.
+"""
+
+import sys
+sys.path.append('.')
+
+from app import Config, SQLiteCourseRepository
+
+def migrate_to_sqlite():
+    """Copy the CSV data into an empty SQLite database"""
+    config = Config()
+    repository = SQLiteCourseRepository(config)
+    try:
+        migrated = repository.migrate_from_csv()
+    finally:
+        repository.close()
+
+    if migrated is None:
+        print(f"{config.get_database_file()} already contains data, nothing migrated")
+    else:
+        print(f"Migrated {migrated} courses to {config.get_database_file()}")
+
+if __name__ == "__main__":
+    migrate_to_sqlite()
\ No newline at end of file
@@ -31,6 +31,27 @@ def clean_tasks():
     # Reset after tests
     config.set_testing_mode(False)
 
+class CountingRepository(CourseRepository):
+    """CSV repository that records the writes it is asked to make"""
+    
+    def __init__(self, config):
+        super().__init__(config)
+        self.saves = 0
+        self.changes = []
+        self.batches = []
+    
+    def save_courses(self, courses):
+        self.saves += 1
+        super().save_courses(courses)
+    
+    def save_change(self, courses, event_type, course, students=()):
+        self.changes.append(event_type)
+        super().save_change(courses, event_type, course, students)
+    
+    def save_changes(self, courses, changes):
+        self.batches.append([event_type for event_type, _, _ in changes])
+        super().save_changes(courses, changes)
+
 # Test Case 1-10: Course Creation Tests
 def test_create_course_with_title(client, clean_tasks):
     """Test Case 1: Create course with valid title"""
@@ -527,3 +548,1377 @@ def test_home_page_loads(client, clean_tasks):
     response = client.get('/')
     assert response.status_code == 200
 
+
+# Test Case 51-54: Journaled Storage Tests
+@pytest.fixture
+def storage_config(tmp_path):
+    """Point Config at temporary files with real file I/O enabled"""
+    config = Config()
+    saved = dict(config.__dict__)
+    config.courses_file = str(tmp_path / 'courses.csv')
+    config.students_file = str(tmp_path / 'students.csv')
+    config.journal_file = str(tmp_path / 'courses.journal')
+    config.snapshot_file = str(tmp_path / 'courses.snapshot')
+    config.lock_file = str(tmp_path / 'courses.lock')
+    config.shard_dir = str(tmp_path / 'shards')
+    config.set_testing_mode(False)
+    yield config
+    config.__dict__.update(saved)
+
+def test_journal_appends_instead_of_rewriting(storage_config):
+    """Test Case 51: Journal mode appends mutations without rewriting the CSVs"""
+    from app import JournaledCourseRepository, StudentService
+    service = CourseService(JournaledCourseRepository(storage_config))
+    course = service.add_course('Journal Course', 'Desc')
+    StudentService(service).enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    assert not os.path.exists(storage_config.courses_file)
+    with open(storage_config.journal_file, encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+    service.repository.close()
+
+def test_journal_replayed_on_startup(storage_config):
+    """Test Case 52: Startup replays the journal on top of the CSV snapshot"""
+    from app import JournaledCourseRepository, StudentService
+    service = CourseService(JournaledCourseRepository(storage_config))
+    course = service.add_course('Replay Course', 'Desc')
+    students = StudentService(service)
+    students.enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    students.update_student_grade(course['id'], 'S001', 'A')
+    service.update_course(course['id'], instructor='Dr. Smith')
+    service.repository.close()
+    reloaded = CourseService(JournaledCourseRepository(storage_config))
+    loaded = reloaded.get_course(course['id'])
+    assert loaded['instructor'] == 'Dr. Smith'
+    assert loaded['students'][0]['grade'] == 'A'
+
+def test_journal_compaction_folds_into_csv(storage_config):
+    """Test Case 53: Compaction folds the journal back into the CSV files"""
+    from app import JournaledCourseRepository
+    storage_config.journal_compact_threshold = 3
+    repository = JournaledCourseRepository(storage_config)
+    service = CourseService(repository)
+    for i in range(3):
+        service.add_course(f'Course {i}', '')
+    repository.close()
+    assert os.path.exists(storage_config.courses_file)
+    assert not os.path.exists(storage_config.journal_file + '.compacting')
+    plain = CourseService(CourseRepository(storage_config))
+    assert len(plain.get_all_courses()) == 3
+
+def test_repository_factory_selects_journal(storage_config):
+    """Test Case 54: RepositoryFactory honours config.storage_mode"""
+    from app import RepositoryFactory, JournaledCourseRepository
+    storage_config.storage_mode = 'journal'
+    assert isinstance(RepositoryFactory.create_repository(storage_config), JournaledCourseRepository)
+    storage_config.storage_mode = 'csv'
+    assert type(RepositoryFactory.create_repository(storage_config)) is CourseRepository
+
+# Test Case 55-56: Course Index Tests
+def test_instructor_index_follows_updates(client, clean_tasks):
+    """Test Case 55: Instructor filter reflects updated and deleted courses"""
+    from app import course_service
+    c1 = course_service.add_course('Course 1', '', 'Dr. Smith')
+    c2 = course_service.add_course('Course 2', '', 'Dr. Smith')
+    course_service.update_course(c1['id'], instructor='Dr. Jones')
+    course_service.delete_course(c2['id'])
+    assert course_service.filter_courses(instructor='Dr. Smith') == []
+    assert course_service.filter_courses(instructor='Dr. Jones') == [c1]
+
+def test_update_course_keeps_id(client, clean_tasks):
+    """Test Case 56: Updating the id field does not corrupt the id index"""
+    create_response = client.post('/api/courses', json={'title': 'Course'})
+    course_id = json.loads(create_response.data)['id']
+    client.put(f'/api/courses/{course_id}', json={'id': 999})
+    assert client.get(f'/api/courses/{course_id}').status_code == 200
+    assert client.get('/api/courses/999').status_code == 404
+
+# Test Case 57-59: Student Roster Tests
+def test_enroll_duplicate_student_rejected(client, clean_tasks):
+    """Test Case 57: Enrolling the same student_id twice returns 409"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math 101'}).data)['id']
+    student_data = {'name': 'John Doe', 'email': 'john@example.com', 'student_id': 'S001'}
+    assert client.post(f'/api/courses/{course_id}/students', json=student_data).status_code == 201
+    assert client.post(f'/api/courses/{course_id}/students', json=student_data).status_code == 409
+    course_data = json.loads(client.get(f'/api/courses/{course_id}').data)
+    assert len(course_data['students']) == 1
+
+def test_enroll_student_upsert(client, clean_tasks):
+    """Test Case 58: Upsert updates an existing enrollment in place"""
+    from app import course_service, student_service
+    course = course_service.add_course('Math 101', '')
+    student_service.enroll_student(course['id'], 'John', 'old@example.com', 'S001')
+    student_service.update_student_grade(course['id'], 'S001', 'B')
+    student = student_service.enroll_student(course['id'], 'John', 'new@example.com', 'S001', upsert=True)
+    assert student['email'] == 'new@example.com'
+    assert student['grade'] == 'B'
+    assert len(course['students']) == 1
+
+def test_roster_preserves_enrollment_order(client, clean_tasks):
+    """Test Case 59: Roster keeps enrollment order after removals"""
+    from app import course_service, student_service
+    course = course_service.add_course('Math 101', '')
+    for sid in ['S001', 'S002', 'S003']:
+        student_service.enroll_student(course['id'], sid, f'{sid}@example.com', sid)
+    student_service.remove_student(course['id'], 'S002')
+    course_data = json.loads(client.get(f"/api/courses/{course['id']}").data)
+    assert [s['id'] for s in course_data['students']] == ['S001', 'S003']
+
+# Test Case 60-62: Bulk Enrollment Tests
+def test_bulk_enroll_json_array(client, clean_tasks):
+    """Test Case 60: Bulk enrollment returns per-row results"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math 101'}).data)['id']
+    students = [
+        {'name': 'John Doe', 'email': 'john@example.com', 'student_id': 'S001'},
+        {'name': 'Jane Smith', 'email': 'jane@example.com', 'student_id': 'S002'},
+        {'name': 'Missing Email', 'student_id': 'S003'},
+        {'name': 'John Again', 'email': 'john@example.com', 'student_id': 'S001'}
+    ]
+    response = client.post(f'/api/courses/{course_id}/students/bulk', json=students)
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert [r['status'] for r in data['results']] == ['enrolled', 'enrolled', 'invalid', 'duplicate']
+    course_data = json.loads(client.get(f'/api/courses/{course_id}').data)
+    assert len(course_data['students']) == 2
+
+def test_bulk_enroll_ndjson(client, clean_tasks):
+    """Test Case 61: Bulk enrollment accepts an NDJSON body"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math 101'}).data)['id']
+    body = '\n'.join(json.dumps({'name': f'Student {i}', 'email': f's{i}@example.com', 'student_id': f'S{i:03d}'})
+                     for i in range(5))
+    response = client.post(f'/api/courses/{course_id}/students/bulk', data=body,
+                           content_type='application/x-ndjson')
+    assert response.status_code == 201
+    assert json.loads(response.data)['enrolled'] == 5
+
+def test_bulk_enroll_single_write_and_event(clean_tasks):
+    """Test Case 62: Bulk enrollment persists once and notifies once"""
+    from app import StudentService, CourseObserver
+    class Recorder(CourseObserver):
+        def __init__(self):
+            self.events = []
+        def update(self, course, event_type):
+            self.events.append(event_type)
+    repository = CountingRepository(Config())
+    service = CourseService(repository)
+    recorder = Recorder()
+    service.add_observer(recorder)
+    course = service.add_course('Math 101', '')
+    rows = [{'name': f'S{i}', 'email': f's{i}@example.com', 'student_id': f'S{i}'} for i in range(1000)]
+    StudentService(service).enroll_students(course['id'], rows)
+    assert len(repository.changes) == 2
+    assert recorder.events == ['created', 'students_enrolled']
+    assert len(course['students']) == 1000
+
+# Test Case 63-65: Course Import Tests
+def test_import_courses_dedupes_titles(clean_tasks):
+    """Test Case 63: Import skips existing and repeated titles"""
+    from app import course_service
+    course_service.add_course('Existing', '')
+    rows = [
+        {'title': 'Existing', 'description': '', 'instructor': '', 'credits': ''},
+        {'title': 'New 1', 'description': 'D', 'instructor': 'Dr. Smith', 'credits': '4'},
+        {'title': 'New 1', 'description': '', 'instructor': '', 'credits': ''},
+        {'title': 'New 2', 'description': '', 'instructor': '', 'credits': ''},
+        {'title': '', 'description': '', 'instructor': '', 'credits': ''}
+    ]
+    summary = course_service.import_courses(rows)
+    assert summary['imported'] == 2
+    assert summary['skipped'] == 2
+    assert summary['invalid'] == 1
+    new_ids = [c['id'] for c in course_service.get_all_courses() if c['title'].startswith('New')]
+    assert new_ids[1] == new_ids[0] + 1
+
+def test_import_courses_endpoint(client, clean_tasks):
+    """Test Case 64: POST /api/courses/import streams a CSV body"""
+    body = 'id,title,description,instructor,credits,created_at,updated_at\n' \
+           '3,رياضيات أساسية,,Unknown,3,,\n' \
+           '4,فيزياء متقدمة,دورة شاملة,د. أحمد محمد,4,,\n'
+    response = client.post('/api/courses/import', data=body.encode('utf-8'), content_type='text/csv')
+    assert response.status_code == 201
+    assert json.loads(response.data)['imported'] == 2
+    courses = json.loads(client.get('/api/courses').data)
+    assert [c['credits'] for c in courses] == [3, 4]
+
+def test_import_courses_single_write(clean_tasks):
+    """Test Case 65: Import persists the new courses in one batch"""
+    repository = CountingRepository(Config())
+    service = CourseService(repository)
+    rows = [{'title': f'Course {i}'} for i in range(500)]
+    assert service.import_courses(rows)['imported'] == 500
+    assert repository.batches == [['created'] * 500]
+
+# Test Case 66-68: Write-Behind Persistence Tests
+def test_write_behind_coalesces_burst(storage_config):
+    """Test Case 66: A burst of writes is flushed as one save"""
+    from app import WriteBehindRepository, StudentService
+    storage_config.write_behind_window = 0.2
+    counting = CountingRepository(storage_config)
+    repository = WriteBehindRepository(counting)
+    service = CourseService(repository)
+    course = service.add_course('Burst Course', '')
+    students = StudentService(service)
+    for i in range(20):
+        students.enroll_student(course['id'], f'S{i}', f's{i}@example.com', f'S{i:03d}')
+    assert repository.flush(timeout=5)
+    assert counting.saves == 1
+    repository.close()
+    reloaded = CourseService(CourseRepository(storage_config))
+    assert len(reloaded.get_course(course['id'])['students']) == 20
+
+def test_write_behind_group_commit_wait(storage_config):
+    """Test Case 67: Waiting on a ticket returns once the write is durable"""
+    from app import WriteBehindRepository, JournaledCourseRepository
+    storage_config.write_behind_window = 0.01
+    repository = WriteBehindRepository(JournaledCourseRepository(storage_config))
+    service = CourseService(repository)
+    service.add_course('Durable Course', '')
+    assert repository.wait(timeout=5)
+    with open(storage_config.journal_file, encoding='utf-8') as f:
+        assert 'Durable Course' in f.read()
+    repository.close()
+
+def test_write_behind_close_flushes(storage_config):
+    """Test Case 68: Closing the repository flushes pending writes"""
+    from app import WriteBehindRepository
+    storage_config.write_behind_window = 10
+    repository = WriteBehindRepository(CourseRepository(storage_config))
+    service = CourseService(repository)
+    service.add_course('Shutdown Course', '')
+    repository.close()
+    reloaded = CourseService(CourseRepository(storage_config))
+    assert [c['title'] for c in reloaded.get_all_courses()] == ['Shutdown Course']
+
+# Test Case 69-70: Concurrency Tests
+@pytest.mark.slow
+def test_concurrent_enroll_and_grade_stress(clean_tasks):
+    """Test Case 69: Concurrent enrollments and grade updates stay consistent"""
+    import threading
+    from app import course_service, student_service
+    courses = [course_service.add_course(f'Course {i}', '') for i in range(4)]
+    per_thread = 200
+    errors = []
+    def worker(thread_index):
+        try:
+            for i in range(per_thread):
+                course = courses[(thread_index + i) % len(courses)]
+                student_id = f'T{thread_index}-{i}'
+                student_service.enroll_student(course['id'], student_id, f'{student_id}@example.com', student_id)
+                student_service.update_student_grade(course['id'], student_id, 'A')
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    enrolled = [s for course in courses for s in course['students']]
+    assert len(enrolled) == 16 * per_thread
+    assert all(s['grade'] == 'A' for s in enrolled)
+
+def test_concurrent_add_course_unique_ids(clean_tasks):
+    """Test Case 70: Courses created from many threads get unique IDs"""
+    import threading
+    from app import course_service
+    created = []
+    def worker():
+        for i in range(100):
+            created.append(course_service.add_course(f'Course {i}', '')['id'])
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(created)) == 800
+    assert len(course_service.get_all_courses()) == 800
+
+# Test Case 71-73: SQLite Storage Tests
+def test_sqlite_round_trip(storage_config, tmp_path):
+    """Test Case 71: SQLite repository persists row-level changes"""
+    from app import SQLiteCourseRepository, StudentService
+    storage_config.database_file = str(tmp_path / 'courses.db')
+    repository = SQLiteCourseRepository(storage_config)
+    service = CourseService(repository)
+    students = StudentService(service)
+    keep = service.add_course('Keep', '', 'Dr. Smith')
+    drop = service.add_course('Drop', '')
+    for sid in ['S001', 'S002', 'S003']:
+        students.enroll_student(keep['id'], sid, f'{sid}@example.com', sid)
+    students.update_student_grade(keep['id'], 'S002', 'A')
+    students.remove_student(keep['id'], 'S001')
+    service.update_course(keep['id'], credits=5)
+    service.delete_course(drop['id'])
+    repository.close()
+    reloaded = CourseService(SQLiteCourseRepository(storage_config))
+    assert [c['title'] for c in reloaded.get_all_courses()] == ['Keep']
+    course = reloaded.get_course(keep['id'])
+    assert course['credits'] == 5
+    assert [(s['id'], s['grade']) for s in course['students']] == [('S002', 'A'), ('S003', None)]
+    reloaded.repository.close()
+
+def test_sqlite_uses_wal_and_indexes(storage_config, tmp_path):
+    """Test Case 72: SQLite database runs in WAL mode with lookup indexes"""
+    import sqlite3
+    from app import SQLiteCourseRepository
+    storage_config.database_file = str(tmp_path / 'courses.db')
+    repository = SQLiteCourseRepository(storage_config)
+    repository.load_courses()
+    repository.close()
+    conn = sqlite3.connect(storage_config.database_file)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_courses_instructor', 'idx_enrollments_course_student'} <= indexes
+    conn.close()
+
+def test_sqlite_migrates_from_csv(storage_config, tmp_path):
+    """Test Case 73: CSV data migrates once into SQLite"""
+    from app import SQLiteCourseRepository, StudentService, RepositoryFactory
+    csv_service = CourseService(CourseRepository(storage_config))
+    course = csv_service.add_course('CSV Course', '')
+    StudentService(csv_service).enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    storage_config.database_file = str(tmp_path / 'courses.db')
+    storage_config.storage_mode = 'sqlite'
+    repository = RepositoryFactory.create_repository(storage_config)
+    assert isinstance(repository, SQLiteCourseRepository)
+    assert repository.migrate_from_csv() == 1
+    assert repository.migrate_from_csv() is None
+    migrated = CourseService(repository).get_course(course['id'])
+    assert migrated['students'][0]['name'] == 'John'
+    repository.close()
+
+# Test Case 74-76: Lazy Roster Loading Tests
+@pytest.fixture
+def lazy_catalog(storage_config):
+    """Write a small catalog to CSV and switch to lazy roster loading"""
+    from app import StudentService
+    service = CourseService(CourseRepository(storage_config))
+    students = StudentService(service)
+    for i in range(3):
+        course = service.add_course(f'Course {i}', '')
+        students.enroll_students(course['id'], [
+            {'name': f'Student "{j}"', 'email': f's{j}@example.com', 'student_id': f'C{i}S{j}'}
+            for j in range(5)
+        ])
+    storage_config.lazy_rosters = True
+    return storage_config
+
+def test_lazy_rosters_load_on_first_access(lazy_catalog):
+    """Test Case 74: Rosters are not parsed until a course's students are used"""
+    from app import LazyStudentRoster
+    repository = CourseRepository(lazy_catalog)
+    service = CourseService(repository)
+    rosters = [c['students'] for c in service.get_all_courses()]
+    assert all(isinstance(r, LazyStudentRoster) and not r.loaded for r in rosters)
+    assert os.path.exists(lazy_catalog.students_file + '.idx')
+    assert [s['id'] for s in rosters[1]] == [f'C1S{j}' for j in range(5)]
+    assert rosters[1][0]['name'] == 'Student "0"'
+    assert not rosters[0].loaded and not rosters[2].loaded
+    repository.close()
+
+def test_lazy_save_keeps_untouched_rosters_unloaded(lazy_catalog):
+    """Test Case 75: Saving copies untouched rosters without loading them"""
+    from app import StudentService
+    repository = CourseRepository(lazy_catalog)
+    service = CourseService(repository)
+    first, second, third = service.get_all_courses()
+    StudentService(service).update_student_grade(second['id'], 'C1S2', 'A')
+    assert not first['students'].loaded and not third['students'].loaded
+    assert [s['id'] for s in third['students']] == [f'C2S{j}' for j in range(5)]
+    repository.close()
+    lazy_catalog.lazy_rosters = False
+    reloaded = CourseService(CourseRepository(lazy_catalog))
+    assert reloaded.get_course(second['id'])['students'].get('C1S2')['grade'] == 'A'
+    assert sum(len(c['students']) for c in reloaded.get_all_courses()) == 15
+
+def test_lazy_index_rebuilt_when_csv_changes(lazy_catalog):
+    """Test Case 76: A stale offset index is rebuilt from students.csv"""
+    repository = CourseRepository(lazy_catalog)
+    course_id = CourseService(repository).get_all_courses()[0]['id']
+    repository.close()
+    with open(lazy_catalog.students_file, 'a', newline='', encoding='utf-8') as f:
+        f.write(f'{course_id},LATE,Late Student,late@example.com,,2025-01-01T00:00:00\r\n')
+    repository = CourseRepository(lazy_catalog)
+    service = CourseService(repository)
+    assert 'LATE' in service.get_course(course_id)['students']
+    assert len(service.get_course(course_id)['students']) == 6
+    repository.close()
+
+# Test Case 77-79: Pagination and Streaming Tests
+def test_get_courses_paginated(client, clean_tasks):
+    """Test Case 77: limit/after walk the catalog page by page"""
+    for i in range(5):
+        client.post('/api/courses', json={'title': f'Course {i}'})
+    response = client.get('/api/courses?limit=2')
+    page = json.loads(response.data)
+    assert [c['title'] for c in page] == ['Course 0', 'Course 1']
+    seen = [c['id'] for c in page]
+    cursor = response.headers['X-Next-Cursor']
+    while cursor:
+        response = client.get(f'/api/courses?limit=2&after={cursor}')
+        seen += [c['id'] for c in json.loads(response.data)]
+        cursor = response.headers.get('X-Next-Cursor')
+    assert seen == sorted(seen) and len(seen) == 5
+
+def test_get_courses_invalid_limit(client, clean_tasks):
+    """Test Case 78: Out-of-range limit is rejected"""
+    assert client.get('/api/courses?limit=0').status_code == 400
+
+def test_get_courses_streaming(client, clean_tasks):
+    """Test Case 79: stream=json and stream=ndjson return every course"""
+    client.post('/api/courses', json={'title': 'Course 1', 'instructor': 'Dr. Smith'})
+    client.post('/api/courses', json={'title': 'Course 2'})
+    data = json.loads(client.get('/api/courses?stream=json').data)
+    assert [c['title'] for c in data] == ['Course 1', 'Course 2']
+    response = client.get('/api/courses?stream=ndjson&instructor=Dr.%20Smith')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode('utf-8').splitlines()
+    assert [json.loads(line)['title'] for line in lines] == ['Course 1']
+
+# Test Case 80-82: Conditional GET Tests
+def test_get_course_not_modified(client, clean_tasks):
+    """Test Case 80: Matching If-None-Match returns 304 for a course"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Cached'}).data)['id']
+    response = client.get(f'/api/courses/{course_id}')
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified']
+    cached = client.get(f'/api/courses/{course_id}', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+def test_course_etag_changes_on_enrollment(client, clean_tasks):
+    """Test Case 81: Enrolling a student changes the course and catalog ETags"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Cached'}).data)['id']
+    course_etag = client.get(f'/api/courses/{course_id}').headers['ETag']
+    list_etag = client.get('/api/courses').headers['ETag']
+    client.post(f'/api/courses/{course_id}/students',
+                json={'name': 'John', 'email': 'john@example.com', 'student_id': 'S001'})
+    assert client.get(f'/api/courses/{course_id}', headers={'If-None-Match': course_etag}).status_code == 200
+    assert client.get('/api/courses', headers={'If-None-Match': list_etag}).status_code == 200
+
+def test_catalog_version_is_monotonic(clean_tasks):
+    """Test Case 82: Every mutation bumps the catalog version"""
+    from app import course_service, student_service
+    versions = [course_service.version]
+    course = course_service.add_course('Course', '')
+    versions.append(course_service.version)
+    student_service.enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    versions.append(course_service.version)
+    student_service.update_student_grade(course['id'], 'S001', 'A')
+    versions.append(course_service.version)
+    course_service.delete_course(course['id'])
+    versions.append(course_service.version)
+    assert versions == sorted(set(versions))
+
+# Test Case 83-86: Response Cache Tests
+def test_response_cache_hits_and_invalidation(client, clean_tasks):
+    """Test Case 83: Repeated reads hit the cache and writes invalidate it"""
+    from app import response_cache
+    response_cache.clear()
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Cached'}).data)['id']
+    client.get(f'/api/courses/{course_id}')
+    hits = response_cache.hits
+    client.get(f'/api/courses/{course_id}')
+    assert response_cache.hits == hits + 1
+    client.put(f'/api/courses/{course_id}', json={'title': 'Renamed'})
+    assert response_cache.stats()['entries'] == 0
+    assert json.loads(client.get(f'/api/courses/{course_id}').data)['title'] == 'Renamed'
+
+def test_response_cache_gzip(client, clean_tasks):
+    """Test Case 84: Clients accepting gzip get a compressed cached body"""
+    import gzip
+    client.post('/api/courses', json={'title': 'Compressed'})
+    response = client.get('/api/courses', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))[0]['title'] == 'Compressed'
+
+def test_response_cache_grade_update_not_stale(client, clean_tasks):
+    """Test Case 85: Cached course documents reflect grade updates"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math'}).data)['id']
+    client.post(f'/api/courses/{course_id}/students',
+                json={'name': 'John', 'email': 'john@example.com', 'student_id': 'S001'})
+    client.get(f'/api/courses/{course_id}')
+    client.put(f'/api/courses/{course_id}/students/S001', json={'grade': 'A'})
+    data = json.loads(client.get(f'/api/courses/{course_id}').data)
+    assert data['students'][0]['grade'] == 'A'
+
+def test_response_cache_lru_byte_bound():
+    """Test Case 86: The cache evicts least recently used entries to stay under its byte cap"""
+    from app import ResponseCache
+    cache = ResponseCache(max_bytes=10)
+    cache.put('a', b'12345', 'g')
+    cache.put('b', b'12345', 'g')
+    cache.get('a')
+    cache.put('c', b'12345', 'g')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'12345'
+    assert cache.stats()['bytes'] == 10
+    assert cache.evictions == 1
+
+# Test Case 87-89: Asynchronous Observer Dispatch Tests
+class RecordingObserver:
+    synchronous = False
+    
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+    
+    def update_batch(self, course, event_type, count):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append((course['id'], event_type, count))
+
+def test_async_dispatch_coalesces_consecutive_events():
+    """Test Case 87: Queued events for one course arrive as a single batch"""
+    import threading
+    from app import AsyncObserverDispatcher
+    gate = threading.Event()
+    observer = RecordingObserver(gate)
+    dispatcher = AsyncObserverDispatcher(workers=1, queue_size=1000)
+    course = {'id': 1, 'title': 'Math'}
+    dispatcher.submit(course, 'created', [observer])
+    for _ in range(500):
+        dispatcher.submit(course, 'student_enrolled', [observer])
+    gate.set()
+    dispatcher.close()
+    assert observer.batches == [(1, 'created', 1), (1, 'student_enrolled', 500)]
+    stats = dispatcher.stats()
+    assert stats['delivered'] == 501
+    assert stats['batches'] == 2
+    assert stats['queue_depth'] == 0
+
+def test_async_dispatch_drop_new_when_full():
+    """Test Case 88: The drop_new policy discards events once the queue is full"""
+    import threading
+    from app import AsyncObserverDispatcher
+    gate = threading.Event()
+    observer = RecordingObserver(gate)
+    dispatcher = AsyncObserverDispatcher(workers=1, queue_size=2, backpressure='drop_new')
+    for course_id in range(10):
+        dispatcher.submit({'id': course_id, 'title': 'T'}, 'created', [observer])
+    gate.set()
+    dispatcher.close()
+    stats = dispatcher.stats()
+    assert stats['dropped'] > 0
+    assert stats['delivered'] + stats['dropped'] == 10
+
+def test_async_dispatch_keeps_cache_observer_synchronous(client, clean_tasks):
+    """Test Case 89: Cache invalidation stays inline while notifiers are deferred"""
+    from app import AsyncObserverDispatcher, course_service, response_cache
+    observer = RecordingObserver()
+    dispatcher = AsyncObserverDispatcher(workers=2)
+    course_service.observers.append(observer)
+    course_service.dispatcher = dispatcher
+    try:
+        course_id = json.loads(client.post('/api/courses', json={'title': 'Async'}).data)['id']
+        client.get(f'/api/courses/{course_id}')
+        client.put(f'/api/courses/{course_id}', json={'title': 'Renamed'})
+        assert json.loads(client.get(f'/api/courses/{course_id}').data)['title'] == 'Renamed'
+    finally:
+        course_service.dispatcher = None
+        course_service.observers.remove(observer)
+        dispatcher.close()
+    assert [e for _, e, _ in observer.batches] == ['created', 'updated']
+
+# Test Case 90-92: Slotted Record Tests
+def test_course_record_serializes_like_dict(client, clean_tasks):
+    """Test Case 90: Records keep the JSON shape of the dicts they replace"""
+    from app import CourseRecord, course_service
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math', 'instructor': 'Dr. Smith'}).data)['id']
+    client.post(f'/api/courses/{course_id}/students',
+                json={'name': 'John', 'email': 'john@example.com', 'student_id': 'S001'})
+    data = json.loads(client.get(f'/api/courses/{course_id}').data)
+    assert set(data) == set(CourseRecord.FIELDS)
+    assert set(data['students'][0]) == {'id', 'name', 'email', 'enrolled_at', 'grade'}
+    assert data['created_at'] == course_service.get_course(course_id)['created_at']
+    assert not hasattr(course_service.get_course(course_id), '__dict__')
+
+def test_record_interns_instructor_and_packs_timestamps():
+    """Test Case 91: Instructor names are shared and ISO timestamps round-trip"""
+    from app import CourseRecord
+    first = CourseRecord(instructor=''.join(['Dr. ', 'Smith']), created_at='2024-01-15T10:00:00')
+    second = CourseRecord(instructor=''.join(['Dr. ', 'Smith']), created_at='2024-01-15T10:00:00.250000')
+    assert first['instructor'] is second['instructor']
+    assert first['created_at'] == '2024-01-15T10:00:00'
+    assert second['created_at'] == '2024-01-15T10:00:00.250000'
+    assert first == dict(first)
+
+def test_record_keeps_unusual_timestamps_verbatim():
+    """Test Case 92: Timestamps that would not round-trip are stored as given"""
+    from app import StudentRecord
+    student = StudentRecord(id='S1', enrolled_at='2024-01-15T10:00:00+02:00')
+    assert student['enrolled_at'] == '2024-01-15T10:00:00+02:00'
+    student['enrolled_at'] = '2024-01-15'
+    assert student['enrolled_at'] == '2024-01-15'
+    with pytest.raises(KeyError):
+        student['unknown'] = 1
+
+# Test Case 93-95: Grade Analytics Tests
+def test_grade_analytics_per_course(client, clean_tasks):
+    """Test Case 93: Grade statistics are reported per course"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math', 'instructor': 'Dr. Smith'}).data)['id']
+    for i, grade in enumerate(['A', 'B', '85', None]):
+        client.post(f'/api/courses/{course_id}/students',
+                    json={'name': f'S{i}', 'email': f's{i}@example.com', 'student_id': f'S{i}'})
+        if grade is not None:
+            client.put(f'/api/courses/{course_id}/students/S{i}', json={'grade': grade})
+    data = json.loads(client.get('/api/analytics/grades').data)
+    stats = data['courses'][0]
+    assert stats['graded'] == 3 and stats['ungraded'] == 1
+    assert stats['mean'] == 3.333
+    assert stats['median'] == 3.0
+    assert stats['distribution']['A'] == 1 and stats['distribution']['B'] == 2
+    assert data['instructors'][0]['instructor'] == 'Dr. Smith'
+
+def test_grade_analytics_refreshes_after_grade_update(client, clean_tasks):
+    """Test Case 94: Changing a grade updates the course and instructor statistics"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math', 'instructor': 'Dr. Smith'}).data)['id']
+    client.post('/api/courses', json={'title': 'Physics', 'instructor': 'Dr. Smith'})
+    client.post(f'/api/courses/{course_id}/students',
+                json={'name': 'John', 'email': 'john@example.com', 'student_id': 'S001'})
+    client.put(f'/api/courses/{course_id}/students/S001', json={'grade': 'C'})
+    assert json.loads(client.get('/api/analytics/grades').data)['instructors'][0]['mean'] == 2.0
+    client.put(f'/api/courses/{course_id}/students/S001', json={'grade': 'A'})
+    data = json.loads(client.get('/api/analytics/grades?instructor=Dr. Smith').data)
+    assert data['instructors'][0]['mean'] == 4.0
+    assert data['instructors'][0]['courses'] == 2
+
+def test_grade_points_parsing():
+    """Test Case 95: Letter and percentage grades map onto the 4.0 scale"""
+    from app import GradeAnalytics
+    assert GradeAnalytics.grade_points('a-') == 3.7
+    assert GradeAnalytics.grade_points('A+') == 4.0
+    assert GradeAnalytics.grade_points('88') == 3.3
+    assert GradeAnalytics.grade_points(42) == 0.0
+    assert GradeAnalytics.grade_points('') is None
+    assert GradeAnalytics.grade_points('Pass') is None
+
+# Test Case 96-98: Full-Text Search Tests
+def test_search_normalizes_arabic(client, clean_tasks):
+    """Test Case 96: Arabic spelling variants and the article match the same course"""
+    client.post('/api/courses', json={'title': 'البرمجة الكائنية', 'description': 'مبادئ التصميم'})
+    client.post('/api/courses', json={'title': 'قواعد البيانات', 'description': 'إدارة البيانات'})
+    for query in ('البَرمجـة', 'برمجه', 'الكائنيه', 'اداره'):
+        results = json.loads(client.get(f'/api/courses/search?q={query}').data)
+        assert len(results) == 1, query
+
+def test_search_prefix_and_ranking(client, clean_tasks):
+    """Test Case 97: Prefixes match and title hits rank above description hits"""
+    client.post('/api/courses', json={'title': 'Intro', 'description': 'Python basics'})
+    client.post('/api/courses', json={'title': 'Python Programming', 'description': 'Advanced'})
+    client.post('/api/courses', json={'title': 'Databases', 'description': 'SQL'})
+    results = json.loads(client.get('/api/courses/search?q=pyth').data)
+    assert [c['title'] for c in results] == ['Python Programming', 'Intro']
+    assert client.get('/api/courses/search').status_code == 400
+
+def test_search_index_updates_incrementally(client, clean_tasks):
+    """Test Case 98: Renames and deletes are reflected without a rebuild"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Networks'}).data)['id']
+    client.put(f'/api/courses/{course_id}', json={'title': 'Security'})
+    assert json.loads(client.get('/api/courses/search?q=networks').data) == []
+    assert len(json.loads(client.get('/api/courses/search?q=secur').data)) == 1
+    client.delete(f'/api/courses/{course_id}')
+    assert json.loads(client.get('/api/courses/search?q=security').data) == []
+
+# Test Case 99-101: Binary Snapshot Tests
+def test_snapshot_written_and_used_on_startup(storage_config):
+    """Test Case 99: A save writes a snapshot that the next start loads instead of the CSVs"""
+    from app import StudentService
+    storage_config.use_snapshot = True
+    service = CourseService(CourseRepository(storage_config))
+    course = service.add_course('Snapshot Course', 'Desc', 'Dr. Smith', 4)
+    StudentService(service).enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    assert os.path.exists(storage_config.snapshot_file)
+    repository = CourseRepository(storage_config)
+    repository._load_csv = None  # Any CSV parse would fail
+    loaded = repository.load_courses()
+    assert loaded == [course]
+    assert loaded[0]['students'].get('S001')['email'] == 'john@example.com'
+
+def test_snapshot_ignored_when_csv_changes(storage_config):
+    """Test Case 100: Editing a CSV invalidates the snapshot"""
+    storage_config.use_snapshot = True
+    service = CourseService(CourseRepository(storage_config))
+    service.add_course('Original', 'Desc')
+    with open(storage_config.courses_file, 'a', newline='', encoding='utf-8') as f:
+        f.write('99,Added By Hand,Desc,Dr. X,3,2024-01-15T10:00:00,2024-01-15T10:00:00\r\n')
+    titles = [c['title'] for c in CourseRepository(storage_config).load_courses()]
+    assert titles == ['Original', 'Added By Hand']
+
+def test_snapshot_matches_csv_types(storage_config):
+    """Test Case 101: Values are stored as the CSV reader would return them"""
+    storage_config.use_snapshot = True
+    course = CourseFactory.create_course('Typed', None, 'Dr. X', '4', course_id=1)
+    student = CourseFactory.create_student('John', 'john@example.com', 'S001')
+    student['grade'] = 90
+    course['students'].add(student)
+    CourseRepository(storage_config).save_courses([course])
+    from_snapshot = CourseRepository(storage_config).load_courses()
+    storage_config.use_snapshot = False
+    from_csv = CourseRepository(storage_config).load_courses()
+    assert from_snapshot == from_csv
+    assert from_snapshot[0]['credits'] == 4 and from_snapshot[0]['students'][0]['grade'] == '90'
+
+# Test Case 102-103: Benchmark Suite Tests
+def test_generated_catalog_is_skewed_and_deterministic():
+    """Test Case 102: The generator is seeded, mixes languages and skews roster sizes"""
+    from generate_courses import generate_catalog
+    courses, students = generate_catalog(50, 5000, seed=3)
+    assert (courses, students) == generate_catalog(50, 5000, seed=3)
+    assert len(courses) == 50 and len(students) == 5000
+    sizes = sorted((sum(1 for s in students if s['course_id'] == c['id']) for c in courses), reverse=True)
+    assert sizes[0] > 10 * sizes[-1]
+    assert any(c['title'].isascii() for c in courses) and not all(c['title'].isascii() for c in courses)
+    for course in courses:
+        ids = [s['student_id'] for s in students if s['course_id'] == course['id']]
+        assert len(ids) == len(set(ids))
+
+def test_benchmark_suite_reports_every_scenario(client, clean_tasks):
+    """Test Case 103: The suite emits JSON-serializable timings and leaves the app untouched"""
+    import benchmarks
+    from app import course_service
+    report = benchmarks.run_suite(sizes=((20, 200),), repeat=1, ops=2)
+    scenarios = {result['scenario'] for result in report['results']}
+    assert {'load_courses', 'save_courses', 'GET /api/courses/<id>',
+            'StudentService.enroll_students'} <= scenarios
+    assert all(result['per_op_us'] > 0 for result in report['results'])
+    json.dumps(report)
+    assert course_service.courses == []
+
+# Test Case 104-106: Metrics Tests
+def test_metrics_endpoint_reports_route_latency(client, clean_tasks, monkeypatch):
+    """Test Case 104: Requests are counted and timed per route template"""
+    import app as app_module
+    from app import Metrics
+    monkeypatch.setattr(app_module, 'metrics', Metrics(sample_rate=1.0))
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math'}).data)['id']
+    client.get(f'/api/courses/{course_id}')
+    client.get('/api/courses/999999')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'course_http_requests_total{method="GET",route="/api/courses/<int:course_id>",status="200"} 1' in text
+    assert 'course_http_requests_total{method="GET",route="/api/courses/<int:course_id>",status="404"} 1' in text
+    assert 'course_http_request_duration_seconds_count{method="POST",route="/api/courses"} 1' in text
+    assert 'quantile="0.99"' in text
+    assert '# TYPE course_http_request_duration_seconds histogram' in text
+
+def test_metrics_storage_lock_and_observer_timings(storage_config):
+    """Test Case 105: Saves, lock waits and observer calls are measured"""
+    from app import InstrumentedRepository, LogNotifier, Metrics
+    metrics = Metrics(sample_rate=1.0)
+    service = CourseService(InstrumentedRepository(CourseRepository(storage_config), metrics),
+                            observers=[LogNotifier()], metrics=metrics)
+    service.add_course('Measured', 'Desc')
+    assert metrics.histogram('course_storage_duration_seconds', operation='save_change').count == 1
+    assert metrics.histogram('course_lock_wait_seconds', lock='course').count >= 1
+    assert metrics.histogram('course_observer_delivery_seconds', observer='LogNotifier').count == 1
+    text = metrics.render()
+    written = [line for line in text.splitlines() if line.startswith('course_storage_bytes_written_total')]
+    assert written and int(written[0].split()[-1]) == os.path.getsize(storage_config.courses_file) + \
+        os.path.getsize(storage_config.students_file)
+
+def test_metrics_disabled_and_unsampled(client, clean_tasks, monkeypatch):
+    """Test Case 106: Unsampled requests are only counted and disabled metrics still serve gauges"""
+    import app as app_module
+    from app import Histogram, Metrics
+    metrics = Metrics(sample_rate=0.0)
+    monkeypatch.setattr(app_module, 'metrics', metrics)
+    client.get('/api/courses')
+    assert metrics.histogram('course_http_request_duration_seconds', route='/api/courses', method='GET') is None
+    monkeypatch.setattr(app_module, 'metrics', None)
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'course_catalog_courses 0' in text
+    histogram = Histogram()
+    for value in (0.002,) * 90 + (0.2,) * 10:
+        histogram.observe(value)
+    assert 0.001 < histogram.quantile(0.5) <= 0.0025
+    assert 0.1 < histogram.quantile(0.99) <= 0.25
+
+# Test Case 107-109: Multi-Process Coordination Tests
+def _worker_service(config, repository_class):
+    """A course service as one worker process would build it"""
+    from app import ProcessCoordinator
+    coordinator = ProcessCoordinator(config.lock_file)
+    return CourseService(repository_class(config), coordinator=coordinator)
+
+def test_multiprocess_journal_tail(storage_config, monkeypatch):
+    """Test Case 107: A worker tails journal records another worker appended"""
+    from app import JournaledCourseRepository, StudentService
+    storage_config.multiprocess = True
+    first = _worker_service(storage_config, JournaledCourseRepository)
+    second = _worker_service(storage_config, JournaledCourseRepository)
+    course = first.add_course('Shared', 'Desc')
+    StudentService(first).enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    monkeypatch.setattr(second.repository, 'load_courses', lambda: pytest.fail('full reload'))
+    second.sync()
+    assert second.get_course(course['id'])['students'][0]['name'] == 'John'
+    assert second.search_courses('Shared')[0]['id'] == course['id']
+    second.update_course(course['id'], title='Renamed')
+    second.delete_course(first.add_course('Temporary', 'Desc')['id'])
+    first.sync()
+    assert first.get_course(course['id'])['title'] == 'Renamed'
+    assert [c['title'] for c in first.get_all_courses()] == ['Renamed']
+    for service in (first, second):
+        service.repository.close()
+        service.coordinator.close()
+
+def test_multiprocess_csv_writes_are_not_lost(storage_config):
+    """Test Case 108: Workers rewriting the CSVs neither lose updates nor reuse ids"""
+    first = _worker_service(storage_config, CourseRepository)
+    second = _worker_service(storage_config, CourseRepository)
+    first_id = first.add_course('From First', 'Desc')['id']
+    CourseService._next_id = first_id  # The second worker has not seen that id yet
+    second_id = second.add_course('From Second', 'Desc')['id']
+    first.update_course(first_id, instructor='Dr. Smith')
+    reloaded = CourseService(CourseRepository(storage_config))
+    courses = {course['id']: course for course in reloaded.get_all_courses()}
+    assert sorted(courses) == [first_id, first_id + 1] and second_id == first_id + 1
+    assert courses[first_id]['instructor'] == 'Dr. Smith'
+    assert courses[second_id]['title'] == 'From Second'
+    first.coordinator.close()
+    second.coordinator.close()
+
+def test_multiprocess_sync_is_cheap_until_a_write(storage_config, monkeypatch):
+    """Test Case 109: Unchanged counters skip the reload; journal compaction forces one"""
+    from app import JournaledCourseRepository
+    storage_config.multiprocess = True
+    storage_config.journal_compact_threshold = 2
+    first = _worker_service(storage_config, JournaledCourseRepository)
+    second = _worker_service(storage_config, JournaledCourseRepository)
+    first.add_course('One', 'Desc')
+    second.sync()
+    version = second.version
+    with monkeypatch.context() as patch:
+        patch.setattr(second.repository, 'read_new_records', lambda: pytest.fail('journal read'))
+        second.sync()
+    assert second.version == version
+    first.add_course('Two', 'Desc')  # Reaches the threshold and compacts synchronously
+    assert not os.path.exists(storage_config.journal_file)
+    second.sync()
+    assert sorted(c['title'] for c in second.get_all_courses()) == ['One', 'Two']
+    for service in (first, second):
+        service.repository.close()
+        service.coordinator.close()
+
+# Test Case 110-112: Catalog Export Tests
+def test_export_is_a_point_in_time_view(clean_tasks):
+    """Test Case 110: Changes made while an export runs do not show up in it"""
+    from app import StudentService
+    service = CourseService(CourseRepository(Config()))
+    first, second, third = (service.add_course(title, 'Desc') for title in ('One', 'Two', 'Three'))
+    export = service.open_export()
+    courses = export.courses(page_size=1)
+    assert next(courses)['title'] == 'One'
+    service.update_course(second['id'], title='Two Renamed')
+    StudentService(service).enroll_student(second['id'], 'John', 'john@example.com', 'S001')
+    service.delete_course(third['id'])
+    service.add_course('Four', 'Desc')
+    service.update_course(first['id'], title='One Renamed')  # Already exported
+    rest = list(courses)
+    assert [(c['title'], len(c['students'])) for c in rest] == [('Two', 0), ('Three', 0)]
+    assert service._exports == [] and export.preserved == {}
+    assert service.get_course(second['id'])['title'] == 'Two Renamed'
+
+def test_export_csv_route(client, clean_tasks):
+    """Test Case 111: The CSV export has one row per enrollment and gzips on request"""
+    import csv as csv_module
+    import gzip
+    import io
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math'}).data)['id']
+    client.post('/api/courses', json={'title': 'Empty'})
+    for student_id in ('S001', 'S002'):
+        client.post(f'/api/courses/{course_id}/students',
+                    json={'name': 'Student', 'email': 'a@example.com', 'student_id': student_id})
+    response = client.get('/api/export')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv_module.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['title'], row['student_id']) for row in rows] == [('Math', 'S001'), ('Math', 'S002'), ('Empty', '')]
+    compressed = client.get('/api/export?gzip=1')
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == response.data
+
+def test_export_ndjson_route(client, clean_tasks):
+    """Test Case 112: The NDJSON export writes one course with its roster per line"""
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math'}).data)['id']
+    client.post(f'/api/courses/{course_id}/students',
+                json={'name': 'John', 'email': 'john@example.com', 'student_id': 'S001'})
+    lines = client.get('/api/export?format=ndjson').get_data(as_text=True).splitlines()
+    assert len(lines) == 1 and json.loads(lines[0])['students'][0]['id'] == 'S001'
+    assert client.get('/api/export?format=xml').status_code == 400
+
+# Test Case 113-115: Sharded Storage Tests
+def test_sharded_writes_only_the_changed_course(storage_config, monkeypatch):
+    """Test Case 113: Enrolling rewrites one course file and deleting unlinks it"""
+    from app import ShardedCourseRepository, StudentService
+    repository = ShardedCourseRepository(storage_config)
+    service = CourseService(repository)
+    first = service.add_course('First', 'Desc')
+    second = service.add_course('Second', 'Desc')
+    written = []
+    monkeypatch.setattr(repository, '_write_shard', lambda course: written.append(course['id']))
+    StudentService(service).enroll_student(first['id'], 'John', 'john@example.com', 'S001')
+    assert written == [first['id']]
+    monkeypatch.undo()
+    service.delete_course(second['id'])
+    assert not os.path.exists(repository._shard_file(second['id']))
+    assert os.path.exists(repository._shard_file(first['id']))
+    assert not os.path.exists(storage_config.students_file)
+
+def test_sharded_round_trip(storage_config):
+    """Test Case 114: Courses, rosters and grades survive a reload from the shards"""
+    from app import ShardedCourseRepository, StudentService
+    service = CourseService(ShardedCourseRepository(storage_config))
+    course = service.add_course('دورة', 'وصف', 'Dr. Smith', 4)
+    students = StudentService(service)
+    students.enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    students.enroll_student(course['id'], 'Jane', 'jane@example.com', 'S002')
+    students.update_student_grade(course['id'], 'S002', 'A')
+    students.remove_student(course['id'], 'S001')
+    loaded = CourseService(ShardedCourseRepository(storage_config)).get_course(course['id'])
+    assert (loaded['title'], loaded['credits']) == ('دورة', 4)
+    assert [(s['id'], s['grade']) for s in loaded['students']] == [('S002', 'A')]
+
+def test_sharded_migrates_csv_layout(storage_config):
+    """Test Case 115: The first sharded start reads and shards the single-file CSVs"""
+    from app import ShardedCourseRepository, StudentService
+    legacy = CourseService(CourseRepository(storage_config))
+    course = legacy.add_course('Legacy', 'Desc')
+    StudentService(legacy).enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    repository = ShardedCourseRepository(storage_config)
+    migrated = CourseService(repository).get_course(course['id'])
+    assert migrated['students'][0]['name'] == 'John'
+    assert os.path.exists(repository._manifest_file())
+    os.remove(storage_config.courses_file)
+    os.remove(storage_config.students_file)
+    reloaded = CourseService(ShardedCourseRepository(storage_config)).get_course(course['id'])
+    assert reloaded['students'][0]['name'] == 'John'
+
+# Test Case 116-118: Student Index Tests
+def _enroll(client, course_id, student_id, name='John'):
+    return client.post(f'/api/courses/{course_id}/students',
+                       json={'name': name, 'email': f'{student_id}@example.com', 'student_id': student_id})
+
+def test_student_courses_follow_enrollments(client, clean_tasks):
+    """Test Case 116: The student index tracks enrollments, removals and deleted courses"""
+    ids = [json.loads(client.post('/api/courses', json={'title': title}).data)['id']
+           for title in ('Math', 'Physics', 'Art')]
+    assert client.get('/api/students/S001/courses').status_code == 404
+    for course_id in ids:
+        _enroll(client, course_id, 'S001')
+    _enroll(client, ids[0], 'S002')
+    client.delete(f'/api/courses/{ids[1]}/students/S001')
+    client.delete(f'/api/courses/{ids[2]}')
+    courses = json.loads(client.get('/api/students/S001/courses').data)
+    assert [course['title'] for course in courses] == ['Math']
+    assert 'students' not in courses[0]
+    client.post(f'/api/courses/{ids[1]}/students/bulk', json=[
+        {'name': 'John', 'email': 'john@example.com', 'student_id': 'S001'}])
+    courses = json.loads(client.get('/api/students/S001/courses').data)
+    assert [course['title'] for course in courses] == ['Math', 'Physics']
+
+def test_student_index_built_from_loaded_rosters(storage_config):
+    """Test Case 117: Rosters loaded from disk are indexed on first lookup"""
+    from app import StudentService
+    service = CourseService(CourseRepository(storage_config))
+    course = service.add_course('Loaded', 'Desc')
+    StudentService(service).enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    reloaded = CourseService(CourseRepository(storage_config))
+    assert reloaded._courses_by_student is None
+    assert [c['id'] for c in reloaded.student_courses('S001')] == [course['id']]
+    StudentService(reloaded).remove_student(course['id'], 'S001')
+    assert reloaded.student_courses('S001') == []
+
+def test_student_transcript(client, clean_tasks):
+    """Test Case 118: The transcript lists credits and grades with a credit-weighted GPA"""
+    math = json.loads(client.post('/api/courses', json={'title': 'Math', 'credits': 4}).data)['id']
+    art = json.loads(client.post('/api/courses', json={'title': 'Art', 'credits': 2}).data)['id']
+    seminar = json.loads(client.post('/api/courses', json={'title': 'Seminar', 'credits': 1}).data)['id']
+    for course_id in (math, art, seminar):
+        _enroll(client, course_id, 'S001')
+    client.put(f'/api/courses/{math}/students/S001', json={'grade': 'A'})
+    client.put(f'/api/courses/{art}/students/S001', json={'grade': 'C'})
+    transcript = json.loads(client.get('/api/students/S001/transcript').data)
+    assert transcript['name'] == 'John'
+    assert [entry['grade'] for entry in transcript['courses']] == ['A', 'C', None]
+    assert (transcript['total_credits'], transcript['graded_credits']) == (7, 6)
+    assert transcript['gpa'] == 3.33
+    assert client.get('/api/students/S999/transcript').status_code == 404
+
+# Test Case 119-121: Course Query Tests
+def _titles(response):
+    return [course['title'] for course in json.loads(response.data)]
+
+def test_query_range_sort_and_cursor(client, clean_tasks):
+    """Test Case 119: Range predicates, descending sort and cursor pages combine"""
+    for credits in (1, 5, 3, 4, 2, 3):
+        client.post('/api/courses', json={'title': f'C{credits}', 'credits': credits})
+    titles = []
+    url = '/api/courses?credits_gte=3&credits_lt=5&sort=-credits&limit=2'
+    while url:
+        response = client.get(url)
+        assert 'X-Query-Plan' in response.headers
+        titles += _titles(response)
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/courses?credits_gte=3&credits_lt=5&sort=-credits&limit=2&cursor={cursor}' if cursor else None
+    assert titles == ['C4', 'C3', 'C3']
+    assert _titles(client.get('/api/courses?credits=3')) == ['C3', 'C3']
+
+def test_query_indexes_follow_mutations(client, clean_tasks):
+    """Test Case 120: Enrollment counts and timestamps stay indexed as courses change"""
+    ids = [json.loads(client.post('/api/courses', json={'title': title}).data)['id'] for title in 'ABC']
+    assert _titles(client.get('/api/courses?sort=-enrollments')) == ['C', 'B', 'A']
+    for student_id in ('S1', 'S2'):
+        _enroll(client, ids[0], student_id)
+    _enroll(client, ids[1], 'S3')
+    assert _titles(client.get('/api/courses?sort=-enrollments')) == ['A', 'B', 'C']
+    assert _titles(client.get('/api/courses?enrollments_gte=1&sort=enrollments')) == ['B', 'A']
+    client.put(f'/api/courses/{ids[2]}', json={'credits': 5})
+    assert _titles(client.get('/api/courses?sort=-updated_at&limit=1')) == ['C']
+    client.delete(f'/api/courses/{ids[0]}')
+    assert _titles(client.get('/api/courses?enrollments_gte=1')) == ['B']
+
+def test_query_planner_and_errors(client, clean_tasks):
+    """Test Case 121: A selective hash predicate drives the plan; bad arguments are rejected"""
+    for n in range(30):
+        client.post('/api/courses', json={'title': f'Course {n}', 'credits': 3,
+                                          'instructor': 'Rare' if n % 10 == 0 else 'Common'})
+    response = client.get('/api/courses?instructor=Rare&credits_gte=3&sort=-created_at')
+    assert response.headers['X-Query-Plan'].startswith('sort index=instructor')
+    assert _titles(response) == ['Course 20', 'Course 10', 'Course 0']
+    assert client.get('/api/courses?credits_gte=abc').status_code == 400
+    assert client.get('/api/courses?sort=title').status_code == 400
+    assert client.get('/api/courses?sort=credits&cursor=bad').status_code == 400
+
+# Test Case 122-124: HTML Page Tests
+def test_home_page_paginates(client, clean_tasks):
+    """Test Case 122: The home page shows one page of cards with a link to the next"""
+    for title in ('First', 'Second', 'Third'):
+        client.post('/api/courses', json={'title': title})
+    page = client.get('/?limit=2').get_data(as_text=True)
+    assert 'First' in page and 'Second' in page and 'Third' not in page
+    next_url = page.split('href="')[-1].split('"')[0].replace('&amp;', '&')
+    rest = client.get(next_url).get_data(as_text=True)
+    assert 'Third' in rest and 'First' not in rest.split('<main>')[1].split('<nav')[0]
+
+def test_html_fragments_are_reused(client, clean_tasks, monkeypatch):
+    """Test Case 123: Hot pages skip Jinja and a change re-renders only its card"""
+    import app as app_module
+    ids = [json.loads(client.post('/api/courses', json={'title': f'Course {n}'}).data)['id'] for n in range(3)]
+    client.get('/')
+    client.get(f'/course/{ids[0]}')
+    rendered = []
+    render = app_module.render_template
+    monkeypatch.setattr(app_module, 'render_template',
+                        lambda name, **context: rendered.append(name) or render(name, **context))
+    assert client.get('/').status_code == 200
+    assert client.get(f'/course/{ids[0]}').status_code == 200
+    assert rendered == []
+    client.put(f'/api/courses/{ids[1]}', json={'title': 'Renamed'})
+    assert 'Renamed' in client.get('/').get_data(as_text=True)
+    assert rendered == ['_course_card.html', 'index.html']
+    _enroll(client, ids[0], 'S001', name='Student Name')
+    assert 'Student Name' in client.get(f'/course/{ids[0]}').get_data(as_text=True)
+
+def test_fragment_cache_is_bounded(client, clean_tasks, monkeypatch):
+    """Test Case 124: Rendered fragments are evicted least recently used under the byte cap"""
+    import app as app_module
+    from app import ResponseCache
+    cache = ResponseCache(6000)
+    monkeypatch.setattr(app_module, 'fragment_cache', cache)
+    ids = [json.loads(client.post('/api/courses', json={'title': f'Course {n}'}).data)['id'] for n in range(10)]
+    for course_id in ids:
+        client.get(f'/course/{course_id}')
+    stats = cache.stats()
+    assert stats['evictions'] > 0 and stats['bytes'] <= 6000
+    assert client.get(f'/course/{ids[-1]}').status_code == 200
+    assert cache.stats()['hits'] == 1
+
+# Test Case 125: Version Ordering Tests
+def test_concurrent_writes_publish_versions_in_order(clean_tasks, monkeypatch):
+    """Test Case 125: The catalog version never falls behind a version already issued"""
+    import threading
+    import time
+    from app import course_service, student_service
+    courses = [course_service.add_course(f'Course {index}', '') for index in range(8)]
+    refresh = course_service._query_engine.refresh
+    
+    def slow_refresh(course, deleted=False):
+        time.sleep(0.002)  # Widen the window between drawing and publishing a version
+        refresh(course, deleted)
+    
+    monkeypatch.setattr(course_service._query_engine, 'refresh', slow_refresh)
+    
+    def enroll(course):
+        for number in range(5):
+            student_service.enroll_student(course['id'], 'John', 'john@example.com', f'S{number}')
+    
+    threads = [threading.Thread(target=enroll, args=(course,)) for course in courses]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    issued = max(course_service.course_version(course['id'])[0] for course in courses)
+    assert course_service.version == issued
+
+# Test Case 126: Incremental Import Tests
+def test_sharded_import_writes_only_new_courses(storage_config, monkeypatch):
+    """Test Case 126: Importing into sharded storage writes the new course files only"""
+    from app import ShardedCourseRepository
+    repository = ShardedCourseRepository(storage_config)
+    service = CourseService(repository)
+    existing = service.add_course('Existing', 'Desc')
+    written = []
+    write_shard = repository._write_shard
+    monkeypatch.setattr(repository, '_write_shard', lambda course: (written.append(course['id']),
+                                                                    write_shard(course)))
+    result = service.import_courses([{'title': 'New 1'}, {'title': 'New 2'}])
+    assert sorted(written) == list(range(result['ids'][0], result['ids'][1] + 1))
+    assert existing['id'] not in written
+    reloaded = CourseService(ShardedCourseRepository(storage_config))
+    assert sorted(course['title'] for course in reloaded.courses) == ['Existing', 'New 1', 'New 2']
+
+# Test Case 127-128: Entity Tag Uniqueness Tests
+def test_etags_differ_between_service_instances(clean_tasks):
+    """Test Case 127: Two services at the same version never share a tag"""
+    first = CourseService(CourseRepository(Config()))
+    second = CourseService(CourseRepository(Config()))
+    assert first.version == second.version
+    assert first.etag('catalog', first.version) != second.etag('catalog', second.version)
+
+def test_etag_from_previous_start_not_honored(client, clean_tasks, monkeypatch):
+    """Test Case 128: A tag issued before a restart does not produce a 304"""
+    from app import course_service
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Cached'}).data)['id']
+    etag = client.get(f'/api/courses/{course_id}').headers['ETag']
+    monkeypatch.setattr(course_service, 'instance_id', 'restarted')
+    assert client.get(f'/api/courses/{course_id}', headers={'If-None-Match': etag}).status_code == 200
+
+# Test Case 129: Drop-Oldest Backpressure Tests
+def test_async_dispatch_drop_oldest_keeps_newest():
+    """Test Case 129: The drop_oldest policy evicts queued events to make room for new ones"""
+    import threading
+    from app import AsyncObserverDispatcher
+    gate = threading.Event()
+    observer = RecordingObserver(gate)
+    dispatcher = AsyncObserverDispatcher(workers=1, queue_size=2, backpressure='drop_oldest')
+    for course_id in range(10):
+        dispatcher.submit({'id': course_id, 'title': 'T'}, 'created', [observer])
+    gate.set()
+    dispatcher.close()
+    stats = dispatcher.stats()
+    assert stats['dropped'] > 0
+    assert stats['delivered'] + stats['dropped'] == 10
+    assert [course_id for course_id, _, _ in observer.batches[-2:]] == [8, 9]
+
+# Test Case 130: Record Loading Tests
+def test_rows_load_through_slot_values():
+    """Test Case 130: Loaded rows match keyword-built records"""
+    from app import StudentRecord
+    rows = [{'course_id': '1', 'student_id': f'S{i}', 'name': f'Student {i}', 'email': f's{i}@example.com',
+             'grade': 'A' if i % 2 else '', 'enrolled_at': '2024-01-15T10:00:00.250000'} for i in range(100)]
+    by_keyword = [StudentRecord(id=row['student_id'], name=row['name'], email=row['email'],
+                                enrolled_at=row['enrolled_at'], grade=row['grade'] or None) for row in rows]
+    assert [CourseRepository._student_from_row(row) for row in rows] == by_keyword
+    course = CourseRepository._course_from_row({'id': '7', 'title': 'Math', 'description': '', 'credits': '4',
+                                                'instructor': 'Dr. Smith', 'created_at': '2024-01-15T10:00:00',
+                                                'updated_at': '2024-02-01'})
+    assert (course['id'], course['credits'], course['updated_at']) == (7, 4, '2024-02-01')
+
+# Test Case 131-132: Grade Count Tests
+def test_grade_counts_follow_roster_changes(clean_tasks):
+    """Test Case 131: Enrolling, grading and removing students keep the grade counts current"""
+    from app import course_service, student_service
+    course_service.index_grades()
+    course = course_service.add_course('Math', '')
+    student_service.enroll_student(course['id'], 'John', 'john@example.com', 'S001')
+    student_service.enroll_students(course['id'], [
+        {'name': 'Jane', 'email': 'jane@example.com', 'student_id': 'S002'},
+        {'name': 'Jim', 'email': 'jim@example.com', 'student_id': 'S003'}])
+    student_service.update_student_grade(course['id'], 'S001', 'A')
+    student_service.update_student_grade(course['id'], 'S002', '85')
+    student_service.update_student_grade(course['id'], 'S002', 'B')
+    student_service.update_student_grade(course['id'], 'S003', ['not', 'a', 'grade'])
+    student_service.remove_student(course['id'], 'S001')
+    assert course_service.grade_counts(course['id']) == {3.0: 1, None: 1}
+    assert course_service.grade_counts(course['id']) == CourseService._count_grades(course)
+    course_service.delete_course(course['id'])
+    assert course_service.grade_counts(course['id']) == {}
+
+def test_grade_summary_does_not_read_rosters(client, clean_tasks, monkeypatch):
+    """Test Case 132: Analytics requests are answered from the counts kept by the write paths"""
+    from app import course_service
+    course_id = json.loads(client.post('/api/courses', json={'title': 'Math', 'instructor': 'Dr. Smith'}).data)['id']
+    for number, grade in enumerate(['A', 'C', 'C']):
+        _enroll(client, course_id, f'S{number}')
+        client.put(f'/api/courses/{course_id}/students/S{number}', json={'grade': grade})
+    
+    def fail(course):
+        raise AssertionError('roster was read')
+    
+    monkeypatch.setattr(CourseService, '_count_grades', staticmethod(fail))
+    stats = json.loads(client.get('/api/analytics/grades').data)['courses'][0]
+    assert (stats['graded'], stats['mean'], stats['median']) == (3, 2.667, 2.0)
+    assert stats['percentiles']['p90'] == 3.6
+
+# Test Case 133: Sharded Storage Metrics Tests
+def test_metrics_count_sharded_bytes(storage_config):
+    """Test Case 133: Shard writes count the bytes of the course files they rewrite"""
+    from app import InstrumentedRepository, Metrics, ShardedCourseRepository, StudentService
+    metrics = Metrics(sample_rate=1.0)
+    inner = ShardedCourseRepository(storage_config)
+    repository = InstrumentedRepository(inner, metrics)
+    service = CourseService(repository)
+    first = service.add_course('First', 'Desc')
+    service.add_course('Second', 'Desc')
+    
+    def written(operation):
+        return metrics._counters.get(('course_storage_bytes_written_total', (('operation', operation),)), 0)
+    
+    created = written('save_change')
+    assert created == sum(os.path.getsize(inner._shard_file(course['id'])) for course in service.courses)
+    StudentService(service).enroll_student(first['id'], 'John', 'john@example.com', 'S001')
+    enrolled = written('save_change') - created
+    assert enrolled == os.path.getsize(inner._shard_file(first['id']))
+    repository.save_courses(service.courses)
+    total = sum(os.path.getsize(path) for path in [inner._manifest_file()] + list(inner._shard_paths()))
+    assert written('save_courses') == total
+
+# Test Case 134: Interrupted Migration Tests
+def test_sharded_migration_interrupted_keeps_every_course(storage_config, monkeypatch):
+    """Test Case 134: A migration killed partway is redone in full on the next start"""
+    from app import ShardedCourseRepository
+    legacy = CourseService(CourseRepository(storage_config))
+    ids = [legacy.add_course(f'Course {number}', 'Desc')['id'] for number in range(5)]
+    repository = ShardedCourseRepository(storage_config)
+    write_shard = repository._write_shard
+    written = []
+    
+    def crash_after_two(course, root=None):
+        if len(written) == 2:
+            raise KeyboardInterrupt('killed')
+        written.append(course['id'])
+        write_shard(course, root)
+    
+    monkeypatch.setattr(repository, '_write_shard', crash_after_two)
+    with pytest.raises(KeyboardInterrupt):
+        repository.load_courses()
+    assert not os.path.exists(repository._manifest_file())
+    reloaded = ShardedCourseRepository(storage_config)
+    assert [course['id'] for course in reloaded.load_courses()] == ids
+    assert not os.path.exists(storage_config.shard_dir + '.migrating')
+    os.remove(storage_config.courses_file)
+    assert [course['id'] for course in ShardedCourseRepository(storage_config).load_courses()] == ids
+
+# Test Case 135: Transcript Credit Tests
+def test_transcript_with_non_numeric_credits(client, clean_tasks):
+    """Test Case 135: Courses with unparseable credits count as zero credits instead of failing"""
+    first = json.loads(client.post('/api/courses', json={'title': 'Math', 'credits': 'three'}).data)['id']
+    second = json.loads(client.post('/api/courses', json={'title': 'Physics', 'credits': '4'}).data)['id']
+    for course_id in (first, second):
+        _enroll(client, course_id, 'S001')
+        client.put(f'/api/courses/{course_id}/students/S001', json={'grade': 'A'})
+    response = client.get('/api/students/S001/transcript')
+    assert response.status_code == 200
+    transcript = json.loads(response.data)
+    assert [entry['credits'] for entry in transcript['courses']] == ['three', '4']
+    assert (transcript['total_credits'], transcript['graded_credits']) == (4.0, 4.0)
+    assert transcript['gpa'] == 4.0
+
+# Test Case 136: Lazy Query Index Tests
+def test_query_builds_only_the_indexes_it_uses(lazy_catalog):
+    """Test Case 136: A credits query neither builds other indexes nor loads lazy rosters"""
+    service = CourseService(CourseRepository(lazy_catalog))
+    courses, _, _ = service.query_courses({'credits': (3, None, False, False)}, sort='-credits')
+    assert len(courses) == 3
+    assert set(service._query_engine._indexes) == {'credits'}
+    assert not any(course['students'].loaded for course in service.courses)
+    courses, _, _ = service.query_courses({'enrollments': (5, 5, False, False)})
+    assert len(courses) == 3
+    assert set(service._query_engine._indexes) == {'credits', 'enrollments'}
+
+# Test Case 137: Torn Journal Tail Tests
+def test_journal_appends_after_torn_tail_survive_reload(storage_config):
+    """Test Case 137: Startup truncates a torn journal tail so later appends are replayed"""
+    from app import JournaledCourseRepository
+    service = CourseService(JournaledCourseRepository(storage_config))
+    service.add_course('Before Crash', '')
+    service.repository.close()
+    with open(storage_config.journal_file, 'ab') as f:
+        f.write(b'{"op": "created", "course": {"id": 99, "tit')
+    service = CourseService(JournaledCourseRepository(storage_config))
+    service.add_course('After Crash', '')
+    service.repository.close()
+    reloaded = CourseService(JournaledCourseRepository(storage_config))
+    assert [course['title'] for course in reloaded.get_all_courses()] == ['Before Crash', 'After Crash']
+
+# Test Case 138: Non-Numeric Credit Storage Tests
+def test_sharded_reload_keeps_non_numeric_credits(storage_config):
+    """Test Case 138: A course saved with unparseable credits does not stop the next startup"""
+    from app import ShardedCourseRepository
+    service = CourseService(ShardedCourseRepository(storage_config))
+    odd = service.add_course('Odd', '', credits='three')
+    plain = service.add_course('Plain', '', credits='4')
+    reloaded = CourseService(ShardedCourseRepository(storage_config))
+    assert reloaded.get_course(odd['id'])['credits'] == 'three'
+    assert reloaded.get_course(plain['id'])['credits'] == 4
+    CourseRepository(storage_config).save_courses(reloaded.get_all_courses())
+    assert [course['credits'] for course in CourseRepository(storage_config).load_courses()] == ['three', 4]
+
+# Test Case 139: Non-Numeric Credit SQLite Tests
+def test_sqlite_reload_keeps_non_numeric_credits(storage_config, tmp_path):
+    """Test Case 139: The INTEGER column hands back unparseable credits as text without failing the load"""
+    from app import SQLiteCourseRepository
+    storage_config.database_file = str(tmp_path / 'courses.db')
+    service = CourseService(SQLiteCourseRepository(storage_config))
+    odd = service.add_course('Odd', '', credits='three')
+    plain = service.add_course('Plain', '', credits='4')
+    service.repository.close()
+    reloaded = CourseService(SQLiteCourseRepository(storage_config))
+    assert reloaded.get_course(odd['id'])['credits'] == 'three'
+    assert reloaded.get_course(plain['id'])['credits'] == 4
+    reloaded.repository.close()
+
+# Test Case 140: Journal Compaction Locking Tests
+def test_journal_compaction_holds_write_lock(lazy_catalog):
+    """Test Case 140: Compaction rewrites the mapped roster file under the write lock"""
+    import threading
+    from app import JournaledCourseRepository
+    lazy_catalog.journal_compact_threshold = 2
+    repository = JournaledCourseRepository(lazy_catalog)
+    service = CourseService(repository)
+    first, second = service.get_all_courses()[:2]
+    assert first['students']._load_lock is not second['students']._load_lock
+    held = []
+    write_csv_files = repository._write_csv_files
+    
+    def check_lock(courses):
+        # An RLock acquired by this thread can only be taken again if it is held here
+        other = threading.Thread(target=lambda: held.append(not repository._write_lock.acquire(blocking=False)))
+        other.start()
+        other.join()
+        write_csv_files(courses)
+    
+    repository._write_csv_files = check_lock
+    service.add_course('Fourth', '')
+    service.add_course('Fifth', '')
+    repository.close()
+    repository.compact(service.get_all_courses())
+    assert held == [True, True]
+    assert [s['id'] for s in service.get_course(first['id'])['students']] == [f'C0S{j}' for j in range(5)]
+
+# Test Case 141: Instructor Paging Tests
+def test_instructor_pages_follow_instructor_changes(client, clean_tasks):
+    """Test Case 141: Instructor pages stay in id order as courses move between instructors"""
+    from app import course_service
+    ids = [json.loads(client.post('/api/courses', json={'title': f'Course {i}', 'instructor': 'Dr. Smith'}).data)['id']
+           for i in range(5)]
+    client.put(f'/api/courses/{ids[1]}', json={'instructor': 'Dr. Jones'})
+    client.delete(f'/api/courses/{ids[3]}')
+    client.put(f'/api/courses/{ids[1]}', json={'instructor': 'Dr. Smith'})
+    seen = []
+    url = '/api/courses?instructor=Dr. Smith&limit=2'
+    while url:
+        response = client.get(url)
+        seen += [c['id'] for c in json.loads(response.data)]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/courses?instructor=Dr. Smith&limit=2&after={cursor}' if cursor else None
+    assert seen == [ids[0], ids[1], ids[2], ids[4]]
+    assert course_service._sorted_ids_by_instructor == {'Dr. Smith': seen}